@@ -0,0 +1,166 @@
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+# 缓存文件格式：
+#   魔数 8s | 版本 I | 头部长度 Q
+#   JSON 头部 {"meta": {...}, "arrays": {名称: {"dtype", "shape", "offset"}}}
+#   按 64 字节对齐的数组原始数据，可直接 np.frombuffer 映射读取
+CACHE_MAGIC = b'DATCACHE'
+CACHE_VERSION = 1
+CACHE_SUFFIX = '.datc'
+_PREAMBLE = struct.Struct('<8sIQ')
+_ALIGN = 64
+
+# 指纹采样：首尾各 64KB，中间等距取 16 个 4KB 块
+_EDGE_BYTES = 64 * 1024
+_SAMPLE_BLOCKS = 16
+_SAMPLE_BYTES = 4 * 1024
+
+
+def file_fingerprint(file_path: str) -> str:
+    """根据文件大小、修改时间和采样内容哈希生成指纹"""
+    stat = os.stat(file_path)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(struct.pack('<QQ', stat.st_size, stat.st_mtime_ns))
+    with open(file_path, 'rb') as f:
+        digest.update(f.read(_EDGE_BYTES))
+        if stat.st_size > 2 * _EDGE_BYTES:
+            step = (stat.st_size - 2 * _EDGE_BYTES) // (_SAMPLE_BLOCKS + 1)
+            for i in range(1, _SAMPLE_BLOCKS + 1):
+                f.seek(_EDGE_BYTES + i * step)
+                digest.update(f.read(_SAMPLE_BYTES))
+            f.seek(stat.st_size - _EDGE_BYTES)
+            digest.update(f.read(_EDGE_BYTES))
+    return digest.hexdigest()
+
+
+class AnalysisCache:
+    """以文件指纹为键的磁盘分析结果缓存
+
+    每项结果存为一个可内存映射的二进制文件，读取时数组直接指向映射，
+    不需要反序列化。总大小超过 max_bytes 时按最近使用时间淘汰。
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 512*1024*1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def path_for(self, fingerprint: str, kind: str) -> str:
+        kind = re.sub(r'[^A-Za-z0-9_.-]', '_', kind)
+        return os.path.join(self.cache_dir, f"{fingerprint}-{kind}{CACHE_SUFFIX}")
+
+    def save(self, file_path: str, kind: str, arrays: Dict[str, np.ndarray], meta: Optional[dict] = None):
+        """保存一项分析结果"""
+        arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+        layout = {}
+        offset = 0
+        for name, array in arrays.items():
+            layout[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+            offset += -(-array.nbytes // _ALIGN) * _ALIGN
+        header = json.dumps({'meta': meta or {}, 'arrays': layout}).encode('utf-8')
+        data_start = -(-(_PREAMBLE.size + len(header)) // _ALIGN) * _ALIGN
+
+        path = self.path_for(file_fingerprint(file_path), kind)
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(_PREAMBLE.pack(CACHE_MAGIC, CACHE_VERSION, len(header)))
+            f.write(header)
+            for name, array in arrays.items():
+                f.seek(data_start + layout[name]['offset'])
+                f.write(array.tobytes())
+            f.truncate(data_start + offset)
+        os.replace(temp_path, path)
+        self.prune()
+
+    def load(self, file_path: str, kind: str) -> Optional[Tuple[Dict[str, np.ndarray], dict]]:
+        """读取一项分析结果，不存在或无效时返回 None"""
+        path = self.path_for(file_fingerprint(file_path), kind)
+        try:
+            with open(path, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                if size < _PREAMBLE.size:
+                    return None
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+
+        magic, version, header_len = _PREAMBLE.unpack_from(mapped, 0)
+        if magic != CACHE_MAGIC or version != CACHE_VERSION:
+            return None
+        header = json.loads(mapped[_PREAMBLE.size:_PREAMBLE.size + header_len])
+        data_start = -(-(_PREAMBLE.size + header_len) // _ALIGN) * _ALIGN
+
+        arrays = {}
+        for name, info in header['arrays'].items():
+            dtype = np.dtype(info['dtype'])
+            count = int(np.prod(info['shape'], dtype=np.int64))
+            array = np.frombuffer(mapped, dtype=dtype, count=count, offset=data_start + info['offset'])
+            arrays[name] = array.reshape(info['shape'])
+
+        # 更新修改时间作为最近使用时间
+        os.utime(path)
+        return arrays, header['meta']
+
+    def entries(self):
+        """返回 [(路径, 大小, 最近使用时间)]"""
+        result = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(CACHE_SUFFIX):
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                result.append((path, stat.st_size, stat.st_mtime))
+        return result
+
+    def prune(self):
+        """总大小超限时删除最久未使用的条目"""
+        entries = sorted(self.entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    def clear(self):
+        for path, _, _ in self.entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+_default_cache = None
+
+
+def default_cache() -> Optional[AnalysisCache]:
+    """返回全局默认缓存
+
+    目录由环境变量 DAT_ANALYZER_CACHE_DIR 指定，默认 ~/.dat_analyzer/cache；
+    设置 DAT_ANALYZER_NO_CACHE=1 可关闭缓存。
+    """
+    global _default_cache
+    if os.environ.get('DAT_ANALYZER_NO_CACHE') == '1':
+        return None
+    if _default_cache is None:
+        cache_dir = os.environ.get('DAT_ANALYZER_CACHE_DIR') or os.path.join(
+            os.path.expanduser('~'), '.dat_analyzer', 'cache')
+        try:
+            _default_cache = AnalysisCache(cache_dir)
+        except OSError as e:
+            print(f"无法创建分析缓存目录: {e}")
+            return None
+    return _default_cache
@@ -0,0 +1,406 @@
+import argparse
+import contextlib
+import fnmatch
+import glob
+import json
+import os
+import shutil
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, List, Tuple
+
+from cli_output import silence_broken_pipe
+from dat_parser import DatParser
+from data_analyzer import DataAnalyzer
+from data_extractor import DataExtractor
+from data_inspector import DataInspector
+from document import DatDocument
+from encoded_strings import ENCODINGS, iter_decoded, parse_encodings
+from entropy_map import summarize_regions
+from instrumentation import instrumentation
+from layout_detector import layout_to_dict
+from pattern_search import compile_pattern
+from streaming import iter_file_records
+
+ANALYSES = ('header', 'sections', 'strings', 'keywords', 'signatures', 'patterns', 'structures', 'regions', 'layouts', 'carve')
+
+
+def iter_input_files(inputs: List[str], pattern: str = '*.dat', recursive: bool = True) -> Iterator[str]:
+    """展开命令行输入：文件原样保留，目录按 pattern 查找，其余按通配符展开"""
+    seen = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            if recursive:
+                candidates = []
+                for dirpath, dirnames, filenames in os.walk(item):
+                    dirnames.sort()
+                    candidates.extend(os.path.join(dirpath, name) for name in sorted(filenames)
+                                      if fnmatch.fnmatch(name, pattern))
+            else:
+                candidates = sorted(glob.glob(os.path.join(item, pattern)))
+        elif os.path.isfile(item):
+            candidates = [item]
+        else:
+            candidates = sorted(glob.glob(item, recursive=True))
+        for path in candidates:
+            key = DatDocument.make_key(path)
+            if key not in seen and os.path.isfile(path):
+                seen.add(key)
+                yield path
+
+
+def analyze_path(file_path: str, options: dict) -> List[dict]:
+    """在工作进程中分析单个文件，返回该文件的全部 JSON 记录
+
+    分析器的提示信息原本打印到标准输出，这里转到标准错误，
+    保证标准输出只有 JSON Lines。
+    """
+    with contextlib.redirect_stdout(sys.stderr):
+        return list(iter_path_records(file_path, options))
+
+
+def spool_path(file_path: str, options: dict, stream: bool = False) -> Tuple[str, bool]:
+    """在工作进程中分析单个文件，记录逐条写入临时 JSON Lines 文件
+
+    --hits/--stream 的命中可能很多，不在内存中攒成列表传回主进程；主进程
+    按输入顺序把临时文件拷贝到标准输出后删除。返回 (临时文件路径, 是否有失败记录)。
+    """
+    iter_records = iter_file_records if stream else iter_path_records
+    fd, spool = tempfile.mkstemp(prefix='dat_batch_', suffix='.jsonl')
+    with os.fdopen(fd, 'w', encoding='utf-8') as out, contextlib.redirect_stdout(sys.stderr):
+        try:
+            failed = write_records(iter_records(file_path, options), out)
+        except Exception as e:
+            failed = write_records([{'file': file_path, 'type': 'file', 'error': str(e)}], out)
+    return spool, failed
+
+
+def iter_path_records(file_path: str, options: dict) -> Iterator[dict]:
+    """逐条产出单个文件的 JSON 记录，命中边分析边产出
+
+    与 streaming.iter_file_records 一样，汇总的 'file' 记录在最后；
+    分析中途出错时以带 error 字段的 'file' 记录结束。
+    """
+    try:
+        yield from _iter_path_records(file_path, options)
+    except Exception as e:
+        yield {'file': file_path, 'type': 'file', 'error': str(e)}
+
+
+def _iter_path_records(file_path: str, options: dict) -> Iterator[dict]:
+    record = {'file': file_path, 'type': 'file', 'size': os.path.getsize(file_path)}
+    if not record['size']:
+        record['error'] = '空文件'
+        yield record
+        return
+
+    document = DatDocument.open(file_path)
+    try:
+        analyses = options['analyses']
+        emit_hits = options['hits']
+
+        if 'header' in analyses or 'sections' in analyses:
+            parser = DatParser(file_path, document)
+            parser.read_file()
+            if 'header' in analyses:
+                record['header'] = parser.parse_header()
+            if 'sections' in analyses:
+                record['sections'] = parser.parse_data_sections()
+            parser.cleanup()
+
+        if 'strings' in analyses:
+            extractor = DataExtractor(file_path, document)
+            extractor.read_file()
+            if options['encodings']:
+                runs = extractor.extract_encoded_runs(options['encodings'])
+                if runs is not None:
+                    counts = dict.fromkeys(options['encodings'], 0)
+                    for code in runs.encodings.tolist():
+                        counts[ENCODINGS[code]] += 1
+                    record['strings'] = {'count': len(runs.offsets), 'encodings': counts}
+                    if emit_hits:
+                        for hit in iter_decoded(extractor.data, runs):
+                            yield {'file': file_path, 'type': 'string', 'offset': hit.offset,
+                                   'length': hit.length, 'encoding': hit.encoding, 'text': hit.text}
+            else:
+                hits = extractor.extract_string_hits(options['min_length']) or []
+                record['strings'] = {'count': len(hits)}
+                if emit_hits:
+                    for hit in hits:
+                        yield {'file': file_path, 'type': 'string', 'offset': hit.offset,
+                               'length': hit.length, 'text': hit.text}
+            extractor.cleanup()
+
+        if 'keywords' in analyses and options['keywords']:
+            inspector = DataInspector(file_path, document)
+            inspector.read_file()
+            counts = {keyword: 0 for keyword in options['keywords']}
+            for keyword, offset in inspector.iter_keywords(options['keywords']):
+                counts[keyword] += 1
+                if emit_hits:
+                    yield {'file': file_path, 'type': 'keyword', 'keyword': keyword, 'offset': offset}
+            record['keywords'] = counts
+            inspector.cleanup()
+
+        if 'signatures' in analyses and options['signatures']:
+            inspector = DataInspector(file_path, document)
+            inspector.read_file()
+            record['signatures'] = {}
+            for pattern, kind in options['signatures']:
+                count = 0
+                first = None
+                for offset, length in inspector.iter_pattern(pattern, kind):
+                    if first is None:
+                        first = offset
+                    count += 1
+                    if emit_hits:
+                        yield {'file': file_path, 'type': 'signature', 'pattern': pattern,
+                               'offset': offset, 'length': length}
+                record['signatures'][pattern] = {'count': count, 'first': first}
+            inspector.cleanup()
+
+        if 'patterns' in analyses:
+            analyzer = DataAnalyzer(file_path, document)
+            analyzer.read_file()
+            result = analyzer.find_patterns(options['widths'], options['top'])
+            if result:
+                record['patterns'] = {
+                    'byte_freq': result['byte_freq'],
+                    'ngrams': {
+                        str(width): {
+                            'total': ngrams.total,
+                            'exact': ngrams.exact,
+                            'top': [[pattern.hex(), count] for pattern, count in ngrams.top]
+                        } for width, ngrams in result['patterns'].items()
+                    }
+                }
+            analyzer.cleanup()
+
+        if 'regions' in analyses:
+            analyzer = DataAnalyzer(file_path, document)
+            analyzer.read_file()
+            result = analyzer.find_regions(options['window'])
+            if result:
+                regions = result[2]
+                record['regions'] = {'count': len(regions), 'bytes': summarize_regions(regions)}
+                if emit_hits:
+                    for region in regions:
+                        yield {'file': file_path, 'type': 'region', 'start': region.start, 'end': region.end,
+                               'kind': region.kind, 'entropy': region.entropy}
+            analyzer.cleanup()
+
+        if 'structures' in analyses:
+            inspector = DataInspector(file_path, document)
+            inspector.read_file()
+            candidates = inspector.scan_structures()
+            if candidates is not None:
+                record['structures'] = {'count': len(candidates.offsets)}
+                if emit_hits:
+                    for i in range(len(candidates.offsets)):
+                        yield {
+                            'file': file_path,
+                            'type': 'structure',
+                            'offset': int(candidates.offsets[i]),
+                            'count': int(candidates.counts[i]),
+                            'size': int(candidates.sizes[i]),
+                            'big_endian': bool(candidates.big_endian[i])
+                        }
+            inspector.cleanup()
+
+        if 'layouts' in analyses:
+            parser = DatParser(file_path, document)
+            parser.read_file()
+            index = parser.section_index
+            if index is not None and index.complete and len(index):
+                layouts = parser.detect_section_layouts() or []
+            else:
+                # 没有完整段表时按块检测
+                inspector = DataInspector(file_path, document)
+                inspector.read_file()
+                layouts = [(None, layout) for layout in inspector.detect_layouts() or []]
+                inspector.cleanup()
+            record['layouts'] = {'count': len(layouts)}
+            if emit_hits:
+                for section, layout in layouts:
+                    yield dict({'file': file_path, 'type': 'layout', 'section': section}, **layout_to_dict(layout))
+            parser.cleanup()
+
+        if 'carve' in analyses:
+            extractor = DataExtractor(file_path, document)
+            extractor.read_file()
+            carved_files = extractor.carve_files() or []
+            types = {}
+            for carved in carved_files:
+                types[carved.name] = types.get(carved.name, 0) + 1
+            record['carve'] = {'count': len(carved_files), 'types': types}
+            paths = [None] * len(carved_files)
+            if options['carve_dir'] and carved_files:
+                # 每个输入文件一个子目录
+                output_dir = os.path.join(options['carve_dir'], os.path.basename(file_path))
+                paths = extractor.save_carved_files(carved_files, output_dir) or paths
+            if emit_hits:
+                for carved, path in zip(carved_files, paths):
+                    yield {'file': file_path, 'type': 'carved', 'offset': carved.offset,
+                           'length': carved.length, 'name': carved.name, 'path': path}
+            extractor.cleanup()
+    finally:
+        document.release()
+
+    yield record
+
+
+def write_records(records: Iterable[dict], out) -> bool:
+    """逐条写出 JSON Lines，返回其中是否有失败记录"""
+    failed = False
+    for record in records:
+        failed |= 'error' in record
+        out.write(json.dumps(record, ensure_ascii=False, default=str))
+        out.write('\n')
+    out.flush()
+    return failed
+
+
+def write_spooled(futures, out) -> int:
+    """按提交顺序把各工作进程的临时文件拷贝到 out，返回有失败记录的文件数
+
+    中途出错（如下游关闭管道）时撤下未开始的任务，并删除剩余的临时文件。
+    """
+    failed = 0
+    try:
+        for future in futures:
+            spool, spool_failed = future.result()
+            failed += spool_failed
+            try:
+                with open(spool, encoding='utf-8') as f:
+                    shutil.copyfileobj(f, out)
+                out.flush()
+            finally:
+                os.remove(spool)
+    finally:
+        for future in futures:
+            future.cancel()
+        for future in futures:
+            if not future.cancelled() and future.exception() is None:
+                spool = future.result()[0]
+                if os.path.exists(spool):
+                    os.remove(spool)
+    return failed
+
+
+def parse_list(text: str) -> List[str]:
+    return [item.strip() for item in text.replace('，', ',').split(',') if item.strip()]
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description='批量分析 .dat 文件，每个文件/命中输出一行 JSON 到标准输出')
+    parser.add_argument('inputs', nargs='+', help='文件、目录或通配符（支持 **）')
+    parser.add_argument('-a', '--analyses', default='header,strings',
+                        help=f"逗号分隔的分析项：{','.join(ANALYSES)}，或 all（默认 header,strings）")
+    parser.add_argument('-k', '--keywords', default='', help='逗号分隔的关键词')
+    parser.add_argument('-s', '--signature', action='append', default=[],
+                        help="十六进制特征，支持 ?? 和半字节通配，如 '4B 69 ?? 6C ?0'，可重复")
+    parser.add_argument('--regex', action='append', default=[], help='字节正则表达式，可重复')
+    parser.add_argument('--min-length', type=int, default=4, help='字符串最小长度')
+    parser.add_argument('--encodings', default=None,
+                        help=f"一遍提取多种编码的字符串：{','.join(ENCODINGS)} 或 all，"
+                             f"可用 '编码:最小字符数' 单独设置，如 'ascii:6,utf-16le'（默认只提取 ASCII）")
+    parser.add_argument('--widths', default='4', help='n-gram 宽度，逗号分隔')
+    parser.add_argument('--top', type=int, default=5, help='每个宽度输出的常见模式数')
+    parser.add_argument('--window', type=int, default=4096, help='区域划分的窗口大小（字节）')
+    parser.add_argument('--hits', action='store_true', help='为每个字符串/关键词/结构命中、区域、记录数组和内嵌文件单独输出一行，'
+                             '命中在该文件的汇总记录之前（-j 大于1时见 -j 的说明）')
+    parser.add_argument('--carve-dir', default=None, help='把找到的内嵌文件导出到该目录（每个输入文件一个子目录）')
+    parser.add_argument('--pattern', default='*.dat', help='目录中匹配的文件名（默认 *.dat）')
+    parser.add_argument('--no-recursive', action='store_true', help='目录不递归查找')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, help='工作进程数；配合 --hits/--stream 时各进程把记录写入临时文件，'
+                             '主进程按输入顺序输出，临时文件占用的磁盘空间与命中数成正比')
+    parser.add_argument('--no-cache', action='store_true', help='不使用分析缓存')
+    parser.add_argument('--stream', action='store_true',
+                        help='流式分析（内存有界，适合大于内存的文件），命中边扫描边输出，汇总记录在每个文件最后')
+    parser.add_argument('--metrics', default=None,
+                        help="把每个分析操作的耗时、吞吐量、内存等度量以 JSON Lines 追加到文件，'-' 输出到标准错误")
+    parser.add_argument('--profile', default=None, metavar='OPERATION',
+                        help='对每个进程中第一次运行的该操作（如 extract_string_hits）做采样分析')
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_arg_parser().parse_args(argv)
+    analyses = ANALYSES if args.analyses == 'all' else parse_list(args.analyses)
+    unknown = [name for name in analyses if name not in ANALYSES]
+    if unknown:
+        print(f"未知的分析项: {', '.join(unknown)}", file=sys.stderr)
+        return 2
+    if args.no_cache:
+        # 子进程继承环境变量
+        os.environ['DAT_ANALYZER_NO_CACHE'] = '1'
+    if args.profile and not args.metrics:
+        # 采样分析报告随度量事件输出
+        args.metrics = '-'
+    if args.metrics or args.profile:
+        # 子进程通过环境变量配置，当前进程直接配置
+        if args.metrics:
+            os.environ['DAT_ANALYZER_METRICS'] = os.path.abspath(args.metrics) if args.metrics != '-' else '-'
+        if args.profile:
+            os.environ['DAT_ANALYZER_PROFILE'] = args.profile
+        instrumentation.configure_from_env()
+
+    options = {
+        'analyses': set(analyses),
+        'keywords': parse_list(args.keywords),
+        'signatures': [(pattern, 'hex') for pattern in args.signature] + [(pattern, 'regex') for pattern in args.regex],
+        'min_length': args.min_length,
+        'encodings': None,
+        'widths': tuple(int(width) for width in parse_list(args.widths)),
+        'top': args.top,
+        'window': args.window,
+        'hits': args.hits,
+        'carve_dir': os.path.abspath(args.carve_dir) if args.carve_dir else None
+    }
+    if args.encodings:
+        try:
+            options['encodings'] = parse_encodings(None if args.encodings == 'all' else args.encodings)
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            return 2
+    for pattern, kind in options['signatures']:
+        try:
+            compile_pattern(pattern, kind)
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            return 2
+    files = list(iter_input_files(args.inputs, args.pattern, not args.no_recursive))
+    if not files:
+        print("没有找到要分析的文件", file=sys.stderr)
+        return 1
+
+    failed = 0
+    try:
+        if args.jobs <= 1 or len(files) == 1:
+            # 在当前进程中边分析边输出
+            iter_records = iter_file_records if args.stream else iter_path_records
+            out = sys.stdout
+            # 分析器的提示信息转到标准错误，标准输出只有 JSON Lines
+            with contextlib.redirect_stdout(sys.stderr):
+                for path in files:
+                    failed += write_records(iter_records(path, options), out)
+        elif args.stream or args.hits:
+            # 命中可能很多：各进程把记录写入临时文件，按输入顺序拷贝到标准输出
+            with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+                futures = [executor.submit(spool_path, path, options, args.stream) for path in files]
+                failed += write_spooled(futures, sys.stdout)
+        else:
+            with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+                # map 按输入顺序产出，结果逐个写出，不必等全部完成
+                for records in executor.map(analyze_path, files, [options] * len(files)):
+                    failed += write_records(records, sys.stdout)
+    except BrokenPipeError:
+        silence_broken_pipe()
+        return 0
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,287 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from dat_modifier import DatModifier
+from data_analyzer import DataAnalyzer
+from data_extractor import DataExtractor
+from data_inspector import DataInspector
+from file_handler import FileHandler
+from synthetic_dat import DEFAULT_KEYWORDS, format_size_label, generate_dat, parse_size
+
+DEFAULT_SIZES = ('1M', '16M', '64M')
+DEFAULT_BASELINE = 'benchmark_baseline.json'
+# 超过基线的比例达到容差才算回归；耗时另有绝对噪声下限
+TIME_TOLERANCE = 0.25
+MEMORY_TOLERANCE = 0.10
+TIME_NOISE = 0.005
+# hex_dump 的输出约为输入的 4.4 倍，只转储文件开头的这一部分
+HEX_DUMP_BYTES = 16*1024*1024
+MODIFY_COUNT = 10000
+SAVE_EDITS = 1000
+
+
+def _open(reader_class, file_path: str):
+    reader = reader_class(file_path)
+    # 基准测试测量的是计算本身，不读写分析缓存
+    reader.cache = None
+    if not reader.read_file():
+        raise RuntimeError(f"无法读取 {file_path}")
+    return reader
+
+
+def _edit_offsets(size: int, count: int, seed: int = 1) -> List[int]:
+    return np.random.default_rng(seed).integers(0, size, count).tolist()
+
+
+# 每个基准项的准备函数：setup(文件路径, 工作目录, 参数) 返回 (被计时的函数, 清理函数)
+# 被计时的函数返回 None 或 False 表示失败（分析方法出错时打印提示并返回 None/False）
+def setup_extract_strings(file_path, workdir, options):
+    extractor = _open(DataExtractor, file_path)
+    return lambda: extractor.extract_strings(options['min_length'], options['workers']), extractor.cleanup
+
+
+def setup_find_keywords(file_path, workdir, options):
+    inspector = _open(DataInspector, file_path)
+    return lambda: inspector.find_keywords(options['keywords'], options['workers']), inspector.cleanup
+
+
+def setup_analyze_data_structures(file_path, workdir, options):
+    inspector = _open(DataInspector, file_path)
+    return lambda: inspector.analyze_data_structures(workers=options['workers']), inspector.cleanup
+
+
+def setup_analyze_patterns(file_path, workdir, options):
+    analyzer = _open(DataAnalyzer, file_path)
+    return lambda: analyzer.analyze_patterns(), analyzer.cleanup
+
+
+def setup_hex_dump(file_path, workdir, options):
+    handler = _open(FileHandler, file_path)
+    return lambda: handler.hex_dump(length=min(HEX_DUMP_BYTES, len(handler.data))), handler.cleanup
+
+
+def setup_modify_data(file_path, workdir, options):
+    modifier = _open(DatModifier, file_path)
+    offsets = _edit_offsets(len(modifier.data), MODIFY_COUNT)
+
+    def run():
+        for i, offset in enumerate(offsets):
+            if not modifier.modify_data(offset, i & 0xFF):
+                return False
+        return True
+    return run, modifier.cleanup
+
+
+def setup_save_file(file_path, workdir, options):
+    modifier = _open(DatModifier, file_path)
+    for i, offset in enumerate(_edit_offsets(len(modifier.data), SAVE_EDITS)):
+        modifier.buffer.write(offset, bytes([i & 0xFF]))
+    output_path = os.path.join(workdir, 'benchmark_save.dat')
+
+    def cleanup():
+        modifier.cleanup()
+        if os.path.exists(output_path):
+            os.remove(output_path)
+    return lambda: modifier.save_file(output_path), cleanup
+
+
+BENCHMARKS: Dict[str, Callable] = {
+    'extract_strings': setup_extract_strings,
+    'find_keywords': setup_find_keywords,
+    'analyze_data_structures': setup_analyze_data_structures,
+    'analyze_patterns': setup_analyze_patterns,
+    'hex_dump': setup_hex_dump,
+    'modify_data': setup_modify_data,
+    'save_file': setup_save_file
+}
+
+
+def measure(setup: Callable, file_path: str, workdir: str, options: dict, repeat: int) -> dict:
+    """运行一个基准项：取 repeat 次中最短的耗时，另跑一次测量峰值内存
+
+    峰值内存由 tracemalloc 统计（Python 对象和 numpy 数组），
+    不包括内存映射的页面。每次运行前重新 setup，运行中的输出不显示；
+    被计时的函数返回 None/False 时抛出 RuntimeError，附上它最后打印的提示。
+    """
+    times = []
+    output = io.StringIO()
+
+    def check(result):
+        if result is None or result is False:
+            lines = output.getvalue().strip().splitlines()
+            raise RuntimeError(lines[-1] if lines else "返回 None/False")
+
+    with contextlib.redirect_stdout(output):
+        for _ in range(repeat):
+            run, cleanup = setup(file_path, workdir, options)
+            try:
+                started = time.perf_counter()
+                result = run()
+                times.append(time.perf_counter() - started)
+            finally:
+                cleanup()
+            check(result)
+            # 只保留本次运行的输出
+            output.seek(0)
+            output.truncate()
+
+        run, cleanup = setup(file_path, workdir, options)
+        try:
+            tracemalloc.start()
+            result = run()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+            cleanup()
+        check(result)
+    return {'time': min(times), 'peak': peak}
+
+
+def prepare_file(workdir: str, size: int, seed: int) -> str:
+    """生成（或复用已存在的）合成文件"""
+    file_path = os.path.join(workdir, f"synthetic_{format_size_label(size)}_s{seed}.dat")
+    if not os.path.exists(file_path) or os.path.getsize(file_path) != size:
+        print(f"生成 {file_path} ...", file=sys.stderr)
+        generate_dat(file_path, size, seed)
+    return file_path
+
+
+def load_baseline(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f).get('results', {})
+    except (OSError, ValueError) as e:
+        print(f"读取基线失败: {e}", file=sys.stderr)
+        return {}
+
+
+def save_baseline(path: str, results: dict) -> None:
+    document = {
+        'machine': platform.platform(),
+        'python': platform.python_version(),
+        'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'results': results
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(document, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+
+def compare(result: dict, baseline: Optional[dict], time_tolerance: float = TIME_TOLERANCE,
+            memory_tolerance: float = MEMORY_TOLERANCE) -> Tuple[List[str], dict]:
+    """与基线比较，返回 (回归说明列表, 相对变化 {'time', 'peak'})"""
+    if not baseline:
+        return [], {}
+    changes = {}
+    regressions = []
+    for key, tolerance in (('time', time_tolerance), ('peak', memory_tolerance)):
+        old, new = baseline.get(key), result[key]
+        if not old:
+            continue
+        changes[key] = new / old - 1
+        if changes[key] > tolerance and (key != 'time' or new - old > TIME_NOISE):
+            regressions.append(f"{key} +{changes[key]:.0%}")
+    return regressions, changes
+
+
+def format_bytes(value: float) -> str:
+    for unit in ('B', 'KB', 'MB'):
+        if abs(value) < 1024:
+            return f"{value:.0f}{unit}" if unit == 'B' else f"{value:.1f}{unit}"
+        value /= 1024
+    return f"{value:.2f}GB"
+
+
+def format_change(changes: dict, key: str) -> str:
+    return f"{changes[key]:+.0%}" if key in changes else '-'
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='用合成 .dat 文件测量各热点操作的耗时和峰值内存，并与基线比较')
+    parser.add_argument('--sizes', default=','.join(DEFAULT_SIZES), help='文件大小，逗号分隔，如 1M,64M,4G')
+    parser.add_argument('--ops', default='all', help=f"基准项，逗号分隔或 all：{', '.join(BENCHMARKS)}")
+    parser.add_argument('--repeat', type=int, default=3, help='每项重复次数，取最短耗时')
+    parser.add_argument('--seed', type=int, default=0, help='合成文件的随机种子')
+    parser.add_argument('--workers', type=int, default=None, help='扫描类操作的工作进程数（默认单进程）')
+    parser.add_argument('--workdir', default=None, help='存放合成文件的目录，指定后文件会保留复用')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help=f'基线文件（默认 {DEFAULT_BASELINE}）')
+    parser.add_argument('--update-baseline', action='store_true', help='把本次结果写入基线')
+    parser.add_argument('--time-tolerance', type=float, default=TIME_TOLERANCE, help='耗时回归容差（比例）')
+    parser.add_argument('--memory-tolerance', type=float, default=MEMORY_TOLERANCE, help='内存回归容差（比例）')
+    parser.add_argument('--json', dest='json_path', default=None, help='另把结果写入 JSON 文件')
+    args = parser.parse_args(argv)
+
+    ops = list(BENCHMARKS) if args.ops == 'all' else [op for op in args.ops.split(',') if op]
+    unknown = [op for op in ops if op not in BENCHMARKS]
+    if unknown:
+        print(f"未知的基准项: {', '.join(unknown)}", file=sys.stderr)
+        return 2
+    try:
+        sizes = [parse_size(size) for size in args.sizes.split(',') if size]
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    options = {'min_length': 4, 'keywords': list(DEFAULT_KEYWORDS), 'workers': args.workers}
+    baseline = load_baseline(args.baseline)
+    results = {}
+    regressed = []
+    # 出错的基准项：{项: 错误说明}，与回归一样使退出码非零
+    failed = {}
+    with contextlib.ExitStack() as stack:
+        workdir = args.workdir or stack.enter_context(tempfile.TemporaryDirectory(prefix='dat_bench_'))
+        os.makedirs(workdir, exist_ok=True)
+        print(f"{'大小':>6}  {'操作':<24} {'耗时':>10} {'变化':>6}  {'峰值内存':>10} {'变化':>6}")
+        for size in sizes:
+            file_path = prepare_file(workdir, size, args.seed)
+            label = format_size_label(size)
+            for op in ops:
+                key = f"{label}/{op}"
+                try:
+                    result = measure(BENCHMARKS[op], file_path, workdir, options, max(args.repeat, 1))
+                except Exception as e:
+                    print(f"{label:>6}  {op:<24} 失败: {e}", flush=True)
+                    failed[key] = str(e)
+                    continue
+                results[key] = result
+                regressions, changes = compare(result, baseline.get(key), args.time_tolerance, args.memory_tolerance)
+                flag = f"  回归: {', '.join(regressions)}" if regressions else ''
+                print(f"{label:>6}  {op:<24} {result['time']:>9.3f}s {format_change(changes, 'time'):>6}  "
+                      f"{format_bytes(result['peak']):>10} {format_change(changes, 'peak'):>6}{flag}", flush=True)
+                if regressions:
+                    regressed.append(key)
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump({'results': results, 'regressions': regressed, 'failures': failed}, f,
+                      ensure_ascii=False, indent=2)
+    if args.update_baseline:
+        # 只覆盖本次运行过的项，其余基线保留
+        baseline.update(results)
+        save_baseline(args.baseline, baseline)
+        print(f"基线已更新: {args.baseline}")
+    if failed:
+        print(f"\n{len(failed)} 项运行失败: {', '.join(failed)}")
+    if regressed:
+        print(f"\n发现 {len(regressed)} 项回归: {', '.join(regressed)}")
+    if failed or regressed:
+        return 1
+    if not baseline:
+        print(f"\n没有基线（{args.baseline}），使用 --update-baseline 记录本次结果")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
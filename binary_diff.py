@@ -0,0 +1,358 @@
+import argparse
+import json
+import os
+import sys
+from collections import namedtuple
+from typing import Callable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from document import DatDocument
+
+# 一处差异：
+#   kind     : 'replace' 替换（两侧长度可以不同）、'insert' B 中插入、'delete' A 中删除
+#   a_offset : 在 A 中的起始偏移，a_length 为 A 中涉及的字节数
+#   b_offset : 在 B 中的起始偏移，b_length 为 B 中涉及的字节数
+DiffRange = namedtuple('DiffRange', ['kind', 'a_offset', 'a_length', 'b_offset', 'b_length'])
+
+# 逐块比较的块大小
+CHUNK_SIZE = 4*1024*1024
+# 锚点长度：至少这么多字节相同才认为两侧重新对齐
+ANCHOR_SIZE = 32
+# 原地差异超过该长度时，尝试检测插入/删除造成的错位
+LONG_RUN = 4096
+# 错位搜索的初始范围和最大范围
+HORIZON = 1024*1024
+MAX_HORIZON = 16*1024*1024
+# 每次为 B 计算窗口哈希的字节数，限制临时内存
+HASH_BATCH = 1024*1024
+# 查表前的位图过滤器大小（2^24 位）
+_BITMAP_SIZE = 1 << 24
+_BITMAP_MASK = np.uint64(_BITMAP_SIZE - 1)
+
+_MIX = (np.uint64(0x9E3779B97F4A7C15), np.uint64(0xC2B2AE3D27D4EB4F),
+        np.uint64(0x165667B19E3779F9), np.uint64(0xD6E8FEB86659FD93))
+
+
+def _view(data, offset: int, length: int) -> np.ndarray:
+    return np.frombuffer(data, dtype=np.uint8, count=length, offset=offset)
+
+
+def make_range(a_offset: int, a_length: int, b_offset: int, b_length: int) -> DiffRange:
+    if not a_length:
+        kind = 'insert'
+    elif not b_length:
+        kind = 'delete'
+    else:
+        kind = 'replace'
+    return DiffRange(kind, a_offset, a_length, b_offset, b_length)
+
+
+def _mix_words(words: np.ndarray, count: int, step: int, anchor: int) -> np.ndarray:
+    """由 8 字节整数序列计算窗口哈希：第 k 个整数乘常数后循环移位再异或"""
+    hashes = np.zeros(count, dtype=np.uint64)
+    mixed = np.empty(count, dtype=np.uint64)
+    rotated = np.empty(count, dtype=np.uint64)
+    for k in range(anchor // 8):
+        np.multiply(words[k * step:k * step + count], _MIX[k % 4], out=mixed)
+        shift = np.uint64(7 * k + 1)
+        np.left_shift(mixed, shift, out=rotated)
+        np.right_shift(mixed, np.uint64(64) - shift, out=mixed)
+        hashes ^= rotated
+        hashes ^= mixed
+    return hashes
+
+
+def window_hashes(data, offset: int, count: int, anchor: int = ANCHOR_SIZE) -> np.ndarray:
+    """计算从 offset 起 count 个连续位置上 anchor 字节窗口的 64 位哈希
+
+    每个位置的 8 字节大端整数由 8 个错开的整数视图交错得到，
+    窗口哈希由 anchor/8 个整数混合而成，整块向量化计算。
+    """
+    positions = count + anchor - 8
+    words = np.empty(positions, dtype=np.uint64)
+    for r in range(8):
+        lanes = len(range(r, positions, 8))
+        words[r::8] = np.frombuffer(data, dtype='>u8', count=lanes, offset=offset + r)
+    return _mix_words(words, count, 8, anchor)
+
+
+def block_hashes(data, offset: int, blocks: int, anchor: int = ANCHOR_SIZE) -> np.ndarray:
+    """计算从 offset 起连续 blocks 个不重叠 anchor 字节块的哈希，与 window_hashes 一致"""
+    words = np.frombuffer(data, dtype='>u8', count=blocks * anchor // 8, offset=offset).astype(np.uint64)
+    # 第 k 个整数按块排成连续数组，_mix_words 中以 blocks 为步长取
+    words = words.reshape(blocks, anchor // 8).T.ravel()
+    return _mix_words(words, blocks, blocks, anchor)
+
+
+def common_suffix(a, a_end: int, b, b_end: int, limit: int) -> int:
+    """A[..a_end) 与 B[..b_end) 末尾相同的字节数，最多 limit"""
+    if limit <= 0:
+        return 0
+    tail_a = _view(a, a_end - limit, limit)[::-1]
+    tail_b = _view(b, b_end - limit, limit)[::-1]
+    mismatch = np.flatnonzero(tail_a != tail_b)
+    return int(mismatch[0]) if len(mismatch) else limit
+
+
+def find_resync(a, i: int, b, j: int, anchor: int = ANCHOR_SIZE,
+                horizon: int = HORIZON, max_horizon: int = MAX_HORIZON) -> Optional[Tuple[int, int]]:
+    """在 (i, j) 之后寻找两侧重新对齐的位置 (a', b')
+
+    A 按 anchor 步长取块建立哈希表，B 的每个位置计算窗口哈希去查表
+    （类似 rsync），取 (a'-i)+(b'-j) 最小的匹配，再向前延伸到最早的
+    相同字节。查表前先用位图过滤，绝大多数位置只需一次随机访问。
+    找不到时逐步扩大搜索范围，超过 max_horizon 返回 None。
+    """
+    len_a, len_b = len(a), len(b)
+    while True:
+        blocks = min(horizon, len_a - i) // anchor
+        if blocks:
+            hashes_a = block_hashes(a, i, blocks, anchor)
+            order = np.argsort(hashes_a, kind='stable')
+            sorted_hashes = hashes_a[order]
+            bitmap = np.zeros(_BITMAP_SIZE, dtype=bool)
+            bitmap[hashes_a & _BITMAP_MASK] = True
+            best = None
+            # 每次扩大范围都重新扫描 B，之前的位置可能与新加入的 A 块匹配
+            b_stop = min(j + horizon, len_b - anchor + 1)
+            for start in range(j, b_stop, HASH_BATCH):
+                if best is not None and start - j >= best[0]:
+                    break
+                count = min(HASH_BATCH, b_stop - start)
+                hashes = window_hashes(b, start, count, anchor)
+                hit = np.flatnonzero(bitmap[hashes & _BITMAP_MASK])
+                if not len(hit):
+                    continue
+                index = np.minimum(np.searchsorted(sorted_hashes, hashes[hit]), len(sorted_hashes) - 1)
+                found = sorted_hashes[index] == hashes[hit]
+                if not found.any():
+                    continue
+                # 相同哈希取 A 中最靠前的块（stable 排序保证 order 中先出现的更靠前）
+                a_pos = i + order[index[found]].astype(np.int64) * anchor
+                b_pos = start + hit[found]
+                cost = (a_pos - i) + (b_pos - j)
+                for k in np.argsort(cost, kind='stable')[:16].tolist():
+                    candidate = (int(cost[k]), int(a_pos[k]), int(b_pos[k]))
+                    if best is not None and candidate >= best:
+                        break
+                    if bytes(_view(a, candidate[1], anchor)) == bytes(_view(b, candidate[2], anchor)):
+                        best = candidate
+                        break
+            if best is not None:
+                _, a_pos, b_pos = best
+                back = common_suffix(a, a_pos, b, b_pos, min(a_pos - i, b_pos - j))
+                return a_pos - back, b_pos - back
+        if horizon >= max_horizon or (i + horizon >= len_a and j + horizon >= len_b):
+            return None
+        horizon *= 2
+
+
+def _difference_runs(a, i: int, b, j: int, n: int, min_gap: int) -> Tuple[np.ndarray, np.ndarray]:
+    """比较 A[i:i+n] 与 B[j:j+n]，返回差异区间的 [起点, 终点)（相对块起点）
+
+    先按 8 字节整数比较，只把不同的整数展开成字节再比较，差异稀疏时
+    几乎只需一次整块比较。间隔小于 min_gap 的区间合并。
+    """
+    words = n // 8
+    word_a = np.frombuffer(a, dtype=np.uint64, count=words, offset=i)
+    word_b = np.frombuffer(b, dtype=np.uint64, count=words, offset=j)
+    dirty = np.flatnonzero(word_a != word_b)
+    if len(dirty) * 2 > words:
+        return _dense_difference_runs(_view(a, i, n), _view(b, j, n), min_gap)
+    # 按字节检查不同的整数，以及末尾不足 8 字节的部分
+    positions = np.concatenate((((dirty * 8)[:, None] + np.arange(8)).ravel(), np.arange(words * 8, n)))
+    differs = _view(a, i, n)[positions] != _view(b, j, n)[positions]
+    positions = positions[differs]
+    if not len(positions):
+        return positions, positions
+    breaks = np.flatnonzero(np.diff(positions) > min_gap)
+    starts = positions[np.concatenate(([0], breaks + 1))]
+    ends = positions[np.concatenate((breaks, [len(positions) - 1]))] + 1
+    return starts, ends
+
+
+def _dense_difference_runs(view_a: np.ndarray, view_b: np.ndarray, min_gap: int) -> Tuple[np.ndarray, np.ndarray]:
+    """差异密集时改为定位相同的字节：长度不小于 min_gap 的相同段（以及块首尾
+    的相同段）把块分隔成若干差异区间"""
+    n = len(view_a)
+    same = np.flatnonzero(view_a == view_b)
+    if len(same):
+        breaks = np.flatnonzero(np.diff(same) != 1)
+        run_starts = same[np.concatenate(([0], breaks + 1))]
+        run_ends = same[np.concatenate((breaks, [len(same) - 1]))] + 1
+        keep = ((run_ends - run_starts) >= min_gap) | (run_starts == 0) | (run_ends == n)
+        run_starts, run_ends = run_starts[keep], run_ends[keep]
+    else:
+        run_starts = run_ends = same
+    starts = np.concatenate(([0], run_ends))
+    ends = np.concatenate((run_starts, [n]))
+    nonempty = ends > starts
+    return starts[nonempty], ends[nonempty]
+
+
+def _merge_adjacent(ranges: Iterator[DiffRange], min_gap: int) -> Iterator[DiffRange]:
+    """合并间隔小于 min_gap 的相邻差异（例如被分块切开的同一处差异）"""
+    pending = None
+    for r in ranges:
+        if pending is not None:
+            gap = r.a_offset - pending.a_offset - pending.a_length
+            if gap == r.b_offset - pending.b_offset - pending.b_length and gap < min_gap:
+                pending = make_range(pending.a_offset, r.a_offset + r.a_length - pending.a_offset,
+                                     pending.b_offset, r.b_offset + r.b_length - pending.b_offset)
+                continue
+        if pending is not None:
+            yield pending
+        pending = r
+    if pending is not None:
+        yield pending
+
+
+def iter_diff(a, b, chunk_size: int = CHUNK_SIZE, anchor: int = ANCHOR_SIZE,
+              progress: Callable = None) -> Iterator[DiffRange]:
+    """逐块比较两个缓冲区，按偏移顺序产出差异区间
+
+    同偏移处先做向量化逐字节比较；差异很长或延伸到块尾时，用窗口哈希
+    检查是否是插入/删除造成的错位，能更早对齐就按错位处理。
+    progress(已比较的 A 偏移) 在每块之后调用。
+    """
+    return _merge_adjacent(_iter_diff(a, b, chunk_size, anchor, progress), anchor)
+
+
+def _iter_diff(a, b, chunk_size: int, anchor: int, progress: Callable) -> Iterator[DiffRange]:
+    len_a, len_b = len(a), len(b)
+    i = j = 0
+    # 错位搜索失败后，在这个 A 偏移之前不再重复搜索；连续失败时间隔加倍
+    skip_resync_until = -1
+    failures = 0
+    while i < len_a and j < len_b:
+        n = min(chunk_size, len_a - i, len_b - j)
+        starts, ends = _difference_runs(a, i, b, j, n, anchor)
+        if not len(starts):
+            i += n
+            j += n
+            if progress:
+                progress(i)
+            continue
+
+        at_end = i + n == len_a or j + n == len_b
+        advanced = False
+        for s, e in zip(starts.tolist(), ends.tolist()):
+            touches_end = e == n
+            if touches_end and not at_end and s > 0:
+                # 差异延伸到块尾，从差异起点开始下一块
+                i, j = i + s, j + s
+                advanced = True
+                break
+            if (e - s >= LONG_RUN or touches_end) and i + s >= skip_resync_until:
+                resync = find_resync(a, i + s, b, j + s, anchor)
+                if resync is None:
+                    skip_resync_until = i + s + (MAX_HORIZON << failures)
+                    failures += 1
+                elif touches_end or resync[0] - (i + s) < e - s:
+                    failures = 0
+                    a_pos, b_pos = resync
+                    yield make_range(i + s, a_pos - i - s, j + s, b_pos - j - s)
+                    i, j = a_pos, b_pos
+                    advanced = True
+                    break
+            if touches_end and at_end:
+                # 较短的文件已比较完，剩余部分整体视为替换
+                yield make_range(i + s, len_a - i - s, j + s, len_b - j - s)
+                i, j = len_a, len_b
+                advanced = True
+                break
+            yield DiffRange('replace', i + s, e - s, j + s, e - s)
+        if not advanced:
+            i += n
+            j += n
+        if progress:
+            progress(i)
+
+    if i < len_a or j < len_b:
+        yield make_range(i, len_a - i, j, len_b - j)
+
+
+def diff_buffers(a, b, **kwargs) -> List[DiffRange]:
+    """比较两个缓冲区，返回差异区间列表"""
+    return list(iter_diff(a, b, **kwargs))
+
+
+class FileView:
+    """打开文件的只读视图，空文件用 b'' 代替（空文件无法映射）"""
+
+    def __init__(self, file_path: str):
+        self.document = DatDocument.open(file_path) if os.path.getsize(file_path) else None
+        self.data = self.document.view() if self.document else b''
+
+    def close(self):
+        if self.document:
+            self.data.release()
+            self.document.release()
+
+
+def diff_files(path_a: str, path_b: str, **kwargs) -> List[DiffRange]:
+    """比较两个文件（内存映射，不读入内存）"""
+    view_a, view_b = FileView(path_a), FileView(path_b)
+    try:
+        return diff_buffers(view_a.data, view_b.data, **kwargs)
+    finally:
+        view_a.close()
+        view_b.close()
+
+
+def summarize_diff(ranges: List[DiffRange]) -> dict:
+    summary = {'ranges': len(ranges), 'replace': 0, 'insert': 0, 'delete': 0,
+               'a_bytes': 0, 'b_bytes': 0}
+    for r in ranges:
+        summary[r.kind] += 1
+        summary['a_bytes'] += r.a_length
+        summary['b_bytes'] += r.b_length
+    return summary
+
+
+KIND_NAMES = {'replace': '替换', 'insert': '插入', 'delete': '删除'}
+
+
+def format_range(r: DiffRange, a=None, b=None, preview: int = 16) -> str:
+    """格式化一处差异，提供数据时附带两侧前 preview 字节的十六进制"""
+    text = (f"{KIND_NAMES[r.kind]}  A 0x{r.a_offset:08X} +{r.a_length}  "
+            f"B 0x{r.b_offset:08X} +{r.b_length}")
+    if a is not None and b is not None and preview:
+        old = bytes(a[r.a_offset:r.a_offset + min(r.a_length, preview)]).hex(' ')
+        new = bytes(b[r.b_offset:r.b_offset + min(r.b_length, preview)]).hex(' ')
+        text += f"\n    - {old}\n    + {new}"
+    return text
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='比较两个二进制文件，列出替换/插入/删除的区间')
+    parser.add_argument('file_a')
+    parser.add_argument('file_b')
+    parser.add_argument('--json', action='store_true', help='每处差异输出一行 JSON')
+    parser.add_argument('--preview', type=int, default=16, help='每处差异显示的字节数，0 表示不显示')
+    parser.add_argument('--anchor', type=int, default=ANCHOR_SIZE, help='对齐所需的最少相同字节数（8 的倍数）')
+    args = parser.parse_args(argv)
+
+    if args.anchor <= 0 or args.anchor % 8:
+        print("--anchor 必须是 8 的正整数倍", file=sys.stderr)
+        return 2
+    view_a, view_b = FileView(args.file_a), FileView(args.file_b)
+    try:
+        count = 0
+        for r in iter_diff(view_a.data, view_b.data, anchor=args.anchor):
+            count += 1
+            if args.json:
+                print(json.dumps(r._asdict()))
+            else:
+                print(format_range(r, view_a.data, view_b.data, args.preview))
+        if not args.json:
+            print("文件相同" if not count else f"共 {count} 处差异")
+        return 1 if count else 0
+    finally:
+        view_a.close()
+        view_b.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,13 @@
+import os
+import sys
+
+
+def silence_broken_pipe():
+    """下游（如 head）提前关闭了管道时调用：把标准输出指向 os.devnull
+
+    退出时解释器还会刷新标准输出的缓冲区，不重定向的话会再次触发
+    BrokenPipeError 并打印异常信息。标准错误保持可用。
+    """
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, sys.stdout.fileno())
+    os.close(devnull)
@@ -1,58 +1,100 @@
+import os
+import shutil
+from edit_buffer import EditBuffer
 from file_handler import FileHandler
-import mmap
+from hex_view import HexView
+from incremental import KeywordIndex, NGramIndex, StringIndex, StructureIndex
+from instrumentation import instrumented
+from save_journal import recover_journal, write_ranges
 
 class DatModifier(FileHandler):
-    def __init__(self, file_path):
-        super().__init__(file_path)
+    def __init__(self, file_path, document=None):
+        super().__init__(file_path, document)
+        self.buffer = None
         
-    def read_file(self):
-        """读取.dat文件"""
-        result = super().read_file()
-        if result and isinstance(self.data, mmap.mmap):
-            # 将内存映射文件转换为bytes对象以便修改
-            self.data = bytes(self.data)
+    def read_file(self, chunk_size=1024*1024):
+        """读取.dat文件，在只读映射上建立编辑层"""
+        # 上次保存中断时先回滚，保证映射到的是完整的原文件
+        recover_journal(self.file_path)
+        result = super().read_file(chunk_size)
+        self.buffer = EditBuffer(self.data) if result else None
         return result
+        
+    def cleanup(self):
+        """清理编辑层和内存映射资源"""
+        self.buffer = None
+        super().cleanup()
             
+    @instrumented(size=lambda self, offset, new_value: 1 if isinstance(new_value, int) else len(new_value))
     def modify_data(self, offset, new_value):
-        """修改指定偏移量的数据"""
-        if not self.data:
+        """修改指定偏移量的数据，new_value 为单个字节值或字节串"""
+        if not self.buffer:
             print("请先读取文件")
             return False
             
-        if offset >= len(self.data):
+        if isinstance(new_value, int):
+            new_value = bytes([new_value])
+        if offset < 0 or offset + len(new_value) > len(self.buffer):
             print("偏移量超出文件范围")
             return False
             
-        # 将数据转换为字节数组以便修改
-        data = bytearray(self.data)
-        print(f"Before modification at offset {offset}: 0x{data[offset]:02X}")
-        data[offset] = new_value
-        print(f"After modification at offset {offset}: 0x{data[offset]:02X}")
-        self.data = bytes(data)
+        print(f"Before modification at offset {offset}: {self.buffer.read(offset, len(new_value)).hex(' ').upper()}")
+        self.buffer.write(offset, new_value)
+        print(f"After modification at offset {offset}: {self.buffer.read(offset, len(new_value)).hex(' ').upper()}")
         return True
         
+    def read(self, offset, length):
+        """读取包含未保存修改的数据"""
+        return self.buffer.read(offset, length) if self.buffer else b''
+        
+    def begin_batch(self):
+        """开始批量修改，之后的修改作为一次撤销单位"""
+        if self.buffer:
+            self.buffer.begin_batch()
+            
+    def end_batch(self):
+        """结束批量修改"""
+        if self.buffer:
+            self.buffer.end_batch()
+            
+    def undo(self):
+        """撤销上一次修改"""
+        return bool(self.buffer) and self.buffer.undo()
+        
+    def redo(self):
+        """重做上一次撤销的修改"""
+        return bool(self.buffer) and self.buffer.redo()
+        
+    @instrumented(size=lambda self, output_path=None: len(self.buffer) if self.buffer else None)
     def save_file(self, output_path=None):
-        """保存修改后的文件"""
-        if not self.data:
+        """保存修改后的文件
+
+        覆盖原文件时只原地写入修改过的区间，并先写撤销日志以防中途崩溃；
+        另存为时先由系统快速复制原文件，再写入修改区间。
+        """
+        if not self.buffer:
             print("没有数据可保存")
             return False
             
         save_path = output_path or self.file_path
         try:
-            with open(save_path, 'wb') as f:
-                f.write(self.data)
+            ranges = self.buffer.dirty_ranges()
+            if os.path.exists(save_path) and os.path.samefile(save_path, self.file_path):
+                write_ranges(save_path, ranges, journal=True)
+                # 映射与文件共享页面，写回后原始数据即为新内容
+                self.buffer.mark_saved()
+            else:
+                shutil.copyfile(self.file_path, save_path)
+                write_ranges(save_path, ranges, journal=False)
             return True
         except Exception as e:
             print(f"保存文件失败: {e}")
             return False
 
-def display_hex_view(data, bytes_per_line=16):
-    """显示十六进制和ASCII视图"""
-    for i in range(0, len(data), bytes_per_line):
-        chunk = data[i:i+bytes_per_line]
-        hex_str = ' '.join(f'{b:02X}' for b in chunk)
-        ascii_str = ''.join(chr(b) if 32 <= b <= 126 else '.' for b in chunk)
-        print(f"{i:08X}  {hex_str.ljust(bytes_per_line*3)}  |{ascii_str}|")
+def display_hex_view(data, bytes_per_line=16, offset=0, rows=16):
+    """显示十六进制和ASCII视图，只输出 offset 起的 rows 行"""
+    view = data if isinstance(data, HexView) else HexView(data, bytes_per_line)
+    print(view.window(offset, rows))
 
 def main():
     print("=== DAT文件修改器 ===")
@@ -63,32 +105,37 @@ def main():
     if not modifier.read_file():
         return
         
+    view = HexView(modifier.buffer)
+    view_offset = 0
+    indexes = None
+        
     while True:
         print("\n文件信息：")
-        print(f"文件大小: {len(modifier.data)} 字节")
+        print(f"文件大小: {len(modifier.buffer)} 字节")
         print("\n当前文件内容：")
-        display_hex_view(modifier.data)
+        display_hex_view(view, offset=view_offset)
         
         print("\n操作选项：")
         print("1. 修改字节")
         print("2. 保存文件")
-        print("3. 退出")
+        print("3. 撤销")
+        print("4. 重做")
+        print("5. 跳转到偏移")
+        print("6. 分析结果（随修改增量更新）")
+        print("7. 退出")
         
-        choice = input("请选择操作 (1-3): ")
+        choice = input("请选择操作 (1-7): ")
         
         if choice == '1':
             try:
-                print("\n当前文件内容：")
-                display_hex_view(modifier.data)
-                
                 offset = input("请输入要修改的字节位置（十六进制或十进制，例如0x10或16）：")
                 offset = int(offset, 0)
                 
-                if offset < 0 or offset >= len(modifier.data):
+                if offset < 0 or offset >= len(modifier.buffer):
                     print("错误：偏移量超出文件范围")
                     continue
                     
-                current_value = modifier.data[offset]
+                current_value = modifier.buffer[offset]
                 print(f"\n偏移量 {offset} (0x{offset:X}) 的当前值：0x{current_value:02X} ({current_value})")
                 
                 new_value = input("请输入新值（0-255，十六进制加0x前缀）：")
@@ -99,9 +146,9 @@ def main():
                     continue
                     
                 if modifier.modify_data(offset, new_value):
+                    view.invalidate(offset)
+                    view_offset = offset
                     print("修改成功")
-                    print("\n修改后的内容：")
-                    display_hex_view(modifier.data)
                 else:
                     print("修改失败")
                     
@@ -116,11 +163,42 @@ def main():
                 print("文件保存失败")
                 
         elif choice == '3':
+            print("撤销成功" if modifier.undo() else "没有可撤销的修改")
+            view.invalidate()
+            
+        elif choice == '4':
+            print("重做成功" if modifier.redo() else "没有可重做的修改")
+            view.invalidate()
+            
+        elif choice == '5':
+            try:
+                view_offset = int(input("请输入要查看的偏移（十六进制或十进制）："), 0)
+            except ValueError:
+                print("错误：请输入有效的数字")
+            
+        elif choice == '6':
+            if indexes is None:
+                keywords = [k.strip() for k in input("请输入关键词（逗号分隔，可留空）：").split(',') if k.strip()]
+                print("正在建立分析索引，之后的修改只重新计算受影响的区间...")
+                indexes = (StringIndex(modifier.buffer), KeywordIndex(modifier.buffer, keywords),
+                           StructureIndex(modifier.buffer), NGramIndex(modifier.buffer))
+            strings, keywords, structures, ngrams = indexes
+            print(f"\n字符串: {len(strings)} 个，当前位置附近：")
+            for hit in strings.iter_range(view_offset, view_offset + 256):
+                print(f"  0x{hit.offset:08X}: {hit.text}")
+            for keyword, count in keywords.counts.items():
+                print(f"关键词 {keyword}: {count} 次")
+            print(f"候选数组结构: {len(structures)} 处")
+            for width, result in ngrams.result()['patterns'].items():
+                note = '' if result.exact else '（近似计数）'
+                print(f"常见{width}字节模式{note}：" + ', '.join(f"{pattern.hex(' ')} ×{count}" for pattern, count in result.top))
+            
+        elif choice == '7':
             print("退出程序")
             break
             
         else:
-            print("无效选择，请输入1-3")
+            print("无效选择，请输入1-7")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
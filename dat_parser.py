@@ -1,8 +1,23 @@
+from typing import Optional
+from dat_schema import DAT_HEADER, SECTION_COUNT, SECTION_ENTRY, SECTION_TABLE_OFFSET, SectionIndex
 from file_handler import FileHandler
+from instrumentation import instrumented
+from layout_detector import MAX_STRIDE, detect_layout
 
 class DatParser(FileHandler):
-    def __init__(self, file_path):
-        super().__init__(file_path)
+    # 文件布局，可在子类中替换为其他 Layout 以解析不同格式
+    header_layout = DAT_HEADER
+    section_table_offset = SECTION_TABLE_OFFSET
+    section_count_layout = SECTION_COUNT
+    section_layout = SECTION_ENTRY
+    
+    def __init__(self, file_path, document=None):
+        super().__init__(file_path, document)
+        self._section_index = None
+        
+    def cleanup(self):
+        self._section_index = None
+        super().cleanup()
         
     def parse_header(self):
         """解析文件头"""
@@ -10,21 +25,9 @@ class DatParser(FileHandler):
             print("请先读取文件")
             return None
             
-        # 解析文件头
-        header = {}
         try:
-            # 读取文件标识符
-            header['magic'] = self.data[:12].decode('ascii', errors='ignore')
-            
-            # 读取版本号
-            header['version'] = struct.unpack('>I', self.data[12:16])[0]
-            
-            # 读取文件大小
-            header['file_size'] = struct.unpack('>I', self.data[16:20])[0]
-            
-            # 读取创建时间戳
-            header['timestamp'] = struct.unpack('>I', self.data[20:24])[0]
-            
+            header = self.header_layout.unpack(self.data)
+            header['magic'] = header['magic'].decode('ascii', errors='ignore')
             return header
         except Exception as e:
             print(f"解析文件头失败: {e}")
@@ -42,55 +45,90 @@ class DatParser(FileHandler):
         else:
             print("无法解析文件头")
             
+    @property
+    def section_index(self) -> Optional[SectionIndex]:
+        """段表索引，第一次访问时构建，之后重复使用"""
+        if not self.data:
+            return None
+        if self._section_index is None or self._section_index.data is not self.data:
+            layouts = {'count_layout': self.section_count_layout, 'entry_layout': self.section_layout}
+            
+            def build():
+                index = SectionIndex(self.data, self.section_table_offset, **layouts)
+                index.arrays()
+                return index
+                
+            self._section_index = self.cached_result(
+                f"sections-{self.section_table_offset}-{self.section_count_layout.format}-{self.section_layout.format}",
+                build,
+                lambda index: (index.arrays(), index.meta()),
+                lambda arrays, meta: SectionIndex.from_arrays(self.data, arrays, meta, **layouts)
+            )
+        return self._section_index
+        
+    @instrumented()
     def parse_data_sections(self):
-        """解析数据段"""
+        """解析数据段，返回 [{'type', 'size', 'offset'}]"""
         if not self.data:
             print("请先读取文件")
             return None
             
         try:
-            # 跳过文件头（32字节）
-            offset = 32
-            sections = []
-            
-            # 读取段数量
-            num_sections = struct.unpack('>I', self.data[offset:offset+4])[0]
-            offset += 4
+            index = self.section_index
+            if not index.complete:
+                raise ValueError(f"段表不完整：声明 {index.declared_count} 段，文件内只有 {len(index)} 段")
+            return [{'type': section_type, 'size': size, 'offset': offset}
+                    for section_type, size, offset in zip(index.types.tolist(), index.sizes.tolist(), index.offsets.tolist())]
+        except Exception as e:
+            print(f"解析数据段失败: {e}")
+            return None
             
-            for _ in range(num_sections):
-                # 读取段类型
-                section_type = struct.unpack('>I', self.data[offset:offset+4])[0]
-                offset += 4
-                
-                # 读取段大小
-                section_size = struct.unpack('>I', self.data[offset:offset+4])[0]
-                offset += 4
-                
-                # 保存段信息
-                sections.append({
-                    'type': section_type,
-                    'size': section_size,
-                    'offset': offset
-                })
-                
-                # 跳到下一段
-                offset += section_size
+    def iter_section_layouts(self, max_stride=MAX_STRIDE):
+        """逐段检测重复记录数组，产出 (段序号, RecordLayout)，没有检测到的段跳过
+
+        RecordLayout.start 为文件内的偏移。
+        """
+        index = self.section_index
+        if index is None or not index.complete:
+            return
+        for i, (size, offset) in enumerate(zip(index.sizes.tolist(), index.offsets.tolist())):
+            layout = detect_layout(self.data, offset, offset + size, max_stride)
+            if layout is not None:
+                yield i, layout
                 
-            return sections
+    @instrumented(count=lambda layouts: len(layouts) if layouts is not None else None)
+    def detect_section_layouts(self, max_stride=MAX_STRIDE):
+        """检测每个数据段中的重复记录数组，返回 [(段序号, RecordLayout)]"""
+        if not self.data:
+            print("请先读取文件")
+            return None
+            
+        try:
+            index = self.section_index
+            if not index.complete:
+                raise ValueError(f"段表不完整：声明 {index.declared_count} 段，文件内只有 {len(index)} 段")
+            return list(self.iter_section_layouts(max_stride))
         except Exception as e:
-            print(f"解析数据段失败: {e}")
+            print(f"检测记录布局失败: {e}")
+            return None
+            
+    def section_payload(self, index):
+        """返回第 index 段负载的只读视图（不复制）"""
+        sections = self.section_index
+        if sections is None:
             return None
+        return sections.payload(index)
             
     def display_sections(self):
         """显示数据段信息"""
-        sections = self.parse_data_sections()
-        if sections:
+        index = self.section_index
+        if index is not None and index.complete and len(index):
             print("\n数据段信息：")
-            for i, section in enumerate(sections):
+            for i, section in enumerate(index):
                 print(f"  段 {i+1}:")
-                print(f"    类型: 0x{section['type']:08X}")
-                print(f"    大小: {section['size']} 字节")
-                print(f"    偏移: 0x{section['offset']:08X}")
+                print(f"    类型: 0x{section.type:08X}")
+                print(f"    大小: {section.size} 字节")
+                print(f"    偏移: 0x{section.offset:08X}")
         else:
             print("无法解析数据段")
 
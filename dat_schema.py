@@ -0,0 +1,243 @@
+import struct
+from array import array
+from collections import namedtuple
+from typing import Dict, Iterator, List, Optional, Sequence, Union
+
+import numpy as np
+
+
+class Field:
+    """布局中的一个字段
+
+    fmt 为单个 struct 格式码（如 'I'、'H'、'12s'、'd'），或嵌套的 Layout；
+    count > 1 表示定长数组，解析结果为元组（嵌套布局则为字典列表）。
+    name 为 None 的字段是填充，只占位不输出。
+    """
+
+    def __init__(self, name: Optional[str], fmt: Union[str, 'Layout'], count: int = 1):
+        self.name = name
+        self.fmt = fmt
+        self.count = count
+
+    @classmethod
+    def padding(cls, size: int) -> 'Field':
+        return cls(None, f'{size}x')
+
+
+def _numpy_code(fmt: str) -> str:
+    """把 struct 格式码转换为 numpy dtype 字符串（不含字节序）"""
+    if fmt.endswith('s'):
+        return 'S' + (fmt[:-1] or '1')
+    if fmt.endswith('x'):
+        return 'V' + (fmt[:-1] or '1')
+    return np.dtype(fmt).str[1:]
+
+
+class Layout:
+    """声明式二进制布局，编译为预先构造的 struct.Struct
+
+    字段按顺序紧密排列（无自动对齐），字节序由 endian 统一指定：
+    '>' 大端，'<' 小端。嵌套布局继承外层字节序。
+    """
+
+    def __init__(self, name: str, fields: Sequence[Field], endian: str = '>'):
+        self.name = name
+        self.fields = list(fields)
+        self.endian = endian
+        self.struct = struct.Struct(endian + self.format)
+        self.size = self.struct.size
+        # 每个字段在扁平元组中的 (起始下标, 项数)
+        self._slots = []
+        index = 0
+        for field in self.fields:
+            items = self._item_count(field)
+            self._slots.append((index, items))
+            index += items
+        self._dtype = None
+
+    @property
+    def format(self) -> str:
+        """不含字节序前缀的扁平 struct 格式"""
+        parts = []
+        for field in self.fields:
+            if isinstance(field.fmt, Layout):
+                parts.append(field.fmt.format * field.count)
+            elif field.fmt[-1] in 'sx' or field.count == 1:
+                parts.append(field.fmt * field.count)
+            else:
+                parts.append(f'{field.count}{field.fmt}')
+        return ''.join(parts)
+
+    @staticmethod
+    def _item_count(field: Field) -> int:
+        if isinstance(field.fmt, Layout):
+            return sum(items for _, items in field.fmt._slots) * field.count
+        if field.fmt.endswith('x'):
+            return 0
+        return field.count
+
+    def _build(self, values: tuple, start: int = 0) -> dict:
+        result = {}
+        for field, (index, items) in zip(self.fields, self._slots):
+            if field.name is None:
+                continue
+            index += start
+            if isinstance(field.fmt, Layout):
+                width = items // field.count
+                nested = [field.fmt._build(values, index + i * width) for i in range(field.count)]
+                result[field.name] = nested[0] if field.count == 1 else nested
+            elif items == 1:
+                result[field.name] = values[index]
+            else:
+                result[field.name] = values[index:index + items]
+        return result
+
+    def unpack(self, data, offset: int = 0) -> dict:
+        """在 offset 处解析一条记录，返回 {字段名: 值}"""
+        return self._build(self.struct.unpack_from(data, offset))
+
+    def unpack_tuple(self, data, offset: int = 0) -> tuple:
+        """只返回扁平元组，热点循环中省去构造字典的开销"""
+        return self.struct.unpack_from(data, offset)
+
+    @property
+    def dtype(self) -> np.dtype:
+        """等价的 numpy 结构化 dtype，用于整表零拷贝解析"""
+        if self._dtype is None:
+            self._dtype = np.dtype(self._dtype_fields())
+        return self._dtype
+
+    def _dtype_fields(self) -> list:
+        fields = []
+        for i, field in enumerate(self.fields):
+            name = field.name or f'_pad{i}'
+            if isinstance(field.fmt, Layout):
+                sub = np.dtype(Layout(field.fmt.name, field.fmt.fields, self.endian)._dtype_fields())
+                fields.append((name, sub) if field.count == 1 else (name, sub, (field.count,)))
+            else:
+                code = _numpy_code(field.fmt)
+                if field.fmt[-1] not in 'sx':
+                    code = self.endian + code
+                fields.append((name, code) if field.count == 1 else (name, code, (field.count,)))
+        return fields
+
+    def unpack_array(self, data, offset: int = 0, count: Optional[int] = None) -> np.ndarray:
+        """把 offset 起连续的 count 条记录映射为结构化数组（不复制）"""
+        if count is None:
+            count = (len(data) - offset) // self.size
+        return np.frombuffer(data, dtype=self.dtype, count=count, offset=offset)
+
+
+# 数据段表中的一项：类型、负载大小、负载偏移
+Section = namedtuple('Section', ['type', 'size', 'offset'])
+
+
+class SectionIndex:
+    """数据段表的紧凑索引
+
+    段表只在第一次访问时遍历一次，类型/大小/偏移存放在 numpy 数组中
+    （每段 20 字节），之后的查询、显示都不再解析文件；索引也可以用
+    from_arrays() 从分析缓存直接还原。段负载通过 payload() 以
+    memoryview 切片返回，不复制数据。
+
+    段是变长的，下一段的位置依赖上一段的大小，无法向量化，
+    遍历循环只调用预编译的 Struct.unpack_from。entry_layout 的前两项
+    依次为段类型和负载大小。
+    """
+
+    def __init__(self, data, table_offset: int, count_layout: Layout, entry_layout: Layout):
+        self.data = data
+        self.table_offset = table_offset
+        self.count_layout = count_layout
+        self.entry_layout = entry_layout
+        self.declared_count = 0
+        # 段表是否完整（声明的段数全部在文件范围内）
+        self.complete = False
+        self.types: Optional[np.ndarray] = None
+        self.sizes: Optional[np.ndarray] = None
+        self.offsets: Optional[np.ndarray] = None
+
+    @classmethod
+    def from_arrays(cls, data, arrays: Dict[str, np.ndarray], meta: dict, **layouts) -> 'SectionIndex':
+        """用 arrays()/meta() 保存的结果还原索引"""
+        index = cls(data, meta['table_offset'], **layouts)
+        index.declared_count = meta['declared_count']
+        index.complete = meta['complete']
+        index.types, index.sizes, index.offsets = arrays['type'], arrays['size'], arrays['offset']
+        return index
+
+    def _build(self):
+        types, sizes, offsets = array('I'), array('Q'), array('Q')
+        add_type, add_size, add_offset = types.append, sizes.append, offsets.append
+        data = self.data
+        total = len(data)
+        offset = self.table_offset
+        complete = False
+        if offset + self.count_layout.size <= total:
+            self.declared_count = self.count_layout.unpack_tuple(data, offset)[0]
+            offset += self.count_layout.size
+            unpack_from = self.entry_layout.struct.unpack_from
+            entry_size = self.entry_layout.size
+            last = total - entry_size
+            for _ in range(self.declared_count):
+                if offset > last:
+                    break
+                values = unpack_from(data, offset)
+                offset += entry_size
+                add_type(values[0])
+                add_size(values[1])
+                add_offset(offset)
+                offset += values[1]
+            else:
+                complete = offset <= total
+        self.types = np.frombuffer(types, dtype=np.uint32) if types else np.empty(0, np.uint32)
+        self.sizes = np.frombuffer(sizes, dtype=np.uint64) if sizes else np.empty(0, np.uint64)
+        self.offsets = np.frombuffer(offsets, dtype=np.uint64) if offsets else np.empty(0, np.uint64)
+        self.complete = complete
+
+    def _ensure(self):
+        if self.offsets is None:
+            self._build()
+
+    def __len__(self) -> int:
+        self._ensure()
+        return len(self.offsets)
+
+    def __getitem__(self, index: int) -> Section:
+        self._ensure()
+        return Section(int(self.types[index]), int(self.sizes[index]), int(self.offsets[index]))
+
+    def __iter__(self) -> Iterator[Section]:
+        self._ensure()
+        return map(Section, self.types.tolist(), self.sizes.tolist(), self.offsets.tolist())
+
+    def payload(self, index: int) -> memoryview:
+        """第 index 段的负载（零拷贝切片，超出文件的部分被截断）"""
+        section = self[index]
+        return memoryview(self.data)[section.offset:section.offset + section.size]
+
+    def find(self, section_type: int) -> List[int]:
+        """返回指定类型的全部段下标"""
+        self._ensure()
+        return np.flatnonzero(self.types == section_type).tolist()
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        self._ensure()
+        return {'type': self.types, 'size': self.sizes, 'offset': self.offsets}
+
+    def meta(self) -> dict:
+        self._ensure()
+        return {'table_offset': self.table_offset, 'declared_count': self.declared_count, 'complete': self.complete}
+
+
+# 默认 .dat 布局：32 字节文件头，之后是段数量和变长段 (类型, 大小, 负载)
+DAT_HEADER = Layout('header', [
+    Field('magic', '12s'),
+    Field('version', 'I'),
+    Field('file_size', 'I'),
+    Field('timestamp', 'I'),
+    Field.padding(8)
+])
+SECTION_TABLE_OFFSET = DAT_HEADER.size
+SECTION_COUNT = Layout('section_count', [Field('count', 'I')])
+SECTION_ENTRY = Layout('section', [Field('type', 'I'), Field('size', 'I')])
@@ -1,48 +1,138 @@
-import struct
-from collections import Counter
-from dat_modifier import DatModifier
+import numpy as np
+from document import DocumentReader
+from instrumentation import instrumented
+from entropy_map import REGION_NAMES, WindowStats, classify_windows, iter_window_stats, segment_regions, summarize_regions
+from ngram_stats import NGramResult, byte_histogram, count_ngrams
 
-class DataAnalyzer:
-    def __init__(self, file_path):
-        self.file_path = file_path
-        self.data = None
+class DataAnalyzer(DocumentReader):
+    def __init__(self, file_path, document=None):
+        super().__init__(file_path, document)
         
-    def read_file(self):
-        """读取.dat文件"""
-        modifier = DatModifier(self.file_path)
-        if modifier.read_file():
-            self.data = modifier.data
-            return True
-        return False
-        
-    def analyze_patterns(self):
-        """分析数据模式"""
+    def analyze_patterns(self, widths=(4,), top_k=5):
+        """分析数据模式，返回字节频率和各宽度的常见 n-gram"""
         if not self.data:
             print("请先读取文件")
             return None
             
         try:
-            # 分析字节频率
-            byte_freq = Counter(self.data)
+            result = self.find_patterns(widths, top_k)
+            
             print("\n字节频率分析：")
-            for byte, freq in byte_freq.most_common(10):
+            for byte, freq in result['byte_freq']:
                 print(f"  字节 0x{byte:02X}: {freq} 次")
                 
-            # 查找常见模式
-            patterns = {}
-            for i in range(len(self.data) - 4):
-                pattern = self.data[i:i+4]
-                patterns[pattern] = patterns.get(pattern, 0) + 1
-                
-            print("\n常见4字节模式：")
-            for pattern, count in sorted(patterns.items(), key=lambda x: x[1], reverse=True)[:5]:
-                print(f"  模式 {pattern.hex(' ')}: {count} 次")
-                
+            for width, ngrams in result['patterns'].items():
+                note = '' if ngrams.exact else '（近似计数）'
+                print(f"\n常见{width}字节模式{note}：")
+                for pattern, count in ngrams.top:
+                    print(f"  模式 {pattern.hex(' ')}: {count} 次")
+                    
+            return result
         except Exception as e:
             print(f"数据分析失败: {e}")
             return None
+            
+    @instrumented(count=lambda result: len(result['patterns']) if result else None)
+    def find_patterns(self, widths=(4,), top_k=5):
+        """计算（或从缓存读取）字节频率和常见 n-gram，不打印"""
+        kind = f"patterns-w{'_'.join(map(str, widths))}-top{top_k}"
+        return self.cached_result(
+            kind,
+            lambda: self.compute_patterns(widths, top_k),
+            self.encode_patterns,
+            self.decode_patterns
+        )
+        
+    def compute_patterns(self, widths=(4,), top_k=5):
+        # 分析字节频率
+        hist = byte_histogram(self.data)
+        byte_freq = [(int(b), int(hist[b])) for b in np.argsort(-hist, kind='stable')[:10] if hist[b]]
+        
+        # 查找常见模式
+        patterns = {}
+        for width in widths:
+            patterns[width] = count_ngrams(self.data, width, top_k)
+            
+        return {
+            'byte_freq': byte_freq,
+            'patterns': patterns
+        }
+        
+    @staticmethod
+    def encode_patterns(result):
+        """把分析结果转换为缓存数组：字节频率表，以及每个宽度的模式和次数"""
+        arrays = {'byte_freq': np.array(result['byte_freq'], dtype=np.int64).reshape(-1, 2)}
+        meta = {}
+        for width, ngrams in result['patterns'].items():
+            arrays[f'keys{width}'] = np.frombuffer(
+                b''.join(pattern for pattern, _ in ngrams.top), dtype=np.uint8).reshape(-1, width)
+            arrays[f'counts{width}'] = np.array([count for _, count in ngrams.top], dtype=np.int64)
+            meta[str(width)] = {'total': ngrams.total, 'exact': ngrams.exact}
+        return arrays, meta
+        
+    @staticmethod
+    def decode_patterns(arrays, meta):
+        patterns = {}
+        for key, info in meta.items():
+            width = int(key)
+            top = [(row.tobytes(), count) for row, count in zip(arrays[f'keys{width}'], arrays[f'counts{width}'].tolist())]
+            patterns[width] = NGramResult(width, info['total'], top, info['exact'])
+        return {
+            'byte_freq': [tuple(pair) for pair in arrays['byte_freq'].tolist()],
+            'patterns': patterns
+        }
+
+    @instrumented(count=lambda result: len(result[2]) if result else None)
+    def find_regions(self, window=4096, stride=None, progress=None):
+        """计算（或从缓存读取）滑动窗口统计并分段，返回 (WindowStats, 类别数组, [Region])
+
+        progress(已处理字节数) 在每批窗口处理后调用，可用于汇报进度或抛出取消。
+        """
+        def compute():
+            parts = []
+            for part in iter_window_stats(self.data, window, stride):
+                parts.append(part)
+                if progress:
+                    progress(int(part.offsets[-1]) + int(part.lengths[-1]))
+            return WindowStats(*(np.concatenate(column) for column in zip(*parts))) if parts else None
+            
+        stats = self.cached_result(
+            f"entropy-w{window}-s{stride or window}",
+            compute,
+            lambda stats: (stats._asdict(), {}),
+            lambda arrays, meta: WindowStats(**arrays)
+        )
+        if stats is None:
+            return None
+        kinds = classify_windows(stats)
+        return stats, kinds, segment_regions(stats, kinds, len(self.data))
+        
+    def analyze_regions(self, window=4096, stride=None, limit=50):
+        """按熵、可打印比例和零字节比例划分文件区域并打印"""
+        if not self.data:
+            print("请先读取文件")
+            return None
+            
+        try:
+            result = self.find_regions(window, stride)
+            if result is None:
+                return None
+            _, _, regions = result
+            print(f"\n区域划分（窗口 {window} 字节）：")
+            for region in regions[:limit]:
+                print(f"  0x{region.start:08X}-0x{region.end:08X}  {REGION_NAMES[region.kind]}  熵 {region.entropy:.2f}")
+            if len(regions) > limit:
+                print(f"  ... 共 {len(regions)} 个区域")
+            for kind, size in summarize_regions(regions).items():
+                if size:
+                    print(f"  {REGION_NAMES[kind]}: {size} 字节 ({size * 100 / len(self.data):.1f}%)")
+            return regions
+        except Exception as e:
+            print(f"区域分析失败: {e}")
+            return None
 
 if __name__ == "__main__":
     analyzer = DataAnalyzer('SystemData.dat')
     if analyzer.read_file():
-        analyzer.analyze_patterns()
\ No newline at end of file
+        analyzer.analyze_patterns()
+        analyzer.analyze_regions()
\ No newline at end of file
@@ -1,52 +1,138 @@
+import os
 import struct
-from dat_modifier import DatModifier
+from document import DocumentReader
+from encoded_strings import (EncodingScanner, encodings_cache_kind, iter_decoded, parse_encodings,
+                             runs_from_arrays, runs_to_arrays)
+from file_carver import (MAX_CARVE_SIZE, FileCarver, carve_cache_kind, carved_from_arrays, carved_to_arrays,
+                         save_carved)
+from instrumentation import instrumented
+from parallel_scan import parallel_scan
+from string_scanner import hits_from_arrays, hits_to_arrays, iter_strings, string_cache_kind
 
-class DataExtractor:
-    def __init__(self, file_path):
-        self.file_path = file_path
-        self.data = None
+class DataExtractor(DocumentReader):
+    def __init__(self, file_path, document=None):
+        super().__init__(file_path, document)
         
-    def read_file(self):
-        """读取.dat文件"""
-        modifier = DatModifier(self.file_path)
-        if modifier.read_file():
-            self.data = modifier.data
-            return True
-        return False
-        
-    def extract_strings(self, min_length=4):
+    def extract_strings(self, min_length=4, workers=None):
         """提取可打印字符串"""
+        hits = self.extract_string_hits(min_length, workers)
+        if hits is None:
+            return None
+        return [hit.text for hit in hits]
+
+    @instrumented()
+    def extract_string_hits(self, min_length=4, workers=None):
+        """提取可打印字符串，每项为 StringHit(offset, length, text)
+
+        workers 大于1时交给多进程分块扫描引擎。
+        """
         if not self.data:
             print("请先读取文件")
             return None
             
         try:
-            strings = []
-            current_string = ""
-            
-            for byte in self.data:
-                if 32 <= byte <= 126:  # 可打印ASCII范围
-                    current_string += chr(byte)
-                else:
-                    if len(current_string) >= min_length:
-                        strings.append(current_string)
-                    current_string = ""
-                    
-            if len(current_string) >= min_length:
-                strings.append(current_string)
+            def compute():
+                if workers and workers > 1:
+                    return parallel_scan(self.file_path, 'strings', workers, min_length=min_length)
+                return list(iter_strings(self.data, min_length))
                 
-            return strings
+            return self.cached_result(
+                string_cache_kind(min_length), compute, hits_to_arrays,
+                lambda arrays, meta: hits_from_arrays(self.data, arrays)
+            )
         except Exception as e:
             print(f"字符串提取失败: {e}")
             return None
+
+    def iter_string_hits(self, min_length=4):
+        """以生成器方式逐个产出字符串命中，便于边扫描边处理"""
+        if not self.data:
+            print("请先读取文件")
+            return iter(())
+        return iter_strings(self.data, min_length)
+            
+    @instrumented(count=lambda runs: len(runs.offsets) if runs is not None else None)
+    def extract_encoded_runs(self, encodings=None, workers=None):
+        """一遍扫描提取多种编码（ASCII/UTF-8/GBK/UTF-16LE/UTF-16BE）的字符串
+
+        encodings 为 {编码: 最小字符数}、编码列表或 'ascii,utf-16le:6' 形式的字符串，
+        默认全部编码。返回 StringRuns 数组（偏移、字节长度、编码），不解码文本。
+        """
+        if not self.data:
+            print("请先读取文件")
+            return None
+            
+        try:
+            min_lengths = parse_encodings(encodings)
+            
+            def compute():
+                if workers and workers > 1:
+                    return parallel_scan(self.file_path, 'encoded_strings', workers, min_lengths=min_lengths)
+                return EncodingScanner(min_lengths).scan(self.data)
+                
+            return self.cached_result(encodings_cache_kind(min_lengths), compute, runs_to_arrays, runs_from_arrays)
+        except Exception as e:
+            print(f"字符串提取失败: {e}")
+            return None
+            
+    def extract_encoded_strings(self, encodings=None, workers=None):
+        """提取多编码字符串，每项为 EncodedString(offset, length, encoding, text)"""
+        runs = self.extract_encoded_runs(encodings, workers)
+        if runs is None:
+            return None
+        return list(iter_decoded(self.data, runs))
+        
+    def iter_encoded_runs(self, encodings=None):
+        """逐块产出 (块结束偏移, StringRuns)，便于边扫描边显示、按需解码"""
+        if not self.data:
+            print("请先读取文件")
+            return iter(())
+        return EncodingScanner(parse_encodings(encodings)).iter_chunk_runs(self.data)
+            
+    @instrumented(count=lambda carved: len(carved) if carved is not None else None)
+    def carve_files(self, names=None, max_size=MAX_CARVE_SIZE, workers=None):
+        """按签名表查找内嵌文件（PNG、JPEG、zlib、gzip、ZIP、SQLite 等），每项为 CarvedFile
+
+        names 限定文件类型，默认全部；workers 大于1时交给多进程分块扫描引擎。
+        """
+        if not self.data:
+            print("请先读取文件")
+            return None
+            
+        try:
+            names = tuple(names or ())
+            
+            def compute():
+                carver = FileCarver(names, max_size)
+                if workers and workers > 1:
+                    return parallel_scan(self.file_path, 'carve', workers, carver=carver)
+                return list(carver.iter_carved(self.data))
+                
+            return self.cached_result(carve_cache_kind(names, max_size), compute, carved_to_arrays, carved_from_arrays)
+        except Exception as e:
+            print(f"内嵌文件查找失败: {e}")
+            return None
+            
+    def save_carved_files(self, carved_files, output_dir):
+        """把内嵌文件从映射直接写入 output_dir，返回写入的路径列表"""
+        if not self.data:
+            print("请先读取文件")
+            return None
+            
+        try:
+            os.makedirs(output_dir, exist_ok=True)
+            return [save_carved(self.data, carved, output_dir) for carved in carved_files]
+        except OSError as e:
+            print(f"导出内嵌文件失败: {e}")
+            return None
             
     def display_strings(self, min_length=4):
         """显示提取的字符串"""
-        strings = self.extract_strings(min_length)
-        if strings:
+        hits = self.extract_string_hits(min_length)
+        if hits:
             print("\n提取的字符串：")
-            for s in strings:
-                print(f"  {s}")
+            for hit in hits:
+                print(f"  0x{hit.offset:08X}  {hit.text}")
         else:
             print("未找到符合条件的字符串")
 
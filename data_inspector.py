@@ -1,40 +1,78 @@
-import struct
-from dat_modifier import DatModifier
+from document import DocumentReader
+from instrumentation import instrumented
+from keyword_search import KeywordMatcher, encode_keyword, keyword_context
+from layout_detector import BLOCK_SIZE, format_layout, iter_block_layouts
+from parallel_scan import parallel_scan
+from pattern_search import compile_pattern, iter_pattern_hits
+from structure_scanner import candidates_from_arrays, candidates_to_arrays, scan_structures, structure_cache_kind
 
-class DataInspector:
-    def __init__(self, file_path):
-        self.file_path = file_path
-        self.data = None
+class DataInspector(DocumentReader):
+    def __init__(self, file_path, document=None):
+        super().__init__(file_path, document)
         
-    def read_file(self):
-        """读取.dat文件"""
-        modifier = DatModifier(self.file_path)
-        if modifier.read_file():
-            self.data = modifier.data
-            return True
-        return False
-        
-    def find_keywords(self, keywords):
-        """查找特定关键词"""
+    @instrumented(count=lambda results: sum(info['count'] for info in results.values()) if results is not None else None)
+    def find_keywords(self, keywords, workers=None):
+        """查找特定关键词的全部出现位置，workers 大于1时多进程分块扫描"""
         if not self.data:
             print("请先读取文件")
             return None
             
         try:
+            if workers and workers > 1:
+                hits = parallel_scan(self.file_path, 'keywords', workers, keywords=list(keywords))
+            else:
+                hits = KeywordMatcher(keywords).iter_matches(self.data)
             results = {}
-            for keyword in keywords:
-                keyword_bytes = keyword.encode('utf-8')
-                offset = self.data.find(keyword_bytes)
-                if offset != -1:
-                    results[keyword] = {
+            for keyword, offset in hits:
+                info = results.get(keyword)
+                if info is None:
+                    raw_data = keyword_context(self.data, offset, len(encode_keyword(keyword)))
+                    info = results[keyword] = {
                         'offset': offset,
-                        'context': self.data[offset-32:offset+len(keyword_bytes)+32].hex(' '),
-                        'raw_data': self.data[offset-32:offset+len(keyword_bytes)+32]
+                        'offsets': [],
+                        'count': 0,
+                        'context': raw_data.hex(' '),
+                        'raw_data': raw_data
                     }
+                info['offsets'].append(offset)
+                info['count'] += 1
             return results
         except Exception as e:
             print(f"关键词查找失败: {e}")
             return None
+
+    def iter_keywords(self, keywords):
+        """单遍扫描，逐个产出 (关键词, 偏移)"""
+        if not self.data:
+            print("请先读取文件")
+            return iter(())
+        return KeywordMatcher(keywords).iter_matches(self.data)
+            
+    @instrumented()
+    def find_pattern(self, pattern, kind='hex', workers=None):
+        """查找十六进制特征（如 '4B 69 ?? 6C ?0'）或字节正则的全部匹配，返回 [(偏移, 长度)]
+
+        正则总是单进程扫描：各块不知道前一块最后一个匹配的结尾，
+        分块结果会出现整体扫描中没有的重叠匹配。
+        """
+        if not self.data:
+            print("请先读取文件")
+            return None
+            
+        try:
+            if workers and workers > 1 and kind != 'regex':
+                return parallel_scan(self.file_path, 'signatures', workers, pattern=pattern, kind=kind)
+            return list(iter_pattern_hits(self.data, compile_pattern(pattern, kind)))
+        except Exception as e:
+            print(f"特征查找失败: {e}")
+            return None
+            
+    def iter_pattern(self, pattern, kind='hex'):
+        """按偏移顺序逐个产出 (偏移, 长度)，便于边扫描边处理"""
+        if not self.data:
+            print("请先读取文件")
+            return iter(())
+        return iter_pattern_hits(self.data, compile_pattern(pattern, kind))
             
     def display_keywords(self, keywords):
         """显示找到的关键词信息"""
@@ -43,56 +81,71 @@ class DataInspector:
             print("\n找到的关键词：")
             for keyword, info in results.items():
                 print(f"  关键词: {keyword}")
-                print(f"    偏移: 0x{info['offset']:08X}")
+                print(f"    命中次数: {info['count']}")
+                print(f"    首次偏移: 0x{info['offset']:08X}")
                 print(f"    上下文: {info['context']}")
         else:
             print("未找到指定的关键词")
             
-    def analyze_data_structures(self, chunk_size=1024*1024):
-        """分析潜在的数据结构，采用分块处理"""
+    @instrumented(count=lambda candidates: len(candidates.offsets) if candidates is not None else None)
+    def scan_structures(self, chunk_size=1024*1024, workers=None):
+        """扫描候选数组结构，返回 StructureCandidates 数组集合"""
         if not self.data:
             return None
+        
+        def compute():
+            if workers and workers > 1:
+                return parallel_scan(self.file_path, 'structures', workers)
+            return scan_structures(self.data, chunk_size)
             
-        try:
-            result = []
-            array_candidates = []
+        return self.cached_result(structure_cache_kind(), compute, candidates_to_arrays, candidates_from_arrays)
             
-            # 分块处理数据
-            for chunk_start in range(0, len(self.data), chunk_size):
-                chunk_end = min(chunk_start + chunk_size + 8, len(self.data))
-                chunk = self.data[chunk_start:chunk_end]
-                
-                # 查找可能的数组结构
-                for i in range(0, len(chunk) - 8):
-                    count = struct.unpack('>I', chunk[i:i+4])[0]
-                    size = struct.unpack('>I', chunk[i+4:i+8])[0]
-                    if 0 < count < 1000 and 0 < size < 1000:
-                        array_candidates.append({
-                            'offset': chunk_start + i,
-                            'count': count,
-                            'size': size
-                        })
-                        
-            # 对结果进行去重和排序
-            array_candidates = sorted(
-                {c['offset']: c for c in array_candidates}.values(),
-                key=lambda x: x['offset']
-            )
+    @staticmethod
+    def format_structures(candidates, limit=5):
+        """把候选结构格式化为文本，只列出前 limit 个"""
+        result = []
+        if len(candidates.offsets):
+            result.append(f"找到可能的数组结构（共 {len(candidates.offsets)} 处）：")
+            for i in range(min(limit, len(candidates.offsets))):
+                endian = '大端' if candidates.big_endian[i] else '小端'
+                result.append(f"  偏移: 0x{int(candidates.offsets[i]):08X} ({endian})")
+                result.append(f"    元素数量: {int(candidates.counts[i])}")
+                result.append(f"    元素大小: {int(candidates.sizes[i])} 字节")
+        else:
+            result.append("未找到明显的数组结构")
+        return '\n'.join(result)
             
-            if array_candidates:
-                result.append("找到可能的数组结构：")
-                for candidate in array_candidates[:5]:  # 显示前5个
-                    result.append(f"  偏移: 0x{candidate['offset']:08X}")
-                    result.append(f"    元素数量: {candidate['count']}")
-                    result.append(f"    元素大小: {candidate['size']} 字节")
-            else:
-                result.append("未找到明显的数组结构")
-                
-            return '\n'.join(result)
+    def analyze_data_structures(self, chunk_size=1024*1024, workers=None):
+        """分析潜在的数据结构，采用分块向量化处理"""
+        if not self.data:
+            return None
+            
+        try:
+            return self.format_structures(self.scan_structures(chunk_size, workers))
         except Exception as e:
             print(f"数据结构分析失败: {e}")
             return None
 
+    @instrumented(count=lambda layouts: len(layouts) if layouts is not None else None)
+    def detect_layouts(self, block_size=BLOCK_SIZE):
+        """没有段表时按块检测重复记录数组，返回 RecordLayout 列表"""
+        if not self.data:
+            return None
+            
+        try:
+            return list(iter_block_layouts(self.data, block_size=block_size))
+        except Exception as e:
+            print(f"检测记录布局失败: {e}")
+            return None
+            
+    @staticmethod
+    def format_layouts(layouts):
+        """把检测到的记录数组格式化为文本"""
+        if not layouts:
+            return "未找到重复记录数组"
+        return '\n'.join([f"找到重复记录数组（共 {len(layouts)} 处）："] +
+                         [format_layout(layout) for layout in layouts])
+
 if __name__ == "__main__":
     inspector = DataInspector('SystemData.dat')
     if inspector.read_file():
@@ -0,0 +1,207 @@
+import mmap
+import os
+import threading
+from typing import Callable, Dict, Iterable, Optional
+
+from analysis_cache import default_cache
+from instrumentation import instrumentation
+
+
+class DatDocument:
+    """共享的只读文件映射
+
+    同一路径只映射一次，各分析器通过 view() 拿到只读 memoryview，
+    不再各自复制整个文件。文档按引用计数管理，最后一个使用者
+    release() 时才真正关闭映射。
+    """
+
+    _registry: Dict[str, 'DatDocument'] = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.key = self.make_key(file_path)
+        self._lock = threading.Lock()
+        self._refcount = 0
+        with open(file_path, 'rb') as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.stat = self.file_identity(os.fstat(f.fileno()))
+        self.size = len(self.mmap)
+
+    @staticmethod
+    def make_key(file_path: str) -> str:
+        return os.path.normcase(os.path.realpath(file_path))
+
+    @staticmethod
+    def file_identity(stat: os.stat_result):
+        """(大小, inode, 修改时间)：文件被同样大小的新文件替换或被改写时也会变化"""
+        return stat.st_size, stat.st_ino, stat.st_mtime_ns
+
+    def is_stale(self) -> bool:
+        """磁盘上的文件是否已不是映射时的那个版本"""
+        try:
+            return self.file_identity(os.stat(self.file_path)) != self.stat
+        except OSError:
+            return True
+
+    @classmethod
+    def open(cls, file_path: str) -> 'DatDocument':
+        """打开（或复用已打开的）文档，并持有一个引用"""
+        key = cls.make_key(file_path)
+        with cls._registry_lock:
+            document = cls._registry.get(key)
+            # 文件被替换或改写后映射已过期（同样大小的新存档也算），重新映射
+            if document is None or document.closed or document.is_stale():
+                document = cls(file_path)
+                cls._registry[key] = document
+            return document.acquire()
+
+    @classmethod
+    def close_path(cls, file_path: str):
+        """强制关闭该路径的共享映射（如果有），之后的 open 会重新映射"""
+        with cls._registry_lock:
+            document = cls._registry.get(cls.make_key(file_path))
+        if document is not None:
+            document.close()
+
+    @property
+    def closed(self) -> bool:
+        return self.mmap is None
+
+    @property
+    def refcount(self) -> int:
+        return self._refcount
+
+    def acquire(self) -> 'DatDocument':
+        """增加一个引用"""
+        with self._lock:
+            if self.closed:
+                raise ValueError(f"文档已关闭: {self.file_path}")
+            self._refcount += 1
+        return self
+
+    def release(self):
+        """释放一个引用，引用归零时关闭映射"""
+        with DatDocument._registry_lock, self._lock:
+            if self._refcount <= 0:
+                return
+            self._refcount -= 1
+            if not self._refcount:
+                self._close_locked()
+
+    def view(self) -> memoryview:
+        """返回整个文件的只读 memoryview"""
+        if self.closed:
+            raise ValueError(f"文档已关闭: {self.file_path}")
+        return memoryview(self.mmap)
+
+    def close(self):
+        """强制关闭映射并从共享表中移除"""
+        with DatDocument._registry_lock, self._lock:
+            self._refcount = 0
+            self._close_locked()
+
+    def _close_locked(self):
+        if DatDocument._registry.get(self.key) is self:
+            del DatDocument._registry[self.key]
+        if self.mmap is None:
+            return
+        try:
+            self.mmap.close()
+        except BufferError:
+            # 仍有视图在外部使用（例如 numpy 数组），交给垃圾回收处理
+            pass
+        self.mmap = None
+
+
+def release_view(view):
+    """释放 memoryview，仍被引用时忽略"""
+    if isinstance(view, memoryview):
+        try:
+            view.release()
+        except BufferError:
+            pass
+
+
+class DocumentReader:
+    """通过共享文档读取文件的基类"""
+
+    def __init__(self, file_path: str, document: Optional[DatDocument] = None):
+        self.file_path = file_path
+        self.document = document
+        self.data = None
+        self._attached: Optional[DatDocument] = None
+        # 磁盘分析缓存，设为 None 可关闭
+        self.cache = default_cache()
+
+    def read_file(self) -> bool:
+        """读取.dat文件，复用已映射的文档而不复制数据"""
+        self.cleanup()
+        try:
+            if self.document is not None and not self.document.closed:
+                self._attached = self.document.acquire()
+            else:
+                self._attached = DatDocument.open(self.file_path)
+                self.document = self._attached
+            self.data = self._attached.view()
+            return True
+        except Exception as e:
+            print(f"文件读取失败: {e}")
+            return False
+
+    def cleanup(self):
+        """释放数据视图和文档引用"""
+        release_view(self.data)
+        self.data = None
+        if self._attached is not None:
+            self._attached.release()
+            self._attached = None
+
+    def load_cached(self, kind: str, decode: Callable):
+        """只查磁盘缓存，未命中或缓存关闭时返回 None"""
+        if self.cache is None:
+            return None
+        try:
+            entry = self.cache.load(self.file_path, kind)
+            if entry is not None:
+                instrumentation.note_cache_hit()
+                return decode(*entry)
+        except Exception as e:
+            print(f"读取分析缓存失败: {e}")
+        return None
+
+    def store_cached(self, kind: str, result, encode: Callable):
+        """把结果写入磁盘缓存，出错时只打印提示"""
+        if self.cache is None or result is None:
+            return
+        try:
+            arrays, meta = encode(result)
+            self.cache.save(self.file_path, kind, arrays, meta)
+        except Exception as e:
+            print(f"写入分析缓存失败: {e}")
+
+    def cached_result(self, kind: str, compute: Callable, encode: Callable, decode: Callable):
+        """先查磁盘缓存，未命中时计算并写入缓存
+
+        encode(result) 返回 (数组字典, 元数据)；decode(数组字典, 元数据) 还原结果。
+        缓存出错时只打印提示，不影响分析本身。
+        """
+        result = self.load_cached(kind, decode)
+        if result is None:
+            result = compute()
+            self.store_cached(kind, result, encode)
+        return result
+
+    def iter_cached_parts(self, kind: str, parts: Iterable, merge: Callable, encode: Callable, decode: Callable):
+        """边扫描边消费的缓存版本：命中时只产出一个完整结果；未命中时逐块
+        产出 parts，全部产出后合并写入缓存。中途停止消费（如任务取消）则不写入。
+        """
+        cached = self.load_cached(kind, decode)
+        if cached is not None:
+            yield cached
+            return
+        collected = []
+        for part in parts:
+            collected.append(part)
+            yield part
+        self.store_cached(kind, merge(collected), encode)
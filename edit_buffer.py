@@ -0,0 +1,211 @@
+from bisect import bisect_left, insort
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Tuple
+
+# 编辑监听函数：listener(偏移, 改动前数据, 改动后数据)，在数据已更新后调用
+EditListener = Callable[[int, bytes, bytes], None]
+
+
+class EditBuffer:
+    """只读映射之上的稀疏脏页编辑层
+
+    原始数据保持只读，只有被改动的页才会复制一份到内存中。每次写入
+    记录 (偏移, 旧数据, 新数据)，撤销/重做只需回放这些记录，开销与
+    改动量成正比，与文件大小无关。编辑为覆盖写，文件长度不变。
+
+    写入、撤销和重做都会通知已注册的监听函数，增量分析索引据此只
+    重新计算被改动的区间。
+    """
+
+    def __init__(self, base, page_size: int = 4096):
+        self.base = base
+        self.size = len(base)
+        self.page_size = page_size
+        self._pages = {}
+        self._dirty: List[int] = []
+        self._undo: List[List[Tuple[int, bytes, bytes]]] = []
+        self._redo: List[List[Tuple[int, bytes, bytes]]] = []
+        self._batch = None
+        self._batch_depth = 0
+        self._listeners: List[EditListener] = []
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.size)
+            data = self.read(start, max(stop - start, 0))
+            return data if step == 1 else data[::step]
+        if key < 0:
+            key += self.size
+        if not 0 <= key < self.size:
+            raise IndexError("偏移量超出文件范围")
+        page = self._pages.get(key // self.page_size)
+        if page is not None:
+            return page[key % self.page_size]
+        return self.base[key]
+
+    @property
+    def is_dirty(self) -> bool:
+        return bool(self._pages)
+
+    def dirty_pages(self) -> List[int]:
+        """返回已复制到内存的页号（升序）"""
+        return list(self._dirty)
+
+    def dirty_ranges(self) -> List[Tuple[int, bytes]]:
+        """返回与原始数据不同的区间 [(偏移, 新数据)]，相邻页合并为一段"""
+        ranges = []
+        end = None
+        for index in self._dirty:
+            start = index * self.page_size
+            page = self._pages[index]
+            if page == self.base[start:start + len(page)]:
+                continue
+            if start == end:
+                ranges[-1][1].append(page)
+            else:
+                ranges.append((start, [page]))
+            end = start + len(page)
+        return [(start, b''.join(pages)) for start, pages in ranges]
+
+    def add_listener(self, listener: EditListener):
+        """注册编辑监听函数"""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: EditListener):
+        """注销编辑监听函数"""
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _notify(self, offset: int, before: bytes, after: bytes):
+        for listener in list(self._listeners):
+            listener(offset, before, after)
+
+    def mark_saved(self):
+        """修改已写回原始数据后调用，丢弃脏页（撤销记录保留）"""
+        self._pages.clear()
+        self._dirty.clear()
+
+    def _page(self, index: int) -> bytearray:
+        page = self._pages.get(index)
+        if page is None:
+            start = index * self.page_size
+            page = bytearray(self.base[start:start + self.page_size])
+            self._pages[index] = page
+            insort(self._dirty, index)
+        return page
+
+    def read(self, offset: int, length: int) -> bytes:
+        """读取 [offset, offset+length)，结果包含未保存的修改"""
+        end = min(offset + length, self.size)
+        if offset >= end:
+            return b''
+        first = offset // self.page_size
+        last = (end - 1) // self.page_size
+        i = bisect_left(self._dirty, first)
+        if i == len(self._dirty) or self._dirty[i] > last:
+            return bytes(self.base[offset:end])
+
+        parts = []
+        pos = offset
+        while i < len(self._dirty) and self._dirty[i] <= last:
+            index = self._dirty[i]
+            page_start = index * self.page_size
+            if pos < page_start:
+                parts.append(self.base[pos:page_start])
+                pos = page_start
+            page_end = min(page_start + self.page_size, end)
+            parts.append(self._pages[index][pos - page_start:page_end - page_start])
+            pos = page_end
+            i += 1
+        if pos < end:
+            parts.append(self.base[pos:end])
+        return b''.join(parts)
+
+    def _apply(self, offset: int, data: bytes):
+        pos = 0
+        while pos < len(data):
+            index, page_offset = divmod(offset + pos, self.page_size)
+            count = min(self.page_size - page_offset, len(data) - pos)
+            self._page(index)[page_offset:page_offset + count] = data[pos:pos + count]
+            pos += count
+
+    def write(self, offset: int, data) -> None:
+        """在 offset 处覆盖写入 data"""
+        data = bytes(data)
+        if offset < 0 or offset + len(data) > self.size:
+            raise IndexError("写入范围超出文件范围")
+        if not data:
+            return
+        record = (offset, self.read(offset, len(data)), data)
+        self._apply(offset, data)
+        if self._batch is not None:
+            self._batch.append(record)
+        else:
+            self._undo.append([record])
+        self._redo.clear()
+        self._notify(*record)
+
+    def begin_batch(self):
+        """开始批量编辑，结束前的所有写入作为一次撤销单位"""
+        if self._batch_depth == 0:
+            self._batch = []
+        self._batch_depth += 1
+
+    def end_batch(self):
+        """结束批量编辑"""
+        if self._batch_depth == 0:
+            return
+        self._batch_depth -= 1
+        if self._batch_depth == 0:
+            if self._batch:
+                self._undo.append(self._batch)
+            self._batch = None
+
+    @contextmanager
+    def batch(self):
+        self.begin_batch()
+        try:
+            yield self
+        finally:
+            self.end_batch()
+
+    @property
+    def can_undo(self) -> bool:
+        return bool(self._undo) and self._batch is None
+
+    @property
+    def can_redo(self) -> bool:
+        return bool(self._redo) and self._batch is None
+
+    def undo(self) -> bool:
+        """撤销上一次编辑（或批量编辑）"""
+        if not self.can_undo:
+            return False
+        records = self._undo.pop()
+        for offset, old, new in reversed(records):
+            self._apply(offset, old)
+            self._notify(offset, new, old)
+        self._redo.append(records)
+        return True
+
+    def redo(self) -> bool:
+        """重做上一次撤销的编辑"""
+        if not self.can_redo:
+            return False
+        records = self._redo.pop()
+        for offset, old, new in records:
+            self._apply(offset, new)
+            self._notify(offset, old, new)
+        self._undo.append(records)
+        return True
+
+    def iter_chunks(self, chunk_size: int = 4*1024*1024) -> Iterator[bytes]:
+        """按块产出包含修改的完整内容"""
+        for offset in range(0, self.size, chunk_size):
+            yield self.read(offset, chunk_size)
+
+    def tobytes(self) -> bytes:
+        return self.read(0, self.size)
@@ -0,0 +1,429 @@
+import argparse
+import bisect
+import sys
+from collections import namedtuple
+from typing import Dict, Iterable, Iterator, Optional, Tuple, Union
+
+import numpy as np
+
+# 支持的编码，数组中的编码字段保存的是这里的下标
+ENCODINGS = ('ascii', 'utf-8', 'gbk', 'utf-16le', 'utf-16be')
+CODECS = {'ascii': 'ascii', 'utf-8': 'utf-8', 'gbk': 'gbk', 'utf-16le': 'utf-16-le', 'utf-16be': 'utf-16-be'}
+# 各编码的默认最小长度（字符数）
+DEFAULT_MIN_LENGTHS = {'ascii': 4, 'utf-8': 3, 'gbk': 4, 'utf-16le': 4, 'utf-16be': 4}
+# 重叠的候选字节长度相同时的优先顺序，越靠前越优先
+PRIORITY = ('utf-8', 'ascii', 'gbk', 'utf-16le', 'utf-16be')
+
+# 每块扫描的字节数
+CHUNK_SIZE = 4*1024*1024
+# 每块向前、向后多看的字节数；延伸到窗口末尾的字符串会加倍多读重新扫描
+MAX_RUN = 64*1024
+# UTF-8/GBK 候选至少要含的多字节字符数，只含一个的多半是随机字节
+MIN_WIDE_CHARS = 2
+
+# 多编码字符串命中的数组形式，各字段等长
+#   offsets   : 起始偏移 (int64)
+#   lengths   : 字节长度 (int64)
+#   encodings : ENCODINGS 中的下标 (uint8)
+StringRuns = namedtuple('StringRuns', ['offsets', 'lengths', 'encodings'])
+
+# 解码后的单条命中
+EncodedString = namedtuple('EncodedString', ['offset', 'length', 'encoding', 'text'])
+
+
+def empty_runs() -> StringRuns:
+    return StringRuns(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.uint8))
+
+
+def concat_runs(parts) -> StringRuns:
+    """按顺序合并多段命中"""
+    parts = [part for part in parts if len(part.offsets)]
+    if not parts:
+        return empty_runs()
+    return StringRuns(*(np.concatenate(field) for field in zip(*parts)))
+
+
+def parse_encodings(spec: Union[str, Dict[str, int], Iterable[str], None] = None,
+                    default_min: Optional[int] = None) -> Dict[str, int]:
+    """把编码设置规整为 {编码: 最小字符数}
+
+    spec 可以是 'ascii,utf-16le:6' 形式的字符串、编码列表或字典；
+    未写最小长度的编码取 default_min，再缺省时取 DEFAULT_MIN_LENGTHS。
+    """
+    if spec is None:
+        spec = ENCODINGS
+    if isinstance(spec, str):
+        spec = [item.strip() for item in spec.replace('，', ',').split(',') if item.strip()]
+    items = spec.items() if isinstance(spec, dict) else (
+        item.split(':', 1) if ':' in item else (item, None) for item in spec)
+    result = {}
+    for name, min_length in items:
+        name = name.strip().lower().replace('_', '-')
+        name = {'utf8': 'utf-8', 'utf16le': 'utf-16le', 'utf16be': 'utf-16be', 'gb2312': 'gbk'}.get(name, name)
+        if name not in ENCODINGS:
+            raise ValueError(f"不支持的编码: {name}")
+        if min_length is None or min_length == '':
+            min_length = DEFAULT_MIN_LENGTHS[name] if default_min is None else default_min
+        try:
+            min_length = int(min_length)
+        except ValueError:
+            raise ValueError(f"无效的最小长度: {min_length}") from None
+        result[name] = max(1, min_length)
+    if not result:
+        raise ValueError("至少需要选择一种编码")
+    return result
+
+
+def encodings_cache_kind(min_lengths: Dict[str, int]) -> str:
+    return "strings-multi-" + "_".join(f"{name}-min{min_lengths[name]}" for name in ENCODINGS if name in min_lengths)
+
+
+_tables = {}
+
+
+def _lookup_tables() -> Tuple[np.ndarray, np.ndarray]:
+    """(GB2312 双字节表, UTF-16 码元表)，首次使用时生成
+
+    中文只认 GB2312 字符集（6763 个常用汉字和全角符号）：GBK 的尾字节
+    与 ASCII 重叠、UTF-16 的汉字区覆盖三分之一的码元空间，放宽后随机
+    数据里会冒出大量伪中文。
+    """
+    if not _tables:
+        gb_pairs = np.zeros(0x10000, dtype=bool)
+        utf16 = np.zeros(0x10000, dtype=bool)
+        utf16[0x20:0x7F] = True
+        for lead in range(0xA1, 0xF8):
+            for trail in range(0xA1, 0xFF):
+                try:
+                    char = bytes((lead, trail)).decode('gb2312')
+                except UnicodeDecodeError:
+                    continue
+                gb_pairs[lead << 8 | trail] = True
+                utf16[ord(char)] = True
+        _tables['all'] = (gb_pairs, utf16)
+    return _tables['all']
+
+
+def _runs(mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """布尔数组中连续 True 段的 [起点, 终点)"""
+    padded = np.zeros(len(mask) + 2, dtype=bool)
+    padded[1:-1] = mask
+    edges = np.flatnonzero(padded[1:] != padded[:-1])
+    return edges[0::2], edges[1::2]
+
+
+def _shift(mask: np.ndarray, count: int) -> np.ndarray:
+    """result[i] = mask[i - count]，前部补 False"""
+    result = np.zeros_like(mask)
+    result[count:] = mask[:len(mask) - count]
+    return result
+
+
+def _pair_leads(starts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """从每个 starts[i] 起连续 counts[i] 个双字节字符的首字节位置"""
+    total = int(counts.sum())
+    first = np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(starts, counts) + 2 * (np.arange(total, dtype=np.int64) - first)
+
+
+def _ahead(mask: np.ndarray, count: int) -> np.ndarray:
+    """result[i] = mask[i + count]，尾部补 False"""
+    result = np.zeros_like(mask)
+    result[:len(mask) - count] = mask[count:]
+    return result
+
+
+class EncodingScanner:
+    """在一遍扫描中同时查找多种编码的字符串
+
+    每块只做一次字节分类（查表），各编码的"属于字符"掩码都由数组运算
+    得到，再按连续段切出候选：
+      ascii    连续可打印字符
+      utf-8    合法的多字节序列与可打印 ASCII 混排，至少含 MIN_WIDE_CHARS 个多字节字符
+      gbk      GB2312 双字节字符与可打印 ASCII 混排，至少含 MIN_WIDE_CHARS 个双字节字符
+      utf-16   两种字节序、两种对齐的码元视图，码元为可打印 ASCII 或 GB2312 字符
+    同一段字节可能同时被几种编码解释（如英文文本也能读成 UTF-16 的汉字），
+    重叠的候选中保留字节最长的一个。不重叠的候选（绝大多数）直接保留，
+    只有互相冲突的少数候选进入 Python 循环。
+
+    结果只含偏移、长度和编码下标，文本在需要时由 decode_run() 解码。
+    """
+
+    def __init__(self, min_lengths: Union[str, Dict[str, int], Iterable[str], None] = None):
+        self.min_lengths = min_lengths if isinstance(min_lengths, dict) and all(
+            name in ENCODINGS for name in min_lengths) else parse_encodings(min_lengths)
+        self._gb_pairs, self._utf16 = _lookup_tables()
+        self._rank = np.array([PRIORITY.index(name) for name in ENCODINGS], dtype=np.int64)
+
+    def scan_window(self, window: np.ndarray, base: int = 0, own_start: int = 0,
+                    own_end: Optional[int] = None) -> StringRuns:
+        """扫描 window（位于文件偏移 base），返回起点在 [own_start, own_end) 内的命中
+
+        own_start/own_end 是相对 window 的下标。
+        """
+        own_end = len(window) if own_end is None else own_end
+        starts, ends, codes = self._candidates(window)
+        if len(starts):
+            keep = self._resolve(starts, ends, codes)
+            starts, ends, codes = starts[keep], ends[keep], codes[keep]
+            owned = (starts >= own_start) & (starts < own_end)
+            starts, ends, codes = starts[owned], ends[owned], codes[owned]
+        return StringRuns(starts + base, ends - starts, codes.astype(np.uint8))
+
+    def _candidates(self, window: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """各编码的候选段，按编码依次拼接 (起点, 终点, 编码下标)"""
+        parts = []
+        printable = (window >= 0x20) & (window <= 0x7E)
+        enabled = self.min_lengths
+
+        if 'ascii' in enabled:
+            starts, ends = _runs(printable)
+            keep = ends - starts >= enabled['ascii']
+            parts.append((starts[keep], ends[keep], 'ascii'))
+
+        if 'utf-8' in enabled:
+            parts.append(self._utf8_candidates(window, printable) + ('utf-8',))
+
+        if 'gbk' in enabled:
+            parts.append(self._gbk_candidates(window, printable) + ('gbk',))
+
+        for name, dtype in (('utf-16le', '<u2'), ('utf-16be', '>u2')):
+            if name not in enabled:
+                continue
+            for align in (0, 1):
+                count = (len(window) - align) // 2
+                if count <= 0:
+                    continue
+                units = window[align:align + 2 * count].view(dtype)
+                starts, ends = _runs(self._utf16[units])
+                keep = ends - starts >= enabled[name]
+                parts.append((align + 2 * starts[keep], align + 2 * ends[keep], name))
+
+        if not parts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        return (np.concatenate([starts for starts, _, _ in parts]).astype(np.int64),
+                np.concatenate([ends for _, ends, _ in parts]).astype(np.int64),
+                np.concatenate([np.full(len(starts), ENCODINGS.index(name), dtype=np.int64)
+                                for starts, _, name in parts]))
+
+    def _utf8_candidates(self, window, printable):
+        # 尾部补3个字节，读取后续字节时不必检查越界
+        padded = np.zeros(len(window) + 3, dtype=np.uint8)
+        padded[:len(window)] = window
+        leads = np.flatnonzero((window >= 0xC2) & (window <= 0xF4))
+        first = padded[leads]
+        widths = 2 + (first >= 0xE0).astype(np.int64) + (first >= 0xF0)
+        second = padded[leads + 1]
+        valid = (second & 0xC0) == 0x80
+        valid &= (widths < 3) | (padded[leads + 2] & 0xC0 == 0x80)
+        valid &= (widths < 4) | (padded[leads + 3] & 0xC0 == 0x80)
+        # 排除 C1 控制字符、过长编码和代理区，保证解码不出错
+        valid &= ~((first == 0xC2) & (second < 0xA0))
+        valid &= ~((first == 0xE0) & (second < 0xA0)) & ~((first == 0xED) & (second > 0x9F))
+        valid &= ~((first == 0xF0) & (second < 0x90)) & ~((first == 0xF4) & (second > 0x8F))
+        leads, widths = leads[valid], widths[valid]
+
+        cover = printable.copy()
+        for offset in range(4):
+            cover[leads[widths > offset] + offset] = True
+        return self._keep_runs(cover, leads, widths - 1, self.min_lengths['utf-8'])
+
+    def _gbk_candidates(self, window, printable):
+        # 连续的高位字节 (A1-FE) 两两配对。长度为奇数的段多出一个字节，可能是
+        # 文本前的零散字节：从段首和从第二个字节起各配对一次，取合法字符多的
+        high_starts, high_ends = _runs((window >= 0xA1) & (window <= 0xFE))
+        pair_counts = (high_ends - high_starts) // 2
+        odd = np.flatnonzero((high_ends - high_starts) % 2)
+        if len(odd):
+            owners = np.repeat(np.arange(len(odd)), pair_counts[odd])
+            valid = [np.bincount(owners, weights=self._gb_valid(window, _pair_leads(high_starts[odd] + shift,
+                                                                                    pair_counts[odd])),
+                                 minlength=len(odd)) for shift in (0, 1)]
+            high_starts = high_starts.copy()
+            high_starts[odd[valid[1] > valid[0]]] += 1
+        leads = _pair_leads(high_starts, pair_counts)
+        leads = leads[self._gb_valid(window, leads)]
+
+        cover = printable.copy()
+        cover[leads] = True
+        cover[leads + 1] = True
+        return self._keep_runs(cover, leads, np.ones(len(leads), dtype=np.int64), self.min_lengths['gbk'])
+
+    def _gb_valid(self, window, leads):
+        """leads 处的两个字节是否组成 GB2312 字符"""
+        return self._gb_pairs[window[leads].astype(np.int64) << 8 | window[leads + 1]]
+
+    @staticmethod
+    def _keep_runs(cover, positions, extra, min_length):
+        """切出 cover 的连续段，保留字符数够长且至少含 MIN_WIDE_CHARS 个多字节字符的段
+
+        positions 为多字节字符起点（升序），extra 为每个字符比单字节多占的字节数。
+        """
+        starts, ends = _runs(cover)
+        keep = ends - starts >= min_length
+        starts, ends = starts[keep], ends[keep]
+        prefix = np.zeros(len(positions) + 1, dtype=np.int64)
+        np.cumsum(extra, out=prefix[1:])
+        first, last = np.searchsorted(positions, starts), np.searchsorted(positions, ends)
+        chars = ends - starts - (prefix[last] - prefix[first])
+        keep = (chars >= min_length) & (last - first >= MIN_WIDE_CHARS)
+        return starts[keep], ends[keep]
+
+    def _resolve(self, starts, ends, codes) -> np.ndarray:
+        """在互相重叠的候选中保留字节最长的，返回按起点排序的保留下标
+
+        完全落在另一个候选内的（如中文串里的 ASCII 片段）直接丢弃；
+        剩下的候选起点、终点都严格递增，只有和相邻候选部分重叠的才逐个比较。
+        """
+        order = np.lexsort((self._rank[codes], -ends, starts))
+        sorted_ends = ends[order]
+        reach = np.maximum.accumulate(sorted_ends)
+        contained = np.zeros(len(order), dtype=bool)
+        contained[1:] = sorted_ends[1:] <= reach[:-1]
+        order = order[~contained]
+
+        sorted_starts, sorted_ends = starts[order], ends[order]
+        conflict = np.zeros(len(order), dtype=bool)
+        overlap = sorted_starts[1:] < sorted_ends[:-1]
+        conflict[1:] |= overlap
+        conflict[:-1] |= overlap
+        if not conflict.any():
+            return order
+
+        keep = ~conflict
+        contested = order[conflict]
+        ranking = np.lexsort((starts[contested], self._rank[codes[contested]], starts[contested] - ends[contested]))
+        accepted_starts, accepted_ends = [], []
+        chosen = []
+        for index in contested[ranking].tolist():
+            start, end = int(starts[index]), int(ends[index])
+            position = bisect.bisect_right(accepted_starts, start)
+            if position and accepted_ends[position - 1] > start:
+                continue
+            if position < len(accepted_starts) and accepted_starts[position] < end:
+                continue
+            accepted_starts.insert(position, start)
+            accepted_ends.insert(position, end)
+            chosen.append(index)
+        result = np.concatenate([order[keep], np.array(chosen, dtype=order.dtype)])
+        return result[np.argsort(starts[result], kind='stable')]
+
+    def iter_chunk_runs(self, data, start: int = 0, end: Optional[int] = None,
+                        chunk_size: int = CHUNK_SIZE) -> Iterator[Tuple[int, StringRuns]]:
+        """逐块产出 (块结束偏移, StringRuns)，只包含起点在 [start, end) 内的命中
+
+        每块前后各多读 MAX_RUN 字节，保证跨块的字符串按同样的上下文
+        判定，并归属于起点所在的块。本块的字符串延伸到窗口末尾时可能被
+        截断，向后多读的字节数加倍后重新扫描这一块，直到字符串在窗口内结束。
+        """
+        size = len(data)
+        end = size if end is None else min(end, size)
+        for chunk_start in range(start, end, chunk_size):
+            chunk_end = min(chunk_start + chunk_size, end)
+            window_start = max(chunk_start - MAX_RUN, 0)
+            extra = MAX_RUN
+            while True:
+                window_end = min(chunk_end + extra, size)
+                window = np.frombuffer(data, dtype=np.uint8, count=window_end - window_start, offset=window_start)
+                runs = self.scan_window(window, window_start, chunk_start - window_start, chunk_end - window_start)
+                if window_end == size or not len(runs.offsets) or (runs.offsets + runs.lengths).max() < window_end:
+                    break
+                extra *= 2
+            yield chunk_end, runs
+
+    def scan(self, data, start: int = 0, end: Optional[int] = None) -> StringRuns:
+        """扫描 [start, end) 并合并全部命中"""
+        return concat_runs(runs for _, runs in self.iter_chunk_runs(data, start, end))
+
+
+def decode_run(data, offset: int, length: int, encoding: int) -> str:
+    """按编码下标解码单条命中"""
+    return bytes(data[offset:offset + length]).decode(CODECS[ENCODINGS[encoding]], errors='replace')
+
+
+def iter_decoded(data, runs: StringRuns) -> Iterator[EncodedString]:
+    """逐条解码命中，只有被取到的命中才会生成 Python 字符串"""
+    for offset, length, encoding in zip(runs.offsets.tolist(), runs.lengths.tolist(), runs.encodings.tolist()):
+        yield EncodedString(offset, length, ENCODINGS[encoding], decode_run(data, offset, length, encoding))
+
+
+def iter_encoded_strings(data, min_lengths=None, start: int = 0, end: Optional[int] = None) -> Iterator[EncodedString]:
+    """按偏移顺序逐个产出解码后的多编码字符串"""
+    for _, runs in EncodingScanner(min_lengths).iter_chunk_runs(data, start, end):
+        yield from iter_decoded(data, runs)
+
+
+_scanner_cache = {}
+
+
+def scan_encoded_range(data, start: int, end: int, min_lengths=None) -> StringRuns:
+    """返回起点位于 [start, end) 内的多编码字符串（并行扫描内核）"""
+    key = tuple(parse_encodings(min_lengths).items())
+    scanner = _scanner_cache.get(key)
+    if scanner is None:
+        scanner = _scanner_cache[key] = EncodingScanner(dict(key))
+    return scanner.scan(data, start, end)
+
+
+def runs_to_arrays(runs: StringRuns) -> Tuple[Dict[str, np.ndarray], dict]:
+    return runs._asdict(), {}
+
+
+def runs_from_arrays(arrays: Dict[str, np.ndarray], meta: dict = None) -> StringRuns:
+    return StringRuns(**arrays)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='一遍扫描提取 ASCII/UTF-8/GBK/UTF-16LE/UTF-16BE 字符串')
+    parser.add_argument('file', help='要扫描的文件')
+    parser.add_argument('-e', '--encodings', default=','.join(ENCODINGS),
+                        help="逗号分隔的编码，可用 '编码:最小字符数' 单独设置，如 'ascii:6,utf-16le'")
+    parser.add_argument('--count', action='store_true', help='只输出各编码的命中数')
+    parser.add_argument('--limit', type=int, default=0, help='最多输出的命中数（0 为不限）')
+    args = parser.parse_args(argv)
+
+    from cli_output import silence_broken_pipe
+    from document import DatDocument, release_view
+
+    try:
+        scanner = EncodingScanner(parse_encodings(args.encodings))
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    try:
+        document = DatDocument.open(args.file)
+    except (OSError, ValueError) as e:
+        print(f"无法打开文件: {e}", file=sys.stderr)
+        return 2
+    data = document.view()
+    counts = dict.fromkeys(scanner.min_lengths, 0)
+    total = 0
+    try:
+        for _, runs in scanner.iter_chunk_runs(data):
+            if args.count:
+                for code, count in zip(*np.unique(runs.encodings, return_counts=True)):
+                    counts[ENCODINGS[code]] += int(count)
+                continue
+            for hit in iter_decoded(data, runs):
+                print(f"0x{hit.offset:08X}\t{hit.encoding}\t{hit.text}")
+                total += 1
+                if args.limit and total >= args.limit:
+                    break
+            else:
+                continue
+            break
+    except BrokenPipeError:
+        silence_broken_pipe()
+        return 0
+    finally:
+        release_view(data)
+        document.release()
+    if args.count:
+        for name, count in counts.items():
+            print(f"{name}\t{count}")
+        total = sum(counts.values())
+    return 0 if total else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
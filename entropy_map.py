@@ -0,0 +1,247 @@
+import math
+from collections import namedtuple
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+# 每个窗口的统计量（均为等长 numpy 数组）
+#   offsets   : 窗口起始偏移
+#   lengths   : 窗口长度（最后一个窗口可能不足 window）
+#   entropy   : 香农熵，单位 比特/字节，0~8
+#   printable : 可打印字符（0x20-0x7E 及 \t \n \r）比例
+#   zeros     : 0x00 比例
+#   chi2      : 相对均匀分布的卡方值，随机数据约为 255
+WindowStats = namedtuple('WindowStats', ['offsets', 'lengths', 'entropy', 'printable', 'zeros', 'chi2'])
+
+# 连续同类窗口合并成的区域 [start, end)
+Region = namedtuple('Region', ['start', 'end', 'kind', 'entropy'])
+
+REGION_KINDS = ('zero', 'text', 'binary', 'compressed', 'encrypted')
+REGION_NAMES = {
+    'zero': '零填充',
+    'text': '文本',
+    'binary': '二进制数据',
+    'compressed': '压缩数据',
+    'encrypted': '加密/随机数据'
+}
+
+# 分类阈值
+ZERO_RATIO = 0.9
+TEXT_RATIO = 0.85
+HIGH_ENTROPY = 7.2
+# 高熵且字节分布接近均匀（卡方值小）时视为加密/随机数据
+UNIFORM_CHI2 = 320.0
+
+_PRINTABLE = np.zeros(256, dtype=bool)
+_PRINTABLE[0x20:0x7f] = True
+_PRINTABLE[[0x09, 0x0a, 0x0d]] = True
+
+# 每批处理的大致字节数，以及每批最多的小块直方图行数（每行 2KB），决定内存上限
+BATCH_BYTES = 4*1024*1024
+MAX_BLOCK_ROWS = 16384
+
+
+def _block_histograms(block_data: np.ndarray, block_size: int, rows: np.ndarray) -> np.ndarray:
+    """把数据按 block_size 切块，一次 bincount 得到每块的字节直方图
+
+    rows 为预先计算的行基址（第 i 块的每个字节对应 i*256），可在各批间复用。
+    """
+    blocks = len(block_data) // block_size
+    index = rows[:blocks * block_size] + block_data[:blocks * block_size]
+    return np.bincount(index, minlength=blocks * 256).reshape(blocks, 256)
+
+
+def _histogram_stats(hist: np.ndarray, lengths: np.ndarray) -> tuple:
+    """由直方图计算熵、可打印比例、零字节比例和卡方值"""
+    lengths_f = lengths.astype(np.float64)
+    counts = hist.astype(np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        c_log_c = np.where(counts > 0, counts * np.log2(np.maximum(counts, 1)), 0.0).sum(axis=1)
+        entropy = np.log2(lengths_f) - c_log_c / lengths_f
+        expected = lengths_f / 256
+        chi2 = ((counts - expected[:, None]) ** 2).sum(axis=1) / expected
+    printable = hist[:, _PRINTABLE].sum(axis=1) / lengths_f
+    zeros = hist[:, 0] / lengths_f
+    return (np.maximum(entropy, 0.0).astype(np.float32), printable.astype(np.float32),
+            zeros.astype(np.float32), chi2.astype(np.float32))
+
+
+def iter_window_stats(data, window: int = 4096, stride: Optional[int] = None,
+                      batch_bytes: int = BATCH_BYTES) -> Iterator[WindowStats]:
+    """分批产出窗口统计，内存占用与文件大小无关
+
+    窗口可以重叠（stride < window）：先按 gcd(window, stride) 大小的
+    小块统计直方图，再用前缀和得到每个窗口的直方图，每个字节只统计一次。
+    文件末尾不足一个窗口的部分作为最后一个（较短的）窗口。
+    """
+    stride = stride or window
+    if window <= 0 or stride <= 0:
+        raise ValueError("窗口和步长必须为正数")
+    size = len(data)
+    if not size:
+        return
+
+    block = math.gcd(window, stride)
+    blocks_per_window = window // block
+    blocks_per_stride = stride // block
+    full_windows = (size - window) // stride + 1 if size >= window else 0
+    batch_bytes = min(batch_bytes, block * MAX_BLOCK_ROWS)
+    per_batch = max(1, (batch_bytes - window) // stride + 1)
+    batch_blocks = ((min(per_batch, full_windows) - 1) * stride + window) // block if full_windows else 0
+    rows = np.repeat(np.arange(batch_blocks, dtype=np.int64) * 256, block)
+
+    for first in range(0, full_windows, per_batch):
+        count = min(per_batch, full_windows - first)
+        start = first * stride
+        length = (count - 1) * stride + window
+        chunk = np.frombuffer(data, dtype=np.uint8, count=length, offset=start)
+        hist = _block_histograms(chunk, block, rows)
+        if blocks_per_window == 1 and blocks_per_stride == 1:
+            window_hist = hist
+        else:
+            cumulative = np.zeros((len(hist) + 1, 256), dtype=np.int64)
+            np.cumsum(hist, axis=0, out=cumulative[1:])
+            starts = np.arange(count) * blocks_per_stride
+            window_hist = cumulative[starts + blocks_per_window] - cumulative[starts]
+        lengths = np.full(count, window, dtype=np.int64)
+        offsets = start + np.arange(count, dtype=np.uint64) * np.uint64(stride)
+        yield WindowStats(offsets, lengths, *_histogram_stats(window_hist, lengths))
+
+    # 末尾未被完整窗口覆盖的字节；stride > window 时下一个窗口的起点
+    # 可能已经越过文件末尾，此时剩下的只是窗口之间本来就跳过的字节
+    tail_start = full_windows * stride
+    covered = (full_windows - 1) * stride + window if full_windows else 0
+    if covered < size and tail_start < size:
+        tail = np.frombuffer(data, dtype=np.uint8, count=size - tail_start, offset=tail_start)
+        hist = np.bincount(tail, minlength=256)[None, :]
+        lengths = np.array([len(tail)], dtype=np.int64)
+        yield WindowStats(np.array([tail_start], dtype=np.uint64), lengths, *_histogram_stats(hist, lengths))
+
+
+def window_stats(data, window: int = 4096, stride: Optional[int] = None) -> WindowStats:
+    """计算全部窗口的统计量"""
+    parts = list(iter_window_stats(data, window, stride))
+    if not parts:
+        empty = np.empty(0, dtype=np.float32)
+        return WindowStats(np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.int64), empty, empty, empty, empty)
+    return WindowStats(*(np.concatenate(column) for column in zip(*parts)))
+
+
+def classify_windows(stats: WindowStats) -> np.ndarray:
+    """按阈值给每个窗口分类，返回 REGION_KINDS 中的下标数组"""
+    kinds = np.full(len(stats.offsets), REGION_KINDS.index('binary'), dtype=np.uint8)
+    high = stats.entropy >= HIGH_ENTROPY
+    kinds[high] = REGION_KINDS.index('compressed')
+    kinds[high & (stats.chi2 <= UNIFORM_CHI2)] = REGION_KINDS.index('encrypted')
+    kinds[stats.printable >= TEXT_RATIO] = REGION_KINDS.index('text')
+    kinds[stats.zeros >= ZERO_RATIO] = REGION_KINDS.index('zero')
+    return kinds
+
+
+def segment_regions(stats: WindowStats, kinds: Optional[np.ndarray] = None,
+                    file_size: Optional[int] = None) -> List[Region]:
+    """把连续同类窗口合并为区域
+
+    重叠窗口中每个窗口只代表从其起点到下一个窗口起点的字节。
+    """
+    if not len(stats.offsets):
+        return []
+    if kinds is None:
+        kinds = classify_windows(stats)
+    offsets = stats.offsets.astype(np.int64)
+    if file_size is None:
+        file_size = int(offsets[-1] + stats.lengths[-1])
+    ends = np.append(offsets[1:], file_size)
+
+    # 类别变化的位置即区域边界
+    boundaries = np.flatnonzero(kinds[1:] != kinds[:-1]) + 1
+    starts = np.concatenate(([0], boundaries))
+    stops = np.concatenate((boundaries, [len(kinds)]))
+    spans = (ends - offsets).astype(np.float64)
+    weighted = np.concatenate(([0.0], np.cumsum(stats.entropy * spans)))
+    regions = []
+    for first, last in zip(starts.tolist(), stops.tolist()):
+        start, end = int(offsets[first]), int(ends[last - 1])
+        mean = (weighted[last] - weighted[first]) / max(end - start, 1)
+        regions.append(Region(start, end, REGION_KINDS[kinds[first]], round(float(mean), 3)))
+    return regions
+
+
+def iter_regions(parts: Iterable[WindowStats], file_size: int) -> Iterator[Region]:
+    """逐批合并窗口统计，产出已经结束的区域，结果与 segment_regions 相同
+
+    只保留尚未结束的一个区域和每批最后一个窗口（它的跨度要等下一批的起点），
+    内存与文件大小无关。
+    """
+    region = None  # [起点, 类别下标, 熵×跨度之和, 终点]
+    held = None    # 上一批最后一个窗口 (偏移, 类别, 熵)
+
+    def merge(runs):
+        nonlocal region
+        for start, end, kind, weighted in runs:
+            if region is not None and region[1] == kind:
+                region[2] += weighted
+                region[3] = end
+                continue
+            if region is not None:
+                yield _close_region(region)
+            region = [start, kind, weighted, end]
+
+    for stats in parts:
+        if not len(stats.offsets):
+            continue
+        offsets = stats.offsets.astype(np.int64)
+        kinds = classify_windows(stats)
+        entropy = stats.entropy.astype(np.float64)
+        if held is not None:
+            offsets = np.concatenate(([held[0]], offsets))
+            kinds = np.concatenate(([held[1]], kinds))
+            entropy = np.concatenate(([held[2]], entropy))
+        held = (offsets[-1], kinds[-1], entropy[-1])
+        yield from merge(_kind_runs(offsets[:-1], offsets[1:], kinds[:-1], entropy[:-1]))
+    if held is not None:
+        yield from merge(_kind_runs(np.array([held[0]]), np.array([file_size]),
+                                    np.array([held[1]]), np.array([held[2]])))
+    if region is not None:
+        yield _close_region(region)
+
+
+def _kind_runs(offsets, ends, kinds, entropy):
+    """把一段窗口按类别切成 (起点, 终点, 类别下标, 熵×跨度之和)"""
+    if not len(offsets):
+        return
+    boundaries = np.flatnonzero(kinds[1:] != kinds[:-1]) + 1
+    starts = np.concatenate(([0], boundaries))
+    stops = np.concatenate((boundaries, [len(kinds)]))
+    weighted = np.concatenate(([0.0], np.cumsum(entropy * (ends - offsets))))
+    for first, last in zip(starts.tolist(), stops.tolist()):
+        yield int(offsets[first]), int(ends[last - 1]), int(kinds[first]), weighted[last] - weighted[first]
+
+
+def _close_region(region) -> Region:
+    start, kind, weighted, end = region
+    return Region(start, end, REGION_KINDS[kind], round(float(weighted / max(end - start, 1)), 3))
+
+
+def entropy_map(data, window: int = 4096, stride: Optional[int] = None):
+    """计算窗口统计并分段，返回 (WindowStats, 类别数组, [Region])"""
+    stats = window_stats(data, window, stride)
+    kinds = classify_windows(stats)
+    return stats, kinds, segment_regions(stats, kinds, len(data))
+
+
+def minimap_columns(stats: WindowStats, kinds: np.ndarray, file_size: int, width: int) -> np.ndarray:
+    """把文件按 width 列缩略，返回每列中点所在窗口的类别"""
+    if not len(stats.offsets) or width <= 0:
+        return np.empty(0, dtype=np.uint8)
+    positions = (np.arange(width) + 0.5) * file_size / width
+    index = np.searchsorted(stats.offsets.astype(np.float64), positions, side='right') - 1
+    return kinds[np.clip(index, 0, len(kinds) - 1)]
+
+
+def summarize_regions(regions: List[Region]) -> Dict[str, int]:
+    """各类区域的总字节数"""
+    totals = {kind: 0 for kind in REGION_KINDS}
+    for region in regions:
+        totals[region.kind] += region.end - region.start
+    return totals
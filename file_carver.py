@@ -0,0 +1,447 @@
+import argparse
+import os
+import re
+import struct
+import sys
+import zlib
+from collections import namedtuple
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# 每块扫描的字节数，决定进度汇报粒度
+CHUNK_SIZE = 16*1024*1024
+# 单个内嵌文件的最大字节数，查找结尾和解压校验都不超过这个范围
+MAX_CARVE_SIZE = 256*1024*1024
+# 短于这个长度的结果多为偶然匹配，不列出
+MIN_CARVE_SIZE = 16
+# 查找候选位置时每次比较的字节数（临时数组约为其 3 倍）
+MATCH_BLOCK = 4*1024*1024
+# 校验 zlib/gzip 时每次送入解压器、每次最多解压出的字节数（解压结果直接丢弃）
+INFLATE_BLOCK = 64*1024
+
+# 签名：magic 为文件开头的固定字节（至少 2 字节），measure(data, start, limit) 校验该位置
+# 是否真是这种文件并返回其长度，不是时返回 None；结尾不超过 limit。
+CarveSignature = namedtuple('CarveSignature', ['name', 'extension', 'magic', 'measure'])
+# 找到的内嵌文件
+CarvedFile = namedtuple('CarvedFile', ['offset', 'length', 'name', 'extension'])
+
+_U16_BE = struct.Struct('>H')
+_U32_BE = struct.Struct('>I')
+
+
+class FooterRule:
+    """结尾规则：到其后第一个 footer 为止（含 footer）
+
+    写成类而不是闭包，签名表可以序列化后传给并行扫描的子进程。
+    """
+
+    def __init__(self, footer: bytes):
+        self.footer = bytes(footer)
+        self._pattern = re.compile(re.escape(self.footer))
+
+    def __call__(self, data, start: int, limit: int) -> Optional[int]:
+        match = self._pattern.search(data, start, limit)
+        return match.end() - start if match else None
+
+
+def _png_length(data, start: int, limit: int) -> Optional[int]:
+    """逐个数据块跳过，直到 IEND；第一个块必须是 IHDR"""
+    pos = start + 8
+    while pos + 12 <= limit:
+        length, kind = struct.unpack_from('>I4s', data, pos)
+        if not kind.isalpha() or (pos == start + 8 and kind != b'IHDR'):
+            return None
+        pos += 12 + length
+        if kind == b'IEND':
+            return pos - start if pos <= limit else None
+    return None
+
+
+# 熵编码数据中的下一个标记：FF 00 是转义的 FF，FF D0~D7 是复位标记
+_JPEG_MARKER = re.compile(rb'\xFF[^\x00\xD0-\xD7]')
+
+
+def _jpeg_length(data, start: int, limit: int) -> Optional[int]:
+    """按段长度跳过各个段，扫描数据中找下一个标记，直到 EOI (FF D9)"""
+    pos = start + 2
+    while pos + 4 <= limit:
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            # 填充字节
+            pos += 1
+            continue
+        if marker == 0xD9:
+            return pos + 2 - start
+        if 0xD0 <= marker <= 0xD7 or marker == 0x01:
+            pos += 2
+            continue
+        length = _U16_BE.unpack_from(data, pos + 2)[0]
+        if length < 2:
+            return None
+        pos += 2 + length
+        if marker == 0xDA:
+            match = _JPEG_MARKER.search(data, pos, limit)
+            if match is None:
+                return None
+            pos = match.start()
+    return None
+
+
+def _gif_length(data, start: int, limit: int) -> Optional[int]:
+    """跳过颜色表、扩展块和图像块的子块序列，直到结尾标记 0x3B"""
+    pos = start + 13
+    flags = data[start + 10]
+    if flags & 0x80:
+        pos += 3 << ((flags & 7) + 1)
+    while pos < limit:
+        block = data[pos]
+        if block == 0x3B:
+            return pos + 1 - start
+        if block == 0x21:
+            pos += 2
+        elif block == 0x2C:
+            if pos + 11 > limit:
+                return None
+            flags = data[pos + 9]
+            pos += 10
+            if flags & 0x80:
+                pos += 3 << ((flags & 7) + 1)
+            # LZW 最小码长
+            pos += 1
+        else:
+            return None
+        while pos < limit and data[pos]:
+            pos += data[pos] + 1
+        pos += 1
+    return None
+
+
+def _bmp_length(data, start: int, limit: int) -> Optional[int]:
+    """文件头中的文件大小；保留字段为零、信息头大小为已知值时才接受"""
+    size, reserved, pixels, header = struct.unpack_from('<IIII', data, start + 2)
+    if reserved or header not in (12, 40, 52, 56, 108, 124) or not 14 + header <= pixels <= size:
+        return None
+    return size
+
+
+def _riff_length(data, start: int, limit: int) -> Optional[int]:
+    """RIFF 容器（WAV/AVI/WebP 等）：块大小加 8 字节块头，格式标识须为可打印 ASCII"""
+    size, form = struct.unpack_from('<I4s', data, start + 4)
+    if not all(0x20 <= byte < 0x7F for byte in form):
+        return None
+    return size + 8
+
+
+def _inflate_length(data, start: int, limit: int, wbits: int) -> Optional[int]:
+    """解压到数据流结束，返回压缩数据的长度；出错或在 limit 前没有结束返回 None"""
+    inflater = zlib.decompressobj(wbits)
+    pos = start
+    try:
+        while pos < limit and not inflater.eof:
+            block = data[pos:min(pos + INFLATE_BLOCK, limit)]
+            inflater.decompress(block, INFLATE_BLOCK)
+            # 限制每次解压出的字节数，高压缩比的数据不会占用大量内存
+            while inflater.unconsumed_tail and not inflater.eof:
+                inflater.decompress(inflater.unconsumed_tail, INFLATE_BLOCK)
+            pos += len(block)
+    except zlib.error:
+        return None
+    if not inflater.eof:
+        return None
+    return pos - len(inflater.unused_data) - start
+
+
+def _zlib_length(data, start: int, limit: int) -> Optional[int]:
+    return _inflate_length(data, start, limit, zlib.MAX_WBITS)
+
+
+def _gzip_length(data, start: int, limit: int) -> Optional[int]:
+    """只取第一个成员；标志字节的保留位必须为零"""
+    if data[start + 3] & 0xE0:
+        return None
+    return _inflate_length(data, start, limit, zlib.MAX_WBITS | 16)
+
+
+# ZIP 常见的压缩方法：存储、deflate、deflate64、bzip2、lzma、zstd、xz、ppmd、AES
+_ZIP_METHODS = {0, 8, 9, 12, 14, 93, 95, 98, 99}
+_ZIP_END = re.compile(rb'PK\x05\x06')
+
+
+def _zip_length(data, start: int, limit: int) -> Optional[int]:
+    """到中央目录结束记录为止：其中的中央目录偏移（相对 ZIP 开头）加大小须恰好指向该记录"""
+    version, _, method = struct.unpack_from('<HHH', data, start + 4)
+    if version > 63 or method not in _ZIP_METHODS:
+        return None
+    for match in _ZIP_END.finditer(data, start, limit):
+        end = match.start()
+        if end + 22 > limit:
+            break
+        directory_size, directory_offset, comment_length = struct.unpack_from('<IIH', data, end + 12)
+        if start + directory_offset + directory_size == end:
+            return end + 22 + comment_length - start
+    return None
+
+
+def _7z_length(data, start: int, limit: int) -> Optional[int]:
+    """签名头之后的 32 字节起始头：校验 CRC 后按下一个头的偏移和大小计算长度"""
+    crc, next_offset, next_size = struct.unpack_from('<IQQ', data, start + 8)
+    if zlib.crc32(data[start + 12:start + 32]) != crc:
+        return None
+    return 32 + next_offset + next_size
+
+
+def _sqlite_length(data, start: int, limit: int) -> Optional[int]:
+    """页大小 × 页数；文件头中的页数只有在修改计数与版本校验值一致时才有效"""
+    page_size = _U16_BE.unpack_from(data, start + 16)[0]
+    if page_size == 1:
+        page_size = 65536
+    if page_size < 512 or page_size & (page_size - 1):
+        return None
+    changes, pages = struct.unpack_from('>II', data, start + 24)
+    if not pages or changes != _U32_BE.unpack_from(data, start + 92)[0]:
+        return None
+    return page_size * pages
+
+
+SIGNATURES: List[CarveSignature] = [
+    CarveSignature('png', 'png', b'\x89PNG\r\n\x1a\n', _png_length),
+    CarveSignature('jpeg', 'jpg', b'\xFF\xD8\xFF', _jpeg_length),
+    CarveSignature('gif', 'gif', b'GIF87a', _gif_length),
+    CarveSignature('gif', 'gif', b'GIF89a', _gif_length),
+    CarveSignature('bmp', 'bmp', b'BM', _bmp_length),
+    CarveSignature('riff', 'riff', b'RIFF', _riff_length),
+    CarveSignature('gzip', 'gz', b'\x1F\x8B\x08', _gzip_length),
+    CarveSignature('zlib', 'zlib', b'\x78\x01', _zlib_length),
+    CarveSignature('zlib', 'zlib', b'\x78\x5E', _zlib_length),
+    CarveSignature('zlib', 'zlib', b'\x78\x9C', _zlib_length),
+    CarveSignature('zlib', 'zlib', b'\x78\xDA', _zlib_length),
+    CarveSignature('zip', 'zip', b'PK\x03\x04', _zip_length),
+    CarveSignature('7z', '7z', b'7z\xBC\xAF\x27\x1C', _7z_length),
+    CarveSignature('sqlite', 'sqlite', b'SQLite format 3\x00', _sqlite_length),
+    CarveSignature('pdf', 'pdf', b'%PDF-', FooterRule(b'%%EOF')),
+]
+
+
+def register_signature(name: str, extension: str, magic: bytes, measure: Callable):
+    """添加签名，measure 可以是 FooterRule(结尾字节) 或自定义的长度函数
+
+    并行扫描时签名随 FileCarver 一起传给子进程，自定义的长度函数须是
+    可导入模块中的模块级函数（或可序列化的对象）。
+    """
+    if len(magic) < 2:
+        raise ValueError(f"magic 至少需要 2 字节: {name}")
+    SIGNATURES.append(CarveSignature(name, extension, bytes(magic), measure))
+
+
+def signature_names() -> List[str]:
+    return list(dict.fromkeys(signature.name for signature in SIGNATURES))
+
+
+class FileCarver:
+    """按签名表查找内嵌文件
+
+    所有签名 magic 的前两个字节登记在一张 65536 项的查找表里，每块数据
+    把相邻两字节拼成 uint16 查表，一遍向量化比较找出全部签名的候选位置；
+    候选再比较完整的 magic，由各签名的长度/结尾规则校验并确定结尾。一个
+    文件覆盖的范围内不再检查新的候选：ZIP 的后续本地文件头、PNG 中的
+    zlib 数据等不会重复列出。
+    """
+
+    def __init__(self, names=None, max_size: int = MAX_CARVE_SIZE):
+        names = set(names or ())
+        unknown = names - set(signature_names())
+        if unknown:
+            raise ValueError(f"未知的文件类型: {', '.join(sorted(unknown))}")
+        self.max_size = max_size
+        self._by_magic: Dict[bytes, List[CarveSignature]] = {}
+        for signature in SIGNATURES:
+            if not names or signature.name in names:
+                self._by_magic.setdefault(signature.magic, []).append(signature)
+        # 前两个字节 -> 以其开头的 magic
+        self._by_prefix: Dict[int, List[bytes]] = {}
+        for magic in self._by_magic:
+            self._by_prefix.setdefault(magic[0] | magic[1] << 8, []).append(magic)
+        self._prefix_table = np.zeros(1 << 16, dtype=bool)
+        self._prefix_table[list(self._by_prefix)] = True
+
+    def iter_candidates(self, data, start: int, end: int) -> Iterator[Tuple[int, bytes]]:
+        """按偏移顺序产出起点位于 [start, end) 内的 (偏移, magic)"""
+        size = len(data)
+        for block_start in range(start, end, MATCH_BLOCK):
+            block_end = min(block_start + MATCH_BLOCK, end)
+            # 多读 1 字节，块末的两字节前缀也能比较
+            window = np.frombuffer(data, dtype=np.uint8, count=min(block_end + 1, size) - block_start,
+                                   offset=block_start)
+            pairs = window[:-1].astype(np.uint16) | window[1:].astype(np.uint16) << 8
+            positions = np.flatnonzero(self._prefix_table[pairs[:block_end - block_start]])
+            for position, pair in zip(positions.tolist(), pairs[positions].tolist()):
+                offset = block_start + position
+                for magic in self._by_prefix[pair]:
+                    if data[offset:offset + len(magic)] == magic:
+                        yield offset, magic
+
+    def iter_carved(self, data, start: int = 0, end: Optional[int] = None) -> Iterator[CarvedFile]:
+        """按偏移顺序产出起点位于 [start, end) 内的内嵌文件，结尾可越过 end"""
+        size = len(data)
+        end = size if end is None else min(end, size)
+        if not self._by_magic:
+            return
+        covered = start
+        for offset, magic in self.iter_candidates(data, start, end):
+            if offset < covered:
+                continue
+            limit = min(size, offset + self.max_size)
+            for signature in self._by_magic[magic]:
+                try:
+                    length = signature.measure(data, offset, limit)
+                except (struct.error, IndexError):
+                    # 文件头被 limit 截断
+                    length = None
+                if length is not None and MIN_CARVE_SIZE <= length <= limit - offset:
+                    covered = offset + length
+                    yield CarvedFile(offset, length, signature.name, signature.extension)
+                    break
+
+    def iter_chunk_carved(self, data, start: int = 0, end: Optional[int] = None,
+                          chunk_size: int = CHUNK_SIZE) -> Iterator[Tuple[int, List[CarvedFile]]]:
+        """逐块产出 (块结束偏移, 内嵌文件列表)，跨块的文件只在起点所在的块中列出一次"""
+        end = len(data) if end is None else min(end, len(data))
+        covered = start
+        for chunk_start in range(start, end, chunk_size):
+            chunk_end = min(chunk_start + chunk_size, end)
+            found = list(self.iter_carved(data, max(chunk_start, covered), chunk_end))
+            if found:
+                covered = found[-1].offset + found[-1].length
+            yield chunk_end, found
+
+
+def scan_carve_range(data, start: int, end: int, carver: Optional[FileCarver] = None) -> List[CarvedFile]:
+    """返回起点位于 [start, end) 内的内嵌文件（并行扫描内核）
+
+    carver 在主进程中按当时的签名表建立，连同签名一起传给子进程；
+    spawn 方式启动的子进程里没有运行时注册的签名。
+    """
+    if carver is None:
+        carver = FileCarver()
+    return list(carver.iter_carved(data, start, end))
+
+
+def merge_carved(parts) -> List[CarvedFile]:
+    """按块顺序拼接，去掉落在前一个文件范围内的结果（各块不知道前一块的文件延伸到哪里）"""
+    merged = []
+    covered = 0
+    for part in parts:
+        for carved in part:
+            if carved.offset >= covered:
+                merged.append(carved)
+                covered = carved.offset + carved.length
+    return merged
+
+
+def carved_view(data, carved: CarvedFile) -> memoryview:
+    """内嵌文件内容的零拷贝视图，用完后需 release()，否则映射无法关闭"""
+    return memoryview(data)[carved.offset:carved.offset + carved.length]
+
+
+def carved_filename(carved: CarvedFile) -> str:
+    return f"{carved.offset:08X}.{carved.extension}"
+
+
+def save_carved(data, carved: CarvedFile, output_dir: str) -> str:
+    """把内嵌文件直接从映射写入 output_dir，不复制到内存，返回写入的路径"""
+    path = os.path.join(output_dir, carved_filename(carved))
+    view = carved_view(data, carved)
+    try:
+        with open(path, 'wb') as f:
+            f.write(view)
+    finally:
+        view.release()
+    return path
+
+
+def carved_to_arrays(carved_files: List[CarvedFile]) -> Tuple[Dict[str, np.ndarray], dict]:
+    """压缩为偏移/长度/类型序号数组，类型名放在元数据中"""
+    names = signature_names()
+    offsets = np.fromiter((carved.offset for carved in carved_files), dtype=np.uint64, count=len(carved_files))
+    lengths = np.fromiter((carved.length for carved in carved_files), dtype=np.uint64, count=len(carved_files))
+    kinds = np.fromiter((names.index(carved.name) for carved in carved_files), dtype=np.uint16,
+                        count=len(carved_files))
+    extensions = {carved.name: carved.extension for carved in carved_files}
+    return {'offsets': offsets, 'lengths': lengths, 'kinds': kinds}, {'names': names, 'extensions': extensions}
+
+
+def carved_from_arrays(arrays: Dict[str, np.ndarray], meta: dict) -> List[CarvedFile]:
+    names = meta['names']
+    return [CarvedFile(offset, length, names[kind], meta['extensions'][names[kind]])
+            for offset, length, kind in zip(arrays['offsets'].tolist(), arrays['lengths'].tolist(),
+                                            arrays['kinds'].tolist())]
+
+
+def carve_cache_kind(names, max_size: int) -> str:
+    return f"carve-{'+'.join(sorted(names)) if names else 'all'}-max{max_size}"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='按签名表查找文件中内嵌的 PNG、JPEG、zlib、gzip、ZIP、SQLite 等文件，可导出')
+    parser.add_argument('file', help='要扫描的文件')
+    parser.add_argument('-o', '--output', default=None, help='导出目录（不指定时只列出）')
+    parser.add_argument('-t', '--types', default='', help=f"逗号分隔的文件类型：{','.join(signature_names())}（默认全部）")
+    parser.add_argument('--max-size', type=int, default=MAX_CARVE_SIZE, help='单个内嵌文件的最大字节数')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='工作进程数')
+    args = parser.parse_args(argv)
+
+    from cli_output import silence_broken_pipe
+    from document import DatDocument, release_view
+    from parallel_scan import ParallelScanner
+
+    names = tuple(name.strip() for name in args.types.split(',') if name.strip())
+    try:
+        carver = FileCarver(names, args.max_size)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    try:
+        document = DatDocument.open(args.file)
+    except (OSError, ValueError) as e:
+        print(f"无法打开文件: {e}", file=sys.stderr)
+        return 2
+    if args.output:
+        os.makedirs(args.output, exist_ok=True)
+    data = document.view()
+    count = 0
+    covered = 0
+    try:
+        if args.jobs > 1:
+            scanner = ParallelScanner(args.file, args.jobs)
+            chunks = scanner.iter_chunks('carve', carver=carver)
+        else:
+            scanner = None
+            chunks = (found for _, found in carver.iter_chunk_carved(data))
+        # 边扫描边输出；并行时各块独立扫描，落在前一个文件范围内的结果在这里去掉
+        for found in chunks:
+            for carved in found:
+                if carved.offset < covered:
+                    continue
+                covered = carved.offset + carved.length
+                count += 1
+                line = f"0x{carved.offset:08X}\t{carved.length}\t{carved.name}"
+                if args.output:
+                    line += f"\t{save_carved(data, carved, args.output)}"
+                print(line)
+        if scanner is not None:
+            scanner.close()
+    except BrokenPipeError:
+        silence_broken_pipe()
+        return 0
+    finally:
+        release_view(data)
+        document.release()
+    return 0 if count else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
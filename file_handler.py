@@ -1,36 +1,108 @@
-import struct
-import mmap
-from typing import Optional, Dict, Any
+import os
+import re
+from typing import Optional, Dict, Any, Iterator, List, Tuple
+from dat_schema import DAT_HEADER
+from document import DatDocument, DocumentReader, release_view
+from hex_view import HexView
+from instrumentation import instrumented
+from keyword_search import KeywordMatcher
+from save_journal import write_ranges
+from string_scanner import StringHit, hits_from_arrays, hits_to_arrays, iter_strings, string_cache_kind
 
-class FileHandler:
+# analyze_file 中十六进制预览的字节数，完整内容通过分页的 HexView 浏览
+HEX_PREVIEW_BYTES = 4096
+
+# write_file 比较新旧内容的块大小，只有不同的块会被写回
+CHANGE_BLOCK = 64*1024
+
+# 文本字符之外的字节：除 {7,8,9,10,12,13,27} 和 0x20-0xFF（0x7F 除外）以外的字节
+NON_TEXT_PATTERN = re.compile(rb'[\x00-\x06\x0b\x0e-\x1a\x1c-\x1f\x7f]')
+
+
+def hex_dump_size(data, offset: int, length: Optional[int]) -> Optional[int]:
+    """hex_dump 实际转储的字节数"""
+    if data is None:
+        return None
+    available = max(len(data) - offset, 0)
+    return available if length is None else min(length, available)
+
+def replace_file(file_path: str, data) -> None:
+    """先写入临时文件再替换目标文件，data 可以是字节串或数据块迭代器
+
+    目标文件可能正被映射读取，直接以 'wb' 打开会截断映射中的数据；
+    Windows 上也不能替换仍被映射的文件，因此替换前先关闭共享映射，
+    之后的 DatDocument.open 会映射新文件。
+    """
+    temp_path = file_path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            f.write(data)
+        else:
+            # 可迭代的数据块，逐块写入
+            for chunk in data:
+                f.write(chunk)
+    DatDocument.close_path(file_path)
+    os.replace(temp_path, file_path)
+
+
+def changed_ranges(old, new, block_size: int = CHANGE_BLOCK) -> List[Tuple[int, bytes]]:
+    """按块比较等长的新旧内容，返回内容不同的区间 [(偏移, 新数据)]，相邻的块合并"""
+    ranges = []
+    start = None
+    for offset in range(0, len(new), block_size):
+        end = min(offset + block_size, len(new))
+        if old[offset:end] != new[offset:end]:
+            if start is None:
+                start = offset
+        elif start is not None:
+            ranges.append((start, bytes(new[start:offset])))
+            start = None
+    if start is not None:
+        ranges.append((start, bytes(new[start:])))
+    return ranges
+
+class FileHandler(DocumentReader):
     """通用文件处理类"""
     
-    def __init__(self, file_path: str):
-        self.file_path = file_path
-        self.data: Optional[bytes] = None
+    def __init__(self, file_path: str, document: Optional[DatDocument] = None):
+        super().__init__(file_path, document)
         
     def read_file(self, chunk_size: int = 1024*1024) -> bool:
-        """读取文件内容，支持大文件分块读取"""
+        """读取文件内容，通过共享的内存映射文档访问，不复制数据"""
+        return super().read_file()
+            
+    def write_file(self, data: bytes) -> bool:
+        """写入文件内容
+
+        长度不变时只原地写入有差异的块（先写撤销日志），共享映射保持有效；
+        长度变化时整体替换文件，先释放本对象的映射，替换后重新映射。
+        """
         try:
-            import mmap
-            with open(self.file_path, 'rb') as f:
-                # 使用内存映射文件
-                self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            if len(data) and os.path.isfile(self.file_path) and os.path.getsize(self.file_path) == len(data):
+                document = DatDocument.open(self.file_path)
+                old = document.view()
+                try:
+                    ranges = changed_ranges(old, memoryview(data))
+                finally:
+                    release_view(old)
+                    document.release()
+                write_ranges(self.file_path, ranges, journal=True)
+                return True
+            reading = self.data is not None
+            self.cleanup()
+            replace_file(self.file_path, data)
+            if reading and len(data):
+                self.document = None
+                self.read_file()
             return True
         except Exception as e:
-            print(f"文件读取失败: {e}")
+            print(f"文件写入失败: {e}")
             return False
             
-    def cleanup(self):
-        """清理内存映射资源"""
-        if hasattr(self, 'data') and self.data:
-            self.data.close()
-            
-    def write_file(self, data: bytes) -> bool:
-        """写入文件内容"""
+    def write_ranges(self, ranges, journal: bool = True) -> bool:
+        """只原地写入指定区间 [(偏移, 数据)]，可选撤销日志保护"""
         try:
-            with open(self.file_path, 'wb') as f:
-                f.write(data)
+            write_ranges(self.file_path, ranges, journal)
             return True
         except Exception as e:
             print(f"文件写入失败: {e}")
@@ -42,12 +114,8 @@ class FileHandler:
             return None
             
         try:
-            header = {
-                'magic': self.data[:12].decode('ascii', errors='ignore').strip('\x00'),
-                'version': struct.unpack('>I', self.data[12:16])[0],
-                'file_size': struct.unpack('>I', self.data[16:20])[0],
-                'timestamp': struct.unpack('>I', self.data[20:24])[0]
-            }
+            header = DAT_HEADER.unpack(self.data)
+            header['magic'] = header['magic'].decode('ascii', errors='ignore').strip('\x00')
             return header
         except Exception as e:
             print(f"文件头解析失败: {e}")
@@ -59,54 +127,69 @@ class FileHandler:
             return None
             
         try:
-            keyword_bytes = keyword.encode('utf-8')
-            return self.data.find(keyword_bytes)
+            for _, offset in KeywordMatcher([keyword]).iter_matches(self.data):
+                return offset
+            return -1
         except Exception as e:
             print(f"关键词查找失败: {e}")
             return None
             
     def extract_strings(self, min_length: int = 4) -> Optional[list]:
         """提取可打印字符串"""
+        hits = self.extract_string_hits(min_length)
+        if hits is None:
+            return None
+        return [hit.text for hit in hits]
+
+    @instrumented()
+    def extract_string_hits(self, min_length: int = 4) -> Optional[List[StringHit]]:
+        """提取可打印字符串，保留偏移和长度"""
         if not self.data:
             return None
-            
+
         try:
-            strings = []
-            current_string = ""
-            
-            for byte in self.data:
-                if 32 <= byte <= 126:  # 可打印ASCII范围
-                    current_string += chr(byte)
-                else:
-                    if len(current_string) >= min_length:
-                        strings.append(current_string)
-                    current_string = ""
-                    
-            if len(current_string) >= min_length:
-                strings.append(current_string)
-                
-            return strings
+            return self.cached_result(
+                string_cache_kind(min_length),
+                lambda: list(iter_strings(self.data, min_length)),
+                hits_to_arrays,
+                lambda arrays, meta: hits_from_arrays(self.data, arrays)
+            )
         except Exception as e:
             print(f"字符串提取失败: {e}")
             return None
+
+    def iter_string_hits(self, min_length: int = 4) -> Iterator[StringHit]:
+        """以生成器方式逐个产出字符串命中"""
+        if not self.data:
+            return iter(())
+        return iter_strings(self.data, min_length)
             
-    def hex_dump(self, bytes_per_line: int = 16) -> Optional[str]:
-        """生成十六进制转储"""
+    @instrumented(size=lambda self, bytes_per_line=16, offset=0, length=None: hex_dump_size(self.data, offset, length))
+    def hex_dump(self, bytes_per_line: int = 16, offset: int = 0, length: Optional[int] = None) -> Optional[str]:
+        """生成十六进制转储，可只转储 [offset, offset+length) 范围"""
         if not self.data:
             return None
             
         try:
-            result = ""
-            for i in range(0, len(self.data), bytes_per_line):
-                chunk = self.data[i:i+bytes_per_line]
-                hex_str = ' '.join(f'{b:02X}' for b in chunk)
-                ascii_str = ''.join(chr(b) if 32 <= b <= 126 else '.' for b in chunk)
-                result += f"{i:08X}  {hex_str.ljust(bytes_per_line*3)}  |{ascii_str}|\n"
-            return result
+            return ''.join(line + '\n' for line in self.iter_hex_dump(bytes_per_line, offset, length))
         except Exception as e:
             print(f"生成十六进制转储失败: {e}")
             return None
             
+    def iter_hex_dump(self, bytes_per_line: int = 16, offset: int = 0, length: Optional[int] = None,
+                      rows_per_batch: int = 4096) -> Iterator[str]:
+        """逐行产出十六进制转储，每次只格式化 rows_per_batch 行，可转储任意大的范围"""
+        if not self.data:
+            return
+        if length is None:
+            length = len(self.data) - offset
+        view = HexView(self.data, bytes_per_line, cache_pages=1)
+        first_row = offset // bytes_per_line
+        last_row = (offset + length + bytes_per_line - 1) // bytes_per_line
+        for row in range(first_row, last_row, rows_per_batch):
+            yield from view.render_rows(row, min(rows_per_batch, last_row - row))
+            
+    @instrumented(count=lambda analysis: len(analysis['strings'] or ()) if analysis else None)
     def analyze_file(self) -> Optional[dict]:
         """分析文件内容"""
         if not self.data:
@@ -115,9 +198,14 @@ class FileHandler:
         try:
             analysis = {
                 'file_size': len(self.data),
-                'is_text': self.is_text_file(),
+                'is_text': self.cached_result(
+                    'text-check',
+                    self.is_text_file,
+                    lambda is_text: ({}, {'is_text': is_text}),
+                    lambda arrays, meta: meta['is_text']
+                ),
                 'strings': self.extract_strings(),
-                'hex_dump': self.hex_dump()
+                'hex_dump': self.hex_dump(length=HEX_PREVIEW_BYTES)
             }
             return analysis
         except Exception as e:
@@ -130,8 +218,7 @@ class FileHandler:
             return False
             
         try:
-            text_chars = bytearray({7,8,9,10,12,13,27} | set(range(0x20, 0x100)) - {0x7f})
-            return bool(self.data.translate(None, text_chars))
+            return NON_TEXT_PATTERN.search(self.data) is None
         except Exception as e:
             print(f"判断文件类型失败: {e}")
             return False
\ No newline at end of file
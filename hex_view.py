@@ -0,0 +1,87 @@
+from collections import OrderedDict
+from typing import List
+
+# 不可打印字节显示为 '.'
+ASCII_TABLE = bytes(b if 32 <= b <= 126 else ord('.') for b in range(256))
+
+
+def format_row(offset: int, chunk: bytes, bytes_per_line: int = 16) -> str:
+    """格式化一行：偏移、十六进制、ASCII"""
+    hex_str = chunk.hex(' ').upper()
+    ascii_str = chunk.translate(ASCII_TABLE).decode('ascii')
+    return f"{offset:08X}  {hex_str.ljust(bytes_per_line*3)}  |{ascii_str}|"
+
+
+class HexView:
+    """分页的十六进制视图
+
+    只格式化请求的行，已格式化的页保存在 LRU 缓存中，滚动和跳转时
+    不需要把整个文件转成字符串。data 可以是 bytes、memoryview 或
+    EditBuffer（此时显示包含未保存的修改）。
+    """
+
+    def __init__(self, data, bytes_per_line: int = 16, rows_per_page: int = 64, cache_pages: int = 128):
+        self.data = data
+        self.bytes_per_line = bytes_per_line
+        self.rows_per_page = rows_per_page
+        self.cache_pages = cache_pages
+        self._cache: OrderedDict = OrderedDict()
+
+    @property
+    def page_bytes(self) -> int:
+        return self.bytes_per_line * self.rows_per_page
+
+    @property
+    def rows(self) -> int:
+        """总行数"""
+        return (len(self.data) + self.bytes_per_line - 1) // self.bytes_per_line
+
+    def row_of(self, offset: int) -> int:
+        """偏移所在的行号"""
+        return max(0, min(offset, len(self.data) - 1)) // self.bytes_per_line
+
+    def page(self, index: int) -> List[str]:
+        """返回第 index 页的格式化行，优先从缓存读取"""
+        lines = self._cache.get(index)
+        if lines is not None:
+            self._cache.move_to_end(index)
+            return lines
+
+        start = index * self.page_bytes
+        raw = bytes(self.data[start:start + self.page_bytes])
+        lines = [
+            format_row(start + i, raw[i:i + self.bytes_per_line], self.bytes_per_line)
+            for i in range(0, len(raw), self.bytes_per_line)
+        ]
+        self._cache[index] = lines
+        if len(self._cache) > self.cache_pages:
+            self._cache.popitem(last=False)
+        return lines
+
+    def render_rows(self, first_row: int, count: int) -> List[str]:
+        """返回从 first_row 开始的 count 行"""
+        first_row = max(0, min(first_row, self.rows))
+        last_row = min(first_row + count, self.rows)
+        lines = []
+        row = first_row
+        while row < last_row:
+            index, skip = divmod(row, self.rows_per_page)
+            page = self.page(index)
+            take = min(len(page) - skip, last_row - row)
+            lines.extend(page[skip:skip + take])
+            row += take
+        return lines
+
+    def window(self, offset: int, count: int) -> str:
+        """跳转到 offset 所在行，返回之后 count 行的文本"""
+        return '\n'.join(self.render_rows(self.row_of(offset), count))
+
+    def invalidate(self, offset: int = None, length: int = 1):
+        """数据修改后丢弃受影响的缓存页，offset 为 None 时清空全部"""
+        if offset is None:
+            self._cache.clear()
+            return
+        first = offset // self.page_bytes
+        last = (offset + max(length, 1) - 1) // self.page_bytes
+        for index in range(first, last + 1):
+            self._cache.pop(index, None)
@@ -0,0 +1,237 @@
+import re
+from bisect import bisect_left
+from collections import Counter
+from typing import Iterable, Iterator, List, Tuple
+
+import numpy as np
+
+from edit_buffer import EditBuffer
+from keyword_search import Keyword, KeywordMatcher
+from ngram_stats import (BINCOUNT_MAX_WIDTH, HeavyHitters, NGramResult, byte_histogram, dense_top,
+                         iter_packed_ngrams, pack_ngrams, unpack_ngram)
+from string_scanner import PRINTABLE_CLASS, StringHit, iter_strings
+from structure_scanner import StructureCandidates, concat_candidates, scan_range, scan_structures
+
+# 查找字符串边界时每次读取的字节数
+BOUNDARY_BLOCK = 4096
+
+_NON_PRINTABLE = re.compile(rb'[^' + PRINTABLE_CLASS[1:-1] + rb']')
+
+
+def snapshot(buffer: EditBuffer):
+    """返回可整体扫描的内容：没有修改时直接用原始映射，不复制"""
+    return buffer.tobytes() if buffer.is_dirty else buffer.base
+
+
+class IncrementalIndex:
+    """订阅编辑事件的分析索引基类
+
+    建立时完整扫描一次，之后每次写入、撤销或重做只重新计算受影响的
+    区间。编辑为覆盖写，文件长度不变，因此区间之外的结果始终有效。
+    不再使用时调用 close() 取消订阅。
+    """
+
+    def __init__(self, buffer: EditBuffer):
+        self.buffer = buffer
+        buffer.add_listener(self.on_edit)
+
+    def close(self):
+        self.buffer.remove_listener(self.on_edit)
+
+    def on_edit(self, offset: int, before: bytes, after: bytes):
+        raise NotImplementedError
+
+
+class StringIndex(IncrementalIndex):
+    """可打印 ASCII 字符串索引
+
+    编辑只影响包含改动字节的那一段连续可打印字符：从改动处向前后
+    扩展到最近的不可打印字节，删掉起点落在这段内的旧字符串，再重新
+    切分这一段。
+    """
+
+    def __init__(self, buffer: EditBuffer, min_length: int = 4):
+        self.min_length = min_length
+        self.hits: List[StringHit] = list(iter_strings(snapshot(buffer), min_length))
+        self._offsets = [hit.offset for hit in self.hits]
+        super().__init__(buffer)
+
+    def __len__(self) -> int:
+        return len(self.hits)
+
+    def iter_range(self, start: int, end: int) -> Iterator[StringHit]:
+        """产出起始偏移位于 [start, end) 内的字符串"""
+        for i in range(bisect_left(self._offsets, start), bisect_left(self._offsets, end)):
+            yield self.hits[i]
+
+    def _run_start(self, pos: int) -> int:
+        """pos 之前连续可打印字符的起点"""
+        while pos > 0:
+            block_start = max(0, pos - BOUNDARY_BLOCK)
+            match = _NON_PRINTABLE.search(self.buffer.read(block_start, pos - block_start)[::-1])
+            if match:
+                return pos - match.start()
+            pos = block_start
+        return 0
+
+    def _run_end(self, pos: int) -> int:
+        """pos 起连续可打印字符的终点"""
+        while pos < self.buffer.size:
+            block = self.buffer.read(pos, BOUNDARY_BLOCK)
+            match = _NON_PRINTABLE.search(block)
+            if match:
+                return pos + match.start()
+            pos += len(block)
+        return self.buffer.size
+
+    def on_edit(self, offset: int, before: bytes, after: bytes):
+        # 改动区间之外的字节不变，旧字符串和新字符串都被同样的不可打印字节截断
+        start = self._run_start(offset)
+        end = self._run_end(offset + len(after))
+        first = bisect_left(self._offsets, start)
+        last = bisect_left(self._offsets, end)
+        hits = [StringHit(start + hit.offset, hit.length, hit.text)
+                for hit in iter_strings(self.buffer.read(start, end - start), self.min_length)]
+        self.hits[first:last] = hits
+        self._offsets[first:last] = [hit.offset for hit in hits]
+
+
+class KeywordIndex(IncrementalIndex):
+    """关键词命中索引，编辑后只重新扫描可能跨过改动区间的起始位置"""
+
+    def __init__(self, buffer: EditBuffer, keywords: Iterable[Keyword]):
+        self.matcher = KeywordMatcher(keywords)
+        self.hits: List[Tuple[Keyword, int]] = list(self.matcher.iter_matches(snapshot(buffer)))
+        self._offsets = [offset for _, offset in self.hits]
+        self.counts = Counter({keyword: 0 for keyword in self.matcher.keywords})
+        self.counts.update(keyword for keyword, _ in self.hits)
+        super().__init__(buffer)
+
+    def __len__(self) -> int:
+        return len(self.hits)
+
+    def iter_range(self, start: int, end: int) -> Iterator[Tuple[Keyword, int]]:
+        """产出起始偏移位于 [start, end) 内的 (关键词, 偏移)"""
+        for i in range(bisect_left(self._offsets, start), bisect_left(self._offsets, end)):
+            yield self.hits[i]
+
+    def on_edit(self, offset: int, before: bytes, after: bytes):
+        if not self.matcher.max_length:
+            return
+        start = max(0, offset - self.matcher.max_length + 1)
+        end = offset + len(after)
+        window = self.buffer.read(start, end + self.matcher.max_length - 1 - start)
+        hits = []
+        for keyword, position in self.matcher.iter_matches(window):
+            if position >= end - start:
+                break
+            hits.append((keyword, start + position))
+
+        first = bisect_left(self._offsets, start)
+        last = bisect_left(self._offsets, end)
+        self.counts.subtract(keyword for keyword, _ in self.hits[first:last])
+        self.counts.update(keyword for keyword, _ in hits)
+        self.hits[first:last] = hits
+        self._offsets[first:last] = [position for _, position in hits]
+
+
+class StructureIndex(IncrementalIndex):
+    """候选数组结构索引
+
+    候选头部由相邻两个 uint32 组成，只有头部8字节与改动区间重叠的
+    偏移需要重新判断；数组主体是否越界只与文件长度有关，不受编辑影响。
+    """
+
+    def __init__(self, buffer: EditBuffer, max_count: int = 1000, max_size: int = 1000):
+        self.max_count = max_count
+        self.max_size = max_size
+        self.candidates = scan_structures(snapshot(buffer), max_count=max_count, max_size=max_size)
+        super().__init__(buffer)
+
+    def __len__(self) -> int:
+        return len(self.candidates.offsets)
+
+    def on_edit(self, offset: int, before: bytes, after: bytes):
+        start = max(0, offset - 7)
+        end = offset + len(after)
+        window = self.buffer.read(start, end + 8 - start)
+        found = scan_range(window, 0, end - start, self.max_count, self.max_size,
+                           file_size=self.buffer.size - start)
+        found = found._replace(offsets=found.offsets + np.uint64(start))
+
+        offsets = self.candidates.offsets
+        first = int(np.searchsorted(offsets, start))
+        last = int(np.searchsorted(offsets, end))
+        self.candidates = concat_candidates([
+            StructureCandidates(*(field[:first] for field in self.candidates)),
+            found,
+            StructureCandidates(*(field[last:] for field in self.candidates))
+        ])
+
+
+class NGramIndex(IncrementalIndex):
+    """字节频率和 n-gram 计数索引
+
+    编辑后只对改动区间前后各 width-1 字节的邻域，减去旧内容的 n-gram、
+    加上新内容的 n-gram。宽度不超过 BINCOUNT_MAX_WIDTH 时计数精确；
+    更宽时沿用重频项摘要，摘要不精确时结果仍为近似计数。
+    """
+
+    def __init__(self, buffer: EditBuffer, widths=(4,), top_k: int = 5, capacity: int = 1 << 20):
+        self.widths = tuple(widths)
+        self.top_k = top_k
+        data = snapshot(buffer)
+        self.hist = byte_histogram(data)
+        self.counts = {}
+        for width in self.widths:
+            if width <= BINCOUNT_MAX_WIDTH:
+                counts = np.zeros(1 << (8 * width), dtype=np.int64)
+                for packed in iter_packed_ngrams(data, width):
+                    counts += np.bincount(packed.astype(np.intp), minlength=len(counts))
+            else:
+                counts = HeavyHitters(capacity)
+                for packed in iter_packed_ngrams(data, width):
+                    keys, key_counts = np.unique(packed, return_counts=True)
+                    counts.update(keys, key_counts.astype(np.int64))
+            self.counts[width] = counts
+        super().__init__(buffer)
+
+    def _neighborhood(self, offset: int, before: bytes, after: bytes, width: int):
+        """改动区间前后各扩展 width-1 字节，返回改动前和改动后的打包 n-gram"""
+        end = offset + len(after)
+        start = max(0, offset - width + 1)
+        stop = min(end + width - 1, self.buffer.size)
+        head = self.buffer.read(start, offset - start)
+        tail = self.buffer.read(end, stop - end)
+        positions = stop - start - width + 1
+        if positions <= 0:
+            empty = np.empty(0, dtype=np.uint64)
+            return empty, empty
+        old = np.frombuffer(head + before + tail, dtype=np.uint8)
+        new = np.frombuffer(head + after + tail, dtype=np.uint8)
+        return pack_ngrams(old, width, positions), pack_ngrams(new, width, positions)
+
+    def on_edit(self, offset: int, before: bytes, after: bytes):
+        self.hist -= np.bincount(np.frombuffer(before, dtype=np.uint8), minlength=256)
+        self.hist += np.bincount(np.frombuffer(after, dtype=np.uint8), minlength=256)
+        for width, counts in self.counts.items():
+            old, new = self._neighborhood(offset, before, after, width)
+            if isinstance(counts, HeavyHitters):
+                counts.adjust(np.concatenate((old, new)),
+                              np.concatenate((np.full(len(old), -1), np.ones(len(new)))))
+            else:
+                np.subtract.at(counts, old.astype(np.intp), 1)
+                np.add.at(counts, new.astype(np.intp), 1)
+
+    def result(self):
+        """当前的字节频率和常见 n-gram，格式与 DataAnalyzer.find_patterns 相同"""
+        byte_freq = [(int(b), int(self.hist[b])) for b in np.argsort(-self.hist, kind='stable')[:10] if self.hist[b]]
+        patterns = {}
+        for width, counts in self.counts.items():
+            total = max(self.buffer.size - width + 1, 0)
+            if isinstance(counts, HeavyHitters):
+                top = [(unpack_ngram(value, width), count) for value, count in counts.top(self.top_k)]
+                patterns[width] = NGramResult(width, total, top, counts.exact)
+            else:
+                patterns[width] = NGramResult(width, total, dense_top(counts, width, self.top_k), True)
+        return {'byte_freq': byte_freq, 'patterns': patterns}
@@ -0,0 +1,408 @@
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter, namedtuple
+from contextlib import contextmanager
+from typing import Callable, List, Optional
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# 一次分析操作的度量
+#   operation    : 操作名
+#   file_path    : 被分析的文件（可能为 None）
+#   started      : 开始时间（Unix 时间戳）
+#   wall_time    : 耗时（秒）
+#   bytes        : 处理的字节数
+#   throughput   : 字节/秒
+#   peak_rss     : 操作结束时进程的峰值常驻内存（字节，平台不支持时为 None）
+#   result_count : 结果数量（命中数、行数等，未知时为 None）
+#   cache_hit    : 结果是否来自分析缓存
+#   ok           : 是否成功（返回 None/False 或抛出异常视为失败）
+#   error        : 异常说明
+#   parent       : 外层操作名，顶层操作为 None
+#   profile      : 采样分析报告（仅启用采样的那次操作）
+OperationEvent = namedtuple('OperationEvent', [
+    'operation', 'file_path', 'started', 'wall_time', 'bytes', 'throughput',
+    'peak_rss', 'result_count', 'cache_hit', 'ok', 'error', 'parent', 'profile'
+])
+
+PROFILE_INTERVAL = 0.005
+PROFILE_TOP = 25
+
+
+def _windows_peak_rss() -> Optional[int]:
+    import ctypes
+    from ctypes import wintypes
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                    ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                    ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                    ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+    counters = ProcessMemoryCounters()
+    counters.cb = ctypes.sizeof(counters)
+    process = ctypes.windll.kernel32.GetCurrentProcess()
+    if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+        return None
+    return counters.PeakWorkingSetSize
+
+
+def peak_rss() -> Optional[int]:
+    """进程的峰值常驻内存（字节）"""
+    try:
+        with open('/proc/self/status', 'rb') as f:
+            for line in f:
+                if line.startswith(b'VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    if resource is not None:
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS 以字节为单位，其他系统为 KB
+        return usage if sys.platform == 'darwin' else usage * 1024
+    if sys.platform == 'win32':
+        try:
+            return _windows_peak_rss()
+        except Exception:
+            return None
+    return None
+
+
+def reset_peak_rss() -> bool:
+    """把峰值常驻内存重置为当前值（仅 Linux 支持），使 peak_rss 只反映之后的操作"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+class SamplingProfiler:
+    """采样分析器：后台线程定期抓取目标线程的调用栈
+
+    只统计函数（文件、首行、函数名）出现的次数，开销与被分析代码的
+    调用次数无关，适合分析耗时较长的单次操作。numpy 等释放 GIL 的
+    计算会记在调用它的 Python 函数上。
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL, thread_id: Optional[int] = None):
+        self.interval = interval
+        self.thread_id = thread_id
+        self.samples = 0
+        self.self_counts = Counter()
+        self.total_counts = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.thread_id is None:
+            self.thread_id = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='dat-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self) -> 'SamplingProfiler':
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            self.samples += 1
+            seen = set()
+            top = True
+            while frame is not None:
+                code = frame.f_code
+                key = (code.co_filename, code.co_firstlineno, code.co_name)
+                if top:
+                    self.self_counts[key] += 1
+                    top = False
+                if key not in seen:
+                    seen.add(key)
+                    self.total_counts[key] += 1
+                frame = frame.f_back
+
+    def report(self, limit: int = PROFILE_TOP) -> List[dict]:
+        """按累计采样数排序的函数列表"""
+        rows = []
+        for key, total in self.total_counts.most_common(limit):
+            filename, line, name = key
+            rows.append({
+                'function': f"{name} ({os.path.basename(filename)}:{line})",
+                'self': self.self_counts.get(key, 0),
+                'total': total,
+                'self_ratio': self.self_counts.get(key, 0) / self.samples,
+                'total_ratio': total / self.samples
+            })
+        return rows
+
+
+def format_profile(rows: List[dict], samples: Optional[int] = None) -> str:
+    lines = [f"  采样分析（{samples} 个样本）：" if samples else "  采样分析："]
+    lines.append(f"  {'自身':>7} {'累计':>7}  函数")
+    for row in rows:
+        lines.append(f"  {row['self_ratio']:>7.1%} {row['total_ratio']:>7.1%}  {row['function']}")
+    return '\n'.join(lines)
+
+
+class OperationFrame:
+    """正在进行的操作，被包装的代码可以补充结果数量、缓存命中等信息"""
+
+    def __init__(self, operation: str, file_path: Optional[str], size: Optional[int], parent: Optional[str]):
+        self.operation = operation
+        self.file_path = file_path
+        self.bytes = size
+        self.parent = parent
+        self.result_count = None
+        self.cache_hit = False
+        self.ok = True
+        self.error = None
+
+
+class Instrumentation:
+    """操作度量的收集与分发
+
+    没有接收端（sink）且没有等待采样的操作时，instrumented 包装的方法
+    直接调用原函数，几乎没有开销。接收端是可调用对象，参数为
+    OperationEvent，可能在后台线程中被调用。
+    """
+
+    def __init__(self):
+        self.sinks: List[Callable] = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # 下一次运行该操作时启用采样分析
+        self.profile_target: Optional[str] = None
+        self.profile_interval = PROFILE_INTERVAL
+        self.last_profile: Optional[SamplingProfiler] = None
+        # 各线程中正在运行的顶层操作数，峰值内存只在没有其他操作时重置
+        self._running = 0
+
+    @property
+    def active(self) -> bool:
+        return bool(self.sinks) or self.profile_target is not None
+
+    def add_sink(self, sink: Callable):
+        with self._lock:
+            self.sinks = self.sinks + [sink]
+
+    def remove_sink(self, sink: Callable):
+        with self._lock:
+            self.sinks = [s for s in self.sinks if s is not sink]
+
+    def profile_next(self, operation: Optional[str], interval: float = PROFILE_INTERVAL):
+        """对下一次运行的 operation 启用采样分析，传 None 取消"""
+        self.profile_target = operation
+        self.profile_interval = interval
+
+    def configure_from_env(self):
+        """按环境变量配置：DAT_ANALYZER_METRICS 指定 JSON Lines 文件（'-' 输出到标准错误），
+        DAT_ANALYZER_PROFILE 指定要采样分析的操作名"""
+        target = os.environ.get('DAT_ANALYZER_METRICS')
+        if target:
+            try:
+                self.add_sink(StreamSink() if target == '-' else JsonLinesSink(target))
+            except OSError as e:
+                print(f"无法打开度量输出文件: {e}", file=sys.stderr)
+        operation = os.environ.get('DAT_ANALYZER_PROFILE')
+        if operation:
+            self.profile_next(operation)
+
+    def _stack(self) -> list:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @property
+    def current(self) -> Optional[OperationFrame]:
+        """当前线程中最内层的操作"""
+        stack = getattr(self._local, 'stack', None)
+        return stack[-1] if stack else None
+
+    def note_cache_hit(self):
+        frame = self.current
+        if frame is not None:
+            frame.cache_hit = True
+
+    def _take_profiler(self, operation: str) -> Optional[SamplingProfiler]:
+        with self._lock:
+            if self.profile_target != operation:
+                return None
+            self.profile_target = None
+        return SamplingProfiler(self.profile_interval)
+
+    def _enter_top_level(self):
+        """登记一个顶层操作；没有接收端时不重置，其他线程的操作还在运行时
+        也不重置，以免抹掉它们的峰值"""
+        with self._lock:
+            if self.sinks and not self._running:
+                reset_peak_rss()
+            self._running += 1
+
+    @contextmanager
+    def operation(self, name: str, file_path: Optional[str] = None, size: Optional[int] = None):
+        """度量 with 块内的操作，结束时向所有接收端发送 OperationEvent"""
+        stack = self._stack()
+        frame = OperationFrame(name, file_path, size, stack[-1].operation if stack else None)
+        profiler = self._take_profiler(name)
+        top_level = frame.parent is None
+        if top_level:
+            self._enter_top_level()
+        started = time.time()
+        begin = time.perf_counter()
+        stack.append(frame)
+        if profiler is not None:
+            profiler.start()
+        try:
+            yield frame
+        except BaseException as e:
+            frame.ok = False
+            frame.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            wall_time = time.perf_counter() - begin
+            stack.pop()
+            if top_level:
+                with self._lock:
+                    self._running -= 1
+            profile = None
+            if profiler is not None:
+                profiler.stop()
+                self.last_profile = profiler
+                profile = {'samples': profiler.samples, 'functions': profiler.report()}
+            if self.sinks:
+                size = frame.bytes or 0
+                self.emit(OperationEvent(
+                    frame.operation, frame.file_path, started, wall_time, size,
+                    size / wall_time if wall_time > 0 else None, peak_rss(), frame.result_count,
+                    frame.cache_hit, frame.ok, frame.error, frame.parent, profile
+                ))
+
+    def emit(self, event: OperationEvent):
+        for sink in self.sinks:
+            try:
+                sink(event)
+            except Exception as e:
+                print(f"度量输出失败: {e}", file=sys.stderr)
+
+
+def result_count(result) -> Optional[int]:
+    """默认的结果计数：容器取长度，文本取行数"""
+    if result is None or isinstance(result, bool):
+        return None
+    if isinstance(result, str):
+        return result.count('\n')
+    try:
+        return len(result)
+    except TypeError:
+        return None
+
+
+def document_size(reader, *args, **kwargs) -> Optional[int]:
+    data = getattr(reader, 'data', None)
+    return len(data) if data is not None else None
+
+
+def instrumented(name: Optional[str] = None, size: Callable = document_size, count: Callable = result_count):
+    """包装 DocumentReader 的分析方法，记录耗时、字节数、内存和结果数
+
+    size(self, *args, **kwargs) 返回处理的字节数，count(result) 返回结果数量。
+    """
+    def decorate(func):
+        operation_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            if not instrumentation.active:
+                return func(self, *args, **kwargs)
+            with instrumentation.operation(operation_name, getattr(self, 'file_path', None),
+                                           size(self, *args, **kwargs)) as frame:
+                result = func(self, *args, **kwargs)
+                frame.result_count = count(result)
+                # 分析方法出错时打印提示并返回 None/False
+                frame.ok = result is not None and result is not False
+                return result
+        return wrapper
+    return decorate
+
+
+def event_to_dict(event: OperationEvent) -> dict:
+    return event._asdict()
+
+
+def format_event(event: OperationEvent) -> str:
+    """单行可读文本，采样分析报告另起多行"""
+    parts = [f"[度量] {event.operation}", f"{event.wall_time:.3f}s"]
+    if event.bytes:
+        parts.append(f"{event.bytes / 1048576:.1f}MB")
+    if event.throughput:
+        parts.append(f"{event.throughput / 1048576:.1f}MB/s")
+    if event.peak_rss:
+        parts.append(f"峰值内存 {event.peak_rss / 1048576:.1f}MB")
+    if event.result_count is not None:
+        parts.append(f"结果 {event.result_count}")
+    if event.cache_hit:
+        parts.append("缓存")
+    if not event.ok:
+        parts.append(f"失败{': ' + event.error if event.error else ''}")
+    if event.file_path:
+        parts.append(os.path.basename(event.file_path))
+    text = '  '.join(parts)
+    if event.profile:
+        text += '\n' + format_profile(event.profile['functions'], event.profile['samples'])
+    return text
+
+
+class JsonLinesSink:
+    """把每个事件作为一行 JSON 追加到文件，多个进程可以共用同一个文件"""
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self._file = open(file_path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def __call__(self, event: OperationEvent):
+        line = json.dumps(event_to_dict(event), ensure_ascii=False) + '\n'
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class StreamSink:
+    """以可读文本输出到流（默认标准错误）"""
+
+    def __init__(self, stream=None):
+        self.stream = stream
+
+    def __call__(self, event: OperationEvent):
+        stream = self.stream or sys.stderr
+        print(format_event(event), file=stream, flush=True)
+
+
+instrumentation = Instrumentation()
+instrumentation.configure_from_env()
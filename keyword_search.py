@@ -0,0 +1,130 @@
+import re
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Tuple, Union
+
+Keyword = Union[str, bytes]
+
+
+def encode_keyword(keyword: Keyword) -> bytes:
+    """将关键词统一转换为字节串"""
+    if isinstance(keyword, str):
+        return keyword.encode('utf-8')
+    return bytes(keyword)
+
+
+class KeywordMatcher:
+    """多关键词匹配器
+
+    按 Aho-Corasick 的思路把所有关键词组织成一棵字典树，每个结点记录
+    以该结点结尾的关键词（输出函数）。字典树再编译成一个嵌套的正则
+    前瞻表达式，由正则引擎在C层单遍扫描整个缓冲区：每个位置只沿字典树
+    走一次，得到该位置最长的关键词，其余作为前缀的关键词从输出表中取出。
+    因此重叠命中、互为前缀的关键词都能一次找全。
+    """
+
+    def __init__(self, keywords: Iterable[Keyword]):
+        self.keywords: List[Keyword] = []
+        self._by_bytes: Dict[bytes, List[Keyword]] = {}
+        for keyword in keywords:
+            keyword_bytes = encode_keyword(keyword)
+            if not keyword_bytes:
+                continue
+            if keyword_bytes not in self._by_bytes:
+                self._by_bytes[keyword_bytes] = []
+            self._by_bytes[keyword_bytes].append(keyword)
+            self.keywords.append(keyword)
+
+        self.max_length = max((len(k) for k in self._by_bytes), default=0)
+        self._trie = self._build_trie()
+        self._outputs = self._build_outputs()
+        self._pattern = self._compile()
+
+    def _build_trie(self) -> dict:
+        """构建字典树，结点为 {字节: 子结点}，终止标记存放在 None 键"""
+        root = {}
+        for keyword_bytes in self._by_bytes:
+            node = root
+            for byte in keyword_bytes:
+                node = node.setdefault(byte, {})
+            node[None] = True
+        return root
+
+    def _build_outputs(self) -> Dict[bytes, List[bytes]]:
+        """为每个关键词预先计算同一位置上同时命中的前缀关键词"""
+        outputs = {}
+        for keyword_bytes in self._by_bytes:
+            outputs[keyword_bytes] = [
+                keyword_bytes[:i] for i in range(1, len(keyword_bytes) + 1)
+                if keyword_bytes[:i] in self._by_bytes
+            ]
+        return outputs
+
+    def _node_regex(self, node: dict) -> bytes:
+        branches = []
+        for byte in sorted(k for k in node if k is not None):
+            branches.append(re.escape(bytes([byte])) + self._node_regex(node[byte]))
+        if not branches:
+            return b''
+        body = branches[0] if len(branches) == 1 else b'(?:' + b'|'.join(branches) + b')'
+        if None in node:
+            # 当前结点本身是关键词结尾，后续分支可选（贪婪，优先取最长）
+            if len(branches) == 1:
+                body = b'(?:' + body + b')'
+            body += b'?'
+        return body
+
+    def _compile(self):
+        if not self._trie:
+            return None
+        return re.compile(b'(?=(' + self._node_regex(self._trie) + b'))', re.DOTALL)
+
+    def iter_matches(self, data, start: int = 0, end: int = None) -> Iterator[Tuple[Keyword, int]]:
+        """按偏移顺序逐个产出 (关键词, 偏移)"""
+        if self._pattern is None:
+            return
+        if end is None:
+            end = len(data)
+        for match in self._pattern.finditer(data, start, end):
+            offset = match.start()
+            for keyword_bytes in self._outputs[match.group(1)]:
+                for keyword in self._by_bytes[keyword_bytes]:
+                    yield keyword, offset
+
+    def count(self, data) -> Counter:
+        """统计每个关键词的命中次数"""
+        counts = Counter({keyword: 0 for keyword in self.keywords})
+        for keyword, _ in self.iter_matches(data):
+            counts[keyword] += 1
+        return counts
+
+
+_matcher_cache = {}
+
+
+def scan_keywords_range(data, start: int, end: int, keywords=()) -> List[Tuple[Keyword, int]]:
+    """返回起始偏移位于 [start, end) 内的全部命中（并行扫描内核）
+
+    额外读取 max_length-1 字节，跨块的关键词只归属于起始所在的块。
+    """
+    key = tuple(keywords)
+    matcher = _matcher_cache.get(key)
+    if matcher is None:
+        matcher = _matcher_cache[key] = KeywordMatcher(keywords)
+    stop = min(end + matcher.max_length - 1, len(data))
+    hits = []
+    for keyword, offset in matcher.iter_matches(data, start, stop):
+        if offset >= end:
+            break
+        hits.append((keyword, offset))
+    return hits
+
+
+def iter_keyword_hits(data, keywords: Iterable[Keyword]) -> Iterator[Tuple[Keyword, int]]:
+    """单遍扫描缓冲区，产出所有关键词的全部命中"""
+    return KeywordMatcher(keywords).iter_matches(data)
+
+
+def keyword_context(data, offset: int, length: int, radius: int = 32) -> bytes:
+    """取命中位置前后各 radius 字节作为上下文，起点不会越过文件开头"""
+    start = max(0, offset - radius)
+    return bytes(data[start:offset + length + radius])
@@ -0,0 +1,559 @@
+import math
+from collections import namedtuple
+from typing import Iterator, List, Optional
+
+import numpy as np
+
+# 记录步长的搜索范围和最少记录数
+MIN_STRIDE = 2
+MAX_STRIDE = 512
+MIN_RECORDS = 4
+# 小于该长度的区域不分析
+MIN_REGION = 64
+# 步长检测只取区域开头的这么多字节
+SAMPLE_BYTES = 128*1024
+# 推断字段类型时最多取的记录数
+MAX_ROWS = 4096
+# 查找数组起点时检查区域开头的记录数；确定数组主体时平滑的记录数
+HEAD_ROWS = 64
+CORE_WINDOW = 8
+# 查找数组终点时逐块累计证据的块大小，以及证据累计和比最大值低出多少后停止
+EVIDENCE_CHUNK = 1024*1024
+END_MARGIN = 200.0
+# 步长不超过该值时逐个比较记录起点的各个轮换；描述长度中每个字段的开销（位）
+PHASE_CANDIDATES = 64
+FIELD_OVERHEAD = 4
+# 候选起点的数组证据（对数似然比）相差不超过该值时取靠前的
+START_MARGIN = 3.0
+# 低于该置信度，或相等比例提升低于 MIN_CONTRAST 的步长不报告
+MIN_CONFIDENCE = 0.2
+MIN_CONTRAST = 0.1
+# 基本周期的整数倍处相等比例相对前后整数倍的提升超过 MULTIPLE_GAIN，且各列相等比例
+# 错开基本周期后的平均差异超过 MULTIPLE_DIFFERENCE（及统计误差）时，以整数倍为记录步长
+MULTIPLE_GAIN = 0.03
+MULTIPLE_DIFFERENCE = 0.01
+# 自相关峰值与谐波比较时的容差：约数处的得分不低于峰值的该比例时取约数
+HARMONIC_RATIO = 0.8
+# 区域未按段给出时，逐块检测的块大小
+BLOCK_SIZE = 64*1024
+
+# 记录中的一个字段
+#   offset : 字段在记录内的偏移
+#   size   : 字节数
+#   type   : int8/uint8/int16/.../float32/float64，'char' 文本，'const' 常量，'padding' 全零
+#   endian : '<' 或 '>'，单字节、文本和常量为 ''
+#   min/max: 数值字段的取值范围；常量为其十六进制内容；文本为 None
+LayoutField = namedtuple('LayoutField', ['offset', 'size', 'type', 'endian', 'min', 'max'])
+
+# 检测到的数组：起始偏移、记录步长、记录数、置信度 (0~1)、字段列表
+RecordLayout = namedtuple('RecordLayout', ['start', 'stride', 'count', 'confidence', 'fields'])
+
+ENDIAN_NAMES = {'<': '小端', '>': '大端', '': ''}
+
+
+def _autocorrelation(sample: np.ndarray, max_lag: int) -> Optional[np.ndarray]:
+    """用 FFT 计算 0..max_lag 的归一化自相关
+
+    分别对字节值、是否为零、是否可打印三个特征求自相关后取平均，
+    数值字段和文本/填充的周期都能体现出来。三个特征一起做单精度变换；
+    样本略长于 2 的幂时截掉尾部，变换长度不必翻倍。内容完全不变时返回 None。
+    """
+    n = len(sample)
+    size = 1 << (n + max_lag).bit_length()
+    if size // 2 - max_lag - 1 >= n * 3 // 4:
+        size //= 2
+        n = size - max_lag - 1
+        sample = sample[:n]
+    signals = np.stack((sample, sample == 0, (sample >= 0x20) & (sample <= 0x7e))).astype(np.float32)
+    signals -= signals.mean(axis=1, keepdims=True)
+    variances = np.einsum('ij,ij->i', signals, signals)
+    signals = signals[variances > 0]
+    if not len(signals):
+        return None
+    spectrum = np.fft.rfft(signals, size, axis=1)
+    correlation = np.fft.irfft(spectrum * np.conj(spectrum), size, axis=1)[:, :max_lag + 1]
+    # 按重叠长度校正，长延迟的得分不会被压低
+    lags = np.arange(max_lag + 1)
+    scores = correlation / variances[variances > 0, None] * n / (n - lags)
+    return scores.mean(axis=0).astype(np.float64)
+
+
+def _match_rate(sample: np.ndarray, lag: int) -> float:
+    """相隔 lag 字节的两个字节相等的比例"""
+    return float(np.count_nonzero(sample[:-lag] == sample[lag:])) / (len(sample) - lag)
+
+
+def _stride_confidence(sample: np.ndarray, stride: int) -> float:
+    """步长处的相等比例相对相邻延迟的提升，0 表示没有周期性"""
+    matched = _match_rate(sample, stride)
+    baseline = max(_match_rate(sample, stride - 1), _match_rate(sample, stride + 1))
+    if baseline >= 1:
+        return 0.0
+    return max(0.0, (matched - baseline) / (1 - baseline))
+
+
+def _is_record_multiple(sample: np.ndarray, multiple: int, base: int) -> bool:
+    """基本周期 base 的整数倍 multiple 是否才是记录步长
+
+    首先 multiple 处的相等比例要明显高于前后两个整数倍。其次统计相隔
+    multiple 字节相等的比例在记录内各列的分布：只有 base 的周期时（如
+    uint16 计数器，低字节相隔 512 字节重复），该分布本身也以 base 为周期；
+    记录中有不随 base 重复的字段时，错开 base 列后的平均差异明显超过统计误差。
+    """
+    rows = (len(sample) - multiple - base) // multiple
+    if rows < MIN_RECORDS:
+        return False
+    baseline = max(_match_rate(sample, multiple - base), _match_rate(sample, multiple + base))
+    if baseline >= 1 or (_match_rate(sample, multiple) - baseline) / (1 - baseline) <= MULTIPLE_GAIN:
+        return False
+    count = rows * multiple
+    rates = (sample[:count] == sample[multiple:multiple + count]).reshape(rows, multiple).mean(axis=0)
+    difference = float(np.abs(rates - np.roll(rates, base)).mean())
+    noise = float(np.sqrt(rates * (1 - rates) / rows).mean())
+    return difference > max(MULTIPLE_DIFFERENCE, 3 * noise)
+
+
+def detect_stride(sample: np.ndarray, max_stride: int = MAX_STRIDE):
+    """检测记录步长，返回 (步长, 置信度)，没有明显周期时返回 None
+
+    自相关的局部峰值作为候选；约数处得分接近峰值时取约数（峰值是
+    步长的谐波）；基本周期的整数倍处有不随基本周期重复的字段时，
+    基本周期只是记录内重复的字段，取该整数倍。
+    置信度取两项的平均：相隔步长的字节相等比例相对相邻延迟的提升，
+    以及步长处自相关相对其他非（基本周期）整数倍延迟最高值的突出程度。
+    """
+    max_stride = min(max_stride, len(sample) // MIN_RECORDS)
+    if max_stride <= MIN_STRIDE:
+        return None
+    scores = _autocorrelation(sample, max_stride + 1)
+    if scores is None:
+        return None
+    lags = np.arange(MIN_STRIDE, max_stride + 1)
+    peaks = lags[(scores[lags] > scores[lags - 1]) & (scores[lags] >= scores[lags + 1]) & (scores[lags] > 0)]
+    if not len(peaks):
+        return None
+    best = int(peaks[np.argmax(scores[peaks])])
+    stride = best
+    for lag in peaks.tolist():
+        if lag < best and best % lag == 0 and scores[lag] >= HARMONIC_RATIO * scores[best]:
+            stride = lag
+            break
+
+    # 基本周期可能只是记录内重复的字段：依次取确有不随当前周期重复的字段的整数倍
+    base = stride
+    multiple = 2 * stride
+    while multiple <= max_stride:
+        if multiple in peaks and _is_record_multiple(sample, multiple, stride):
+            stride = multiple
+        multiple += stride
+    contrast = _stride_confidence(sample, stride)
+
+    others = scores[lags[(lags % base != 0) & (lags < 2 * stride + MIN_STRIDE)]]
+    background = max(float(others.max()), 0.0) if len(others) else 0.0
+    prominence = max(0.0, (float(scores[stride]) - background) / (1 - background)) if background < 1 else 0.0
+    confidence = (contrast + min(prominence, 1.0)) / 2
+    if contrast < MIN_CONTRAST or confidence < MIN_CONFIDENCE:
+        return None
+    return stride, confidence
+
+
+def _bits(low, high) -> float:
+    """表示取值范围需要的位数"""
+    return math.log2(float(high) - float(low) + 1)
+
+
+def _integer_choice(rows: np.ndarray, offset: int, size: int):
+    """在 offset 处按 size 字节整数解释，返回 (位数, 类型, 字节序, 最小值, 最大值) 中位数最少的一种"""
+    block = np.ascontiguousarray(rows[:, offset:offset + size])
+    best = None
+    endians = ('<', '>') if size > 1 else ('',)
+    for endian in endians:
+        for signed in (False, True):
+            code = f"{'i' if signed else 'u'}{size}"
+            values = block.view(np.dtype(endian + code) if endian else np.dtype(code)).ravel()
+            low, high = int(values.min()), int(values.max())
+            choice = (_bits(low, high), f"{'int' if signed else 'uint'}{size * 8}", endian, low, high)
+            if best is None or choice[0] < best[0]:
+                best = choice
+    return best
+
+
+def _float_choice(rows: np.ndarray, offset: int, size: int):
+    """offset 处的值按某种字节序解释为浮点数时是否合理，合理时返回 (类型, 字节序, 最小值, 最大值)"""
+    block = np.ascontiguousarray(rows[:, offset:offset + size])
+    for endian in ('<', '>'):
+        values = block.view(np.dtype(f'{endian}f{size}')).ravel()
+        if not np.isfinite(values).all():
+            continue
+        values = values.astype(np.float64)
+        magnitude = np.abs(values)
+        plausible = (magnitude == 0) | ((magnitude >= 1e-4) & (magnitude <= 1e7))
+        # 全是零或全是整数的列按整数处理
+        if plausible.all() and np.count_nonzero(values) and not np.all(values == np.round(values)):
+            return f'float{size * 8}', endian, float(values.min()), float(values.max())
+    return None
+
+
+def infer_fields(rows: np.ndarray) -> List[LayoutField]:
+    """根据若干条记录 (记录数 × 步长 的 uint8 矩阵) 推断各字段的类型和取值范围
+
+    连续 4 列以上的可打印列为文本；按 8/4/2 字节对齐处依次尝试浮点、
+    整数和拆成更窄的字段，取表示取值范围所需位数最少的解释（紧凑排列
+    的结构中 8 字节浮点常只按 4 字节对齐，也一并尝试）；每条记录都相同
+    的列合并为常量。
+    """
+    return _infer_fields(_ColumnStats(rows), 0, rows.shape[1])
+
+
+class _ColumnStats:
+    """记录矩阵的逐列统计，以及按 (偏移, 字节数) 缓存的整数/浮点解释
+
+    比较同一批记录的各个轮换时共用：传入相邻两条记录拼接成的矩阵，
+    从第 phase 列起取一个步长即为该轮换下的记录。
+    """
+
+    def __init__(self, rows: np.ndarray):
+        self.rows = rows
+        self.constant = rows.min(axis=0) == rows.max(axis=0)
+        printable = (rows >= 0x20) & (rows <= 0x7e)
+        self.textual = (printable | (rows == 0)).mean(axis=0) >= 0.95
+        self.has_text = printable.any(axis=0)
+        self._integers = {}
+        self._floats = {}
+
+    def integer(self, offset: int, size: int):
+        key = (offset, size)
+        if key not in self._integers:
+            self._integers[key] = _integer_choice(self.rows, offset, size)
+        return self._integers[key]
+
+    def float(self, offset: int, size: int):
+        key = (offset, size)
+        if key not in self._floats:
+            self._floats[key] = _float_choice(self.rows, offset, size)
+        return self._floats[key]
+
+
+def _infer_fields(stats: _ColumnStats, phase: int, stride: int) -> List[LayoutField]:
+    """按从 phase 列起的一个步长推断字段，字段偏移相对于 phase"""
+    constant, textual, has_text = stats.constant, stats.textual, stats.has_text
+    fields: List[LayoutField] = []
+
+    def add_constant(offset, size):
+        if fields and fields[-1].type in ('const', 'padding') and fields[-1].offset + fields[-1].size == offset:
+            offset, size = fields[-1].offset, fields[-1].size + size
+            fields.pop()
+        value = stats.rows[0, phase + offset:phase + offset + size].tobytes()
+        kind = 'padding' if not any(value) else 'const'
+        fields.append(LayoutField(offset, size, kind, '', value.hex(' '), value.hex(' ')))
+
+    i = 0
+    while i < stride:
+        column = phase + i
+        # 文本：至少 4 列可打印且不全是常量，之后的零填充列一并计入
+        j = column
+        while j < phase + stride and textual[j] and (has_text[j] or j > column):
+            j += 1
+        if j - column >= 4 and has_text[column:j].sum() >= 4 and not constant[column:j].all():
+            fields.append(LayoutField(i, j - column, 'char', '', None, None))
+            i = j - phase
+            continue
+
+        chosen = None
+        for size in (8, 4, 2):
+            if i % min(size, 4) or i + size > stride:
+                continue
+            if constant[column:column + size].all():
+                chosen = ('const', size)
+                break
+            choice = stats.float(column, size) if size >= 4 else None
+            if choice:
+                chosen = (choice, size)
+                break
+            if size == 8:
+                continue
+            whole = stats.integer(column, size)
+            half = size // 2
+            parts = [stats.integer(column, half), stats.integer(column + half, half)]
+            # 整体解释不比拆成两半多用 1 位以上时取整体
+            if whole[0] <= sum(part[0] for part in parts) + 1:
+                chosen = (whole[1:], size)
+                break
+        if chosen is None:
+            size = 1
+            chosen = ('const', 1) if constant[column] else (stats.integer(column, 1)[1:], 1)
+
+        kind, size = chosen
+        if kind == 'const':
+            add_constant(i, size)
+        else:
+            type_name, endian, low, high = kind
+            fields.append(LayoutField(i, size, type_name, endian, low, high))
+        i += size
+    return fields
+
+
+def _count_prefix(data, start: int, end: int, stride: int) -> int:
+    """区域开头是否为记录数（2 或 4 字节，任一字节序），是则返回其长度，否则返回 0"""
+    for size in (4, 2):
+        if end - start < size:
+            continue
+        head = bytes(data[start:start + size])
+        fits = (end - start - size) // stride
+        for order in ('little', 'big'):
+            count = int.from_bytes(head, order)
+            if MIN_RECORDS <= count and (count == fits or count * stride == end - start - size):
+                return size
+    return 0
+
+
+def _lag_match(values: np.ndarray, total: int, stride: int, lag: int) -> np.ndarray:
+    """每条记录内字节与相隔 lag 的字节相等的比例，超出样本的位置按不相等计"""
+    count = (total - 1) * stride
+    matched = np.zeros(count, dtype=bool)
+    matched[:min(count, len(values) - lag)] = values[:count][:len(values) - lag] == values[lag:lag + count]
+    return matched.reshape(total - 1, stride).mean(axis=1)
+
+
+def _array_core(data, frame: int, total: int, stride: int) -> slice:
+    """样本中以该步长为周期最明显的一段连续记录，返回记录序号的切片
+
+    每条记录与下一条记录逐字节相等的比例，减去错开一个字节、以及按
+    步长的各个“除以一个质因数”的间隔比较时的最大比例（周期为步长
+    因数的内容，如 uint32 数组，在这些间隔上同样相等），按 CORE_WINDOW
+    条记录平滑；取包含最大值、且不低于最大值一半的连续区间。区域中混有
+    其他内容时，只用这一段统计各列的相等比例。
+    """
+    if total < 2 * CORE_WINDOW:
+        return slice(0, total)
+    values = np.frombuffer(data, dtype=np.uint8, count=total * stride, offset=frame)
+    lags = [stride + 1] + [stride // p for p in range(2, stride + 1)
+                           if stride % p == 0 and all(p % q for q in range(2, p))]
+    baseline = np.max([_lag_match(values, total, stride, lag) for lag in lags], axis=0)
+    matched = _lag_match(values, total, stride, stride)
+    contrast = np.convolve(matched - baseline, np.ones(CORE_WINDOW) / CORE_WINDOW, mode='same')
+    peak = int(np.argmax(contrast))
+    strong = contrast >= contrast[peak] / 2
+    first = peak
+    while first > 0 and strong[first - 1]:
+        first -= 1
+    last = peak
+    while last < len(strong) - 1 and strong[last + 1]:
+        last += 1
+    return slice(first, last + 2)
+
+
+def _column_match_rates(rows: np.ndarray) -> np.ndarray:
+    """每列与下一条记录同列相等的比例（平滑后限制在 0.01~0.99）"""
+    matched = np.count_nonzero(rows[1:] == rows[:-1], axis=0)
+    return np.clip((matched + 1) / (len(rows) + 1), 0.01, 0.99)
+
+
+def _evidence(data, rates: np.ndarray, frame: int, start: int, end: int, freq: np.ndarray) -> np.ndarray:
+    """[start, end) 内每个字节属于数组相对属于其他内容的对数似然比
+
+    观测是与相隔一个步长的字节是否相等。属于数组时相等的概率为所在列
+    的相等比例；属于其他内容时按该字节值的出现频率估计，这样连续的零
+    填充不会因处处相等而被当成数组。调用方保证 end + 步长不超过区域结尾。
+    """
+    stride = len(rates)
+    values = np.frombuffer(data, dtype=np.uint8, count=end - start + stride, offset=start)
+    matched = values[:-stride] == values[stride:]
+    column_rates = rates[(np.arange(start, end) - frame) % stride]
+    other = freq[values[:-stride]]
+    return np.where(matched, np.log(column_rates / other), np.log((1 - column_rates) / (1 - other)))
+
+
+def _evidence_end(data, rates: np.ndarray, frame: int, start: int, end: int, freq: np.ndarray) -> int:
+    """数组证据结束的位置：从 start 起证据累计和最大处
+
+    逐块累计，累计和比最大值低出 END_MARGIN 后数组显然已经结束，不再往后读。
+    """
+    stride = len(rates)
+    running = best = 0.0
+    last = start - 1
+    for chunk_start in range(start, end - stride, EVIDENCE_CHUNK):
+        chunk_end = min(chunk_start + EVIDENCE_CHUNK, end - stride)
+        gain = running + np.cumsum(_evidence(data, rates, frame, chunk_start, chunk_end, freq))
+        peak = int(np.argmax(gain))
+        if gain[peak] > best:
+            best, last = float(gain[peak]), chunk_start + peak
+        running = float(gain[-1])
+        if running < best - END_MARGIN:
+            break
+    return last
+
+
+def _field_cost(varying: np.ndarray, fields: List[LayoutField]) -> float:
+    """字段解释的描述长度（位），每个字段另计开销：错位的起点会把字段切开或拼在一起
+
+    varying 为记录各列取值是否会变。文本只计会变的列，文本后的零填充
+    挪到记录开头时不因此变得更便宜。
+    """
+    cost = 0.0
+    for field in fields:
+        cost += FIELD_OVERHEAD
+        if field.type == 'char':
+            cost += 2 * np.count_nonzero(varying[field.offset:field.offset + field.size])
+        elif field.type.startswith('float'):
+            cost += 5 * field.size
+        elif field.type not in ('const', 'padding'):
+            cost += _bits(field.min, field.max)
+    return cost
+
+
+def _array_extent(data, start: int, end: int, stride: int, sample_size: int):
+    """确定数组的第一条记录和记录数，返回 (起始偏移, 记录数)
+
+    步长只确定记录的周期，记录从哪一列开始用各个轮换的字段解释描述长度
+    判断（错位会把字段切开）。用周期最明显的一段记录统计每列与下一条
+    记录相等的比例，把开头和结尾各一段字节的“与相隔一个步长的字节相等”
+    看作观测，按似然比确定第一条记录和数组证据结束的位置（段头、尾部
+    填充及数组之后的其他内容，相等比例与数组不同）。区域开头是记录数时
+    直接从其后开始。
+    """
+    prefix = _count_prefix(data, start, end, stride)
+    total = (sample_size - prefix) // stride
+    if total < MIN_RECORDS:
+        return start + prefix, 0
+    frame = start + prefix
+    rows = np.frombuffer(data, dtype=np.uint8, count=total * stride, offset=frame).reshape(total, stride)
+    core = _array_core(data, frame, total, stride)
+    rates = _column_match_rates(rows[core][:MAX_ROWS])
+    sample = np.frombuffer(data, dtype=np.uint8, count=sample_size, offset=start)
+    freq = np.clip(np.bincount(sample, minlength=256) / sample_size, 0.01, 0.99)
+
+    # 先找数组证据结束处，比较起点时只用其前的记录；从周期最明显的一段开始
+    # 累计，数组之前的其他内容不会让累计和提前跌落
+    core_start = frame + core.start * stride
+    last = _evidence_end(data, rates, frame, core_start, end, freq)
+
+    array_start = frame
+    if not prefix:
+        # 记录从哪一列开始：用周期最明显的一段记录比较各个轮换，取字段解释描述长度最短的
+        rows_count = min((min(last + stride, end) - core_start) // stride - 2, MAX_ROWS // 16)
+        costs = {}
+        if rows_count >= MIN_RECORDS:
+            sample_rows = np.frombuffer(data, dtype=np.uint8, count=(rows_count + 1) * stride,
+                                        offset=core_start).reshape(rows_count + 1, stride)
+            # 相邻两条记录拼接，各个轮换共用逐列统计和字段解释
+            stats = _ColumnStats(np.concatenate((sample_rows[:-1], sample_rows[1:]), axis=1))
+
+            def cost(phase):
+                return _field_cost(~stats.constant[phase:phase + stride], _infer_fields(stats, phase, stride))
+
+            if stride <= PHASE_CANDIDATES:
+                for phase in range(stride):
+                    costs[phase] = cost(phase)
+            else:
+                # 步长较大时逐个比较太慢：先按 4 字节对齐方式选定余数，该解释下的
+                # 字段起点都作为候选（轮换到字段起点的描述长度基本相同）
+                residue = min(range(4), key=cost)
+                for field in _infer_fields(stats, residue, stride):
+                    costs[(residue + field.offset) % stride] = 0.0
+        best_cost = min(costs.values(), default=0.0)
+        tied = [phase for phase, value in costs.items() if value <= best_cost + 1] or [0]
+
+        # 第一条记录：描述长度相同的轮换（如字段整体挪到记录末尾）在中部无法区分，
+        # 取其后数组证据之和最大的位置，段头不会被当成记录
+        head_end = min(start + HEAD_ROWS * stride, end - stride)
+        if head_end > start:
+            evidence = _evidence(data, rates, frame, start, head_end, freq)
+            gain = np.cumsum(evidence[::-1])[::-1]
+            found = []
+            for phase in tied:
+                positions = np.arange((frame + phase - start) % stride, head_end - start, stride)
+                if len(positions):
+                    position = int(positions[np.argmax(gain[positions])])
+                    found.append((position, gain[position]))
+            if found:
+                # 相差不大时取靠前的：记录开头的几个字节本身提供的证据很少
+                best_gain = max(value for _, value in found)
+                array_start = start + min(position for position, value in found
+                                          if value >= best_gain - START_MARGIN)
+
+    # 证据来自记录与下一条记录的比较：最后的证据所在记录及其下一条都属于数组
+    count = max(min((last - array_start) // stride + 2, (end - array_start) // stride), 0)
+    # 结尾整条为零的记录按填充处理
+    while count > MIN_RECORDS and not any(data[array_start + (count - 1) * stride:array_start + count * stride]):
+        count -= 1
+    return array_start, count
+
+
+def detect_layout(data, start: int = 0, end: int = None, max_stride: int = MAX_STRIDE) -> Optional[RecordLayout]:
+    """检测 [start, end) 内的重复记录数组，返回 RecordLayout，没有时返回 None"""
+    if end is None:
+        end = len(data)
+    end = min(end, len(data))
+    if end - start < MIN_REGION:
+        return None
+    sample = np.frombuffer(data, dtype=np.uint8, count=min(end - start, SAMPLE_BYTES), offset=start)
+    found = detect_stride(sample, max_stride)
+    if found is None:
+        return None
+    stride, confidence = found
+
+    array_start, count = _array_extent(data, start, end, stride, len(sample))
+    if count < MIN_RECORDS:
+        return None
+    rows = np.frombuffer(data, dtype=np.uint8, count=count * stride, offset=array_start).reshape(count, stride)
+    if count > MAX_ROWS:
+        rows = rows[np.linspace(0, count - 1, MAX_ROWS).astype(np.intp)]
+    fields = infer_fields(rows)
+    if all(field.type in ('const', 'padding') for field in fields):
+        return None
+    return RecordLayout(array_start, stride, count, round(confidence, 3), fields)
+
+
+def iter_block_layouts(data, start: int = 0, end: int = None, block_size: int = BLOCK_SIZE) -> Iterator[RecordLayout]:
+    """没有段表时按块检测，相邻且步长相同的块合并为一个数组"""
+    if end is None:
+        end = len(data)
+    current = None
+    for block_start in range(start, end, block_size):
+        block_end = min(block_start + block_size, end)
+        layout = detect_layout(data, block_start, block_end)
+        if layout is None:
+            if current is not None:
+                yield current
+                current = None
+            continue
+        if (current is not None and current.stride == layout.stride
+                and layout.start - (current.start + current.count * current.stride) < layout.stride * 2):
+            count = (layout.start + layout.count * layout.stride - current.start) // current.stride
+            current = current._replace(count=count, confidence=min(current.confidence, layout.confidence))
+            continue
+        if current is not None:
+            yield current
+        current = layout
+    if current is not None:
+        yield current
+
+
+def format_field(field: LayoutField) -> str:
+    if field.type == 'char':
+        return f"+0x{field.offset:02X}  char[{field.size}]  文本"
+    if field.type in ('const', 'padding'):
+        note = '零填充' if field.type == 'padding' else f"常量 {field.min}"
+        return f"+0x{field.offset:02X}  byte[{field.size}]  {note}"
+    endian = f" {ENDIAN_NAMES[field.endian]}" if field.endian else ''
+    if field.type.startswith('float'):
+        return f"+0x{field.offset:02X}  {field.type}{endian}  [{field.min:g}, {field.max:g}]"
+    return f"+0x{field.offset:02X}  {field.type}{endian}  [{field.min}, {field.max}]"
+
+
+def format_layout(layout: RecordLayout, indent: str = '  ') -> str:
+    lines = [f"0x{layout.start:08X}: {layout.count} 条记录 × {layout.stride} 字节，置信度 {layout.confidence:.2f}"]
+    lines += [indent + format_field(field) for field in layout.fields]
+    return '\n'.join(lines)
+
+
+def layout_to_dict(layout: RecordLayout) -> dict:
+    """转换为 JSON 记录"""
+    return {
+        'start': layout.start,
+        'stride': layout.stride,
+        'count': layout.count,
+        'confidence': layout.confidence,
+        'fields': [field._asdict() for field in layout.fields]
+    }
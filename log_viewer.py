@@ -1,122 +1,358 @@
 import tkinter as tk
-from tkinter import ttk, scrolledtext
+from tkinter import ttk, scrolledtext, filedialog
 import sys
 import io
-from datetime import datetime
+import itertools
+import threading
+import time
+from collections import deque, namedtuple
+
+# 日志级别
+LOG_LEVELS = {
+    'DEBUG': 0,
+    'INFO': 1,
+    'WARNING': 2,
+    'ERROR': 3,
+    'CRITICAL': 4
+}
+LEVEL_NAMES = {number: name for name, number in LOG_LEVELS.items()}
+
+# 一条日志：序号、时间戳、级别（数字）、原始消息、显示文本、用于搜索的小写消息
+LogRecord = namedtuple('LogRecord', ['seq', 'created', 'level', 'message', 'line', 'lower'])
+
+# 消息中出现这些词时推断为对应级别
+ERROR_WORDS = ('失败', '错误', 'error', 'exception', 'traceback')
+WARNING_WORDS = ('警告', 'warning', '无法', '不完整')
+DEBUG_PREFIXES = ('[度量]',)
+
+
+def infer_level(message: str, stream: str = 'stdout') -> int:
+    """根据消息内容和来源推断级别：print 输出默认为 INFO，标准错误至少为 WARNING
+
+    度量输出（StreamSink 写到标准错误）先按前缀识别为 DEBUG，其中失败操作的
+    错误说明不会把它提升为 ERROR。
+    """
+    if message.startswith(DEBUG_PREFIXES):
+        return LOG_LEVELS['DEBUG']
+    lower = message.lower()
+    if any(word in lower for word in ERROR_WORDS):
+        return LOG_LEVELS['ERROR']
+    if stream == 'stderr' or any(word in lower for word in WARNING_WORDS):
+        return LOG_LEVELS['WARNING']
+    return LOG_LEVELS['INFO']
+
+
+class LogSink:
+    """线程安全的日志接收端
+
+    write() 只把完整的行转换为 LogRecord 追加到待处理队列，不接触
+    界面；不完整的行按线程分别缓存，避免多个线程的输出交错在一行里。
+    待处理队列有上限，界面来不及处理时丢弃最旧的记录。
+    """
+
+    def __init__(self, capacity: int):
+        self.pending = deque(maxlen=capacity)
+        self._partial = {}
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def write(self, text: str, stream: str = 'stdout'):
+        if not text:
+            return
+        key = (threading.get_ident(), stream)
+        with self._lock:
+            text = self._partial.pop(key, '') + text
+            lines = text.split('\n')
+            if lines[-1]:
+                self._partial[key] = lines[-1]
+            for message in lines[:-1]:
+                self._add(message.rstrip('\r'), stream)
+
+    def log(self, level: str, message: str):
+        """直接写入一条指定级别的记录"""
+        with self._lock:
+            for line in message.split('\n'):
+                self._add(line, level=LOG_LEVELS[level])
+
+    def _add(self, message: str, stream: str = 'stdout', level: int = None):
+        if level is None:
+            if not message.strip():
+                # print 产生的空行没有信息量
+                return
+            level = infer_level(message, stream)
+        self._seq += 1
+        created = time.time()
+        stamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(created))
+        line = f"[{stamp}] {LEVEL_NAMES[level]:<7} {message}"
+        self.pending.append(LogRecord(self._seq, created, level, message, line, message.lower()))
+
+    def drain(self, limit: int):
+        """取出最多 limit 条待处理记录"""
+        records = []
+        pending = self.pending
+        while pending and len(records) < limit:
+            records.append(pending.popleft())
+        return records
+
+
+class StreamRedirector(io.TextIOBase):
+    """替换 sys.stdout / sys.stderr，把输出交给 LogSink"""
+
+    def __init__(self, sink: LogSink, stream: str):
+        super().__init__()
+        self.sink = sink
+        self.stream = stream
+
+    def writable(self):
+        return True
+
+    def write(self, message):
+        self.sink.write(message, self.stream)
+        return len(message)
+
 
 class LogViewer:
-    """日志查看器"""
-    
+    """日志查看器
+
+    输出先进入 LogSink 的队列，由定时器在主线程中分批取出：每批只做
+    一次插入、一次状态切换和一次滚动。记录保存在有上限的环形缓冲区中，
+    过滤和搜索都在内存中的记录上进行，再一次性重绘文本框。
+    """
+
+    # 环形缓冲区保留的记录数、文本框最多显示的行数
+    MAX_RECORDS = 100000
+    MAX_DISPLAY_LINES = 10000
+    # 刷新间隔（毫秒）和每次刷新最多处理的记录数
+    FLUSH_INTERVAL = 100
+    MAX_BATCH = 5000
+    # 输入搜索词后等待的时间（毫秒），连续输入只过滤一次
+    FILTER_DELAY = 200
+    LEVEL_COLORS = {
+        'DEBUG': '#808080',
+        'WARNING': '#c77700',
+        'ERROR': '#d32f2f',
+        'CRITICAL': '#b71c1c'
+    }
+
     def __init__(self, root):
         self.root = root
         self.root.title("日志查看器")
         self.root.geometry("800x600")
-        
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
+
         # 初始化日志级别
-        self.log_levels = {
-            'DEBUG': 0,
-            'INFO': 1,
-            'WARNING': 2,
-            'ERROR': 3,
-            'CRITICAL': 4
-        }
-        
+        self.log_levels = LOG_LEVELS
+        self.records = deque(maxlen=self.MAX_RECORDS)
+        self.sink = LogSink(self.MAX_RECORDS)
+        self.displayed = 0
+        # 环形缓冲区中符合当前过滤条件的记录数，增量维护
+        self.matched_count = 0
+        self.min_level = LOG_LEVELS['INFO']
+        self.search_text = ''
+        self._flush_job = None
+        self._filter_job = None
+        self._closed = False
+
         # 创建界面
         self.create_widgets()
-        
+
         # 重定向标准输出
         self.redirect_output()
-        
+        self._flush_job = self.root.after(self.FLUSH_INTERVAL, self.flush)
+
     def create_widgets(self):
         """创建界面组件"""
         # 工具栏
         toolbar = tk.Frame(self.root, bd=1, relief=tk.RAISED)
         toolbar.pack(side=tk.TOP, fill=tk.X)
-        
+
         # 日志级别过滤
         tk.Label(toolbar, text="日志级别:").pack(side=tk.LEFT, padx=5)
         self.level_var = tk.StringVar(value='INFO')
         self.level_menu = ttk.Combobox(toolbar, textvariable=self.level_var,
-                                     values=list(self.log_levels.keys()))
+                                     values=list(self.log_levels.keys()), state='readonly', width=10)
         self.level_menu.pack(side=tk.LEFT, padx=5)
         self.level_menu.bind('<<ComboboxSelected>>', self.filter_logs)
-        
+
         # 搜索框
         tk.Label(toolbar, text="搜索:").pack(side=tk.LEFT, padx=5)
         self.search_entry = tk.Entry(toolbar)
         self.search_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
-        self.search_entry.bind('<KeyRelease>', self.filter_logs)
-        
-        # 导出按钮
+        self.search_entry.bind('<KeyRelease>', self.schedule_filter)
+
+        # 导出、清空按钮和自动滚动开关
         export_btn = tk.Button(toolbar, text="导出日志", command=self.export_logs)
         export_btn.pack(side=tk.RIGHT, padx=5)
-        
+        clear_btn = tk.Button(toolbar, text="清空", command=self.clear_logs)
+        clear_btn.pack(side=tk.RIGHT)
+        self.autoscroll_var = tk.BooleanVar(value=True)
+        tk.Checkbutton(toolbar, text="自动滚动", variable=self.autoscroll_var).pack(side=tk.RIGHT, padx=5)
+
         # 日志显示区域
         self.log_text = scrolledtext.ScrolledText(self.root, wrap=tk.WORD)
         self.log_text.pack(fill=tk.BOTH, expand=True)
+        for level, color in self.LEVEL_COLORS.items():
+            self.log_text.tag_config(level, foreground=color)
+        self.log_text.tag_config('highlight', background='yellow')
         self.log_text.configure(state='disabled')
-        
+
+        # 记录数统计
+        self.count_var = tk.StringVar()
+        tk.Label(self.root, textvariable=self.count_var, anchor=tk.W).pack(side=tk.BOTTOM, fill=tk.X)
+
     def redirect_output(self):
-        """重定向标准输出"""
-        class StdoutRedirector(io.StringIO):
-            def __init__(self, log_viewer):
-                super().__init__()
-                self.log_viewer = log_viewer
-                
-            def write(self, message):
-                self.log_viewer.append_log(message)
-                
-        sys.stdout = StdoutRedirector(self)
-        sys.stderr = StdoutRedirector(self)
-        
-    def append_log(self, message):
-        """添加日志"""
+        """重定向标准输出和标准错误到日志队列"""
+        self._stdout, self._stderr = sys.stdout, sys.stderr
+        sys.stdout = StreamRedirector(self.sink, 'stdout')
+        sys.stderr = StreamRedirector(self.sink, 'stderr')
+
+    def append_log(self, message, level=None):
+        """添加日志（可在任意线程调用），由定时刷新显示"""
+        if level is None:
+            self.sink.write(message)
+        else:
+            self.sink.log(level, message.rstrip('\n'))
+
+    def matches(self, record):
+        return record.level >= self.min_level and (not self.search_text or self.search_text in record.lower)
+
+    def flush(self):
+        """定时器回调：把队列中的记录存入环形缓冲区，匹配的部分一次性追加到文本框"""
+        self._flush_job = None
+        if self._closed:
+            return
+        batch = self.sink.drain(self.MAX_BATCH)
+        if batch:
+            overflow = len(self.records) + len(batch) - self.MAX_RECORDS
+            if overflow > 0:
+                # 即将被挤出环形缓冲区的旧记录
+                evicted = itertools.islice(self.records, min(overflow, len(self.records)))
+                self.matched_count -= sum(1 for record in evicted if self.matches(record))
+            self.records.extend(batch)
+            matched = [record for record in batch if self.matches(record)]
+            self.matched_count += len(matched)
+            self.append_records(matched)
+            self.update_count()
+        # 还有积压时立即继续，否则按间隔轮询
+        self._flush_job = self.root.after(1 if self.sink.pending else self.FLUSH_INTERVAL, self.flush)
+
+    def append_records(self, records, replace=False):
+        """把记录插入文本框：按级别分段着色，单次 insert，并高亮搜索词"""
+        if not records and not replace:
+            return
+        records = records[-self.MAX_DISPLAY_LINES:]
         self.log_text.configure(state='normal')
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        log_entry = f"[{timestamp}] {message}"
-        self.log_text.insert(tk.END, log_entry)
+        if replace:
+            self.log_text.delete('1.0', tk.END)
+            self.displayed = 0
+        first_line = self.displayed + 1
+
+        # insert(index, 文本1, 标签1, 文本2, 标签2, ...)，相邻同级别的行合并为一段
+        args = []
+        run, run_level = [], None
+        for record in records:
+            if record.level != run_level and run:
+                args.extend((''.join(run), self.level_tag(run_level)))
+                run = []
+            run_level = record.level
+            run.append(record.line + '\n')
+        if run:
+            args.extend((''.join(run), self.level_tag(run_level)))
+        if args:
+            self.log_text.insert(tk.END, *args)
+        self.displayed += len(records)
+
+        if self.search_text:
+            self.highlight(records, first_line)
+        # 超出显示上限时删除最旧的行
+        excess = self.displayed - self.MAX_DISPLAY_LINES
+        if excess > 0:
+            self.log_text.delete('1.0', f'{excess + 1}.0')
+            self.displayed -= excess
         self.log_text.configure(state='disabled')
-        self.log_text.see(tk.END)
-        
+        if self.autoscroll_var.get():
+            self.log_text.see(tk.END)
+
+    def level_tag(self, level):
+        name = LEVEL_NAMES[level]
+        return (name,) if name in self.LEVEL_COLORS else ()
+
+    def highlight(self, records, first_line):
+        """按内存中的文本计算搜索词位置，不在控件中搜索"""
+        needle = self.search_text
+        for line_number, record in enumerate(records, first_line):
+            prefix = len(record.line) - len(record.message)
+            start = record.lower.find(needle)
+            while start >= 0:
+                column = prefix + start
+                self.log_text.tag_add('highlight', f'{line_number}.{column}',
+                                      f'{line_number}.{column + len(needle)}')
+                start = record.lower.find(needle, start + len(needle))
+
+    def schedule_filter(self, event=None):
+        """搜索框输入后延迟过滤，连续按键只触发一次"""
+        if self._filter_job is not None:
+            self.root.after_cancel(self._filter_job)
+        self._filter_job = self.root.after(self.FILTER_DELAY, self.filter_logs)
+
     def filter_logs(self, event=None):
-        """过滤日志"""
-        search_text = self.search_entry.get().lower()
-        min_level = self.log_levels[self.level_var.get()]
-        
-        self.log_text.configure(state='normal')
-        self.log_text.tag_remove('highlight', '1.0', tk.END)
-        
-        for line in self.log_text.get('1.0', tk.END).split('\n'):
-            if search_text in line.lower():
-                start = self.log_text.search(line, '1.0', tk.END)
-                if start:
-                    end = f"{start}+{len(line)}c"
-                    self.log_text.tag_add('highlight', start, end)
-                    
-        self.log_text.tag_config('highlight', background='yellow')
-        self.log_text.configure(state='disabled')
-        
+        """按级别和搜索词过滤环形缓冲区中的记录并重绘"""
+        self._filter_job = None
+        self.search_text = self.search_entry.get().lower()
+        self.min_level = self.log_levels[self.level_var.get()]
+        matched = [record for record in self.records if self.matches(record)]
+        self.matched_count = len(matched)
+        self.append_records(matched, replace=True)
+        self.update_count()
+
+    def update_count(self):
+        text = f"共 {len(self.records)} 条，匹配 {self.matched_count} 条"
+        if self.matched_count > self.MAX_DISPLAY_LINES:
+            text += f"（显示最后 {self.MAX_DISPLAY_LINES} 条）"
+        self.count_var.set(text)
+
+    def clear_logs(self):
+        self.records.clear()
+        self.matched_count = 0
+        self.append_records([], replace=True)
+        self.update_count()
+
     def export_logs(self):
-        """导出日志"""
-        file_path = tk.filedialog.asksaveasfilename(
+        """导出全部日志（不受过滤影响）"""
+        file_path = filedialog.asksaveasfilename(
             defaultextension=".log",
             filetypes=[("Log files", "*.log"), ("Text files", "*.txt"), ("All files", "*.*")]
         )
         if file_path:
             try:
-                with open(file_path, 'w') as f:
-                    f.write(self.log_text.get('1.0', tk.END))
+                with open(file_path, 'w', encoding='utf-8') as f:
+                    f.writelines(record.line + '\n' for record in self.records)
                 self.append_log(f"日志已成功导出到 {file_path}\n")
             except Exception as e:
                 self.append_log(f"导出日志失败: {str(e)}\n")
-                
+
     def cleanup(self):
         """清理资源"""
-        sys.stdout = sys.__stdout__
-        sys.stderr = sys.__stderr__
+        self._closed = True
+        if self._flush_job is not None:
+            self.root.after_cancel(self._flush_job)
+            self._flush_job = None
+        if self._filter_job is not None:
+            self.root.after_cancel(self._filter_job)
+            self._filter_job = None
+        # 只在输出仍指向本窗口时恢复
+        if isinstance(sys.stdout, StreamRedirector) and sys.stdout.sink is self.sink:
+            sys.stdout = self._stdout
+        if isinstance(sys.stderr, StreamRedirector) and sys.stderr.sink is self.sink:
+            sys.stderr = self._stderr
+
+    def close(self):
+        """关闭窗口时恢复标准输出"""
+        self.cleanup()
+        self.root.destroy()
 
 if __name__ == "__main__":
     root = tk.Tk()
     log_viewer = LogViewer(root)
     root.mainloop()
-    log_viewer.cleanup()
\ No newline at end of file
+    log_viewer.cleanup()
@@ -1,14 +1,65 @@
+import bisect
+import json
+import os
+import queue
 import tkinter as tk
+import tkinter.font as tkfont
+from concurrent.futures import CancelledError
 from tkinter import ttk, filedialog, scrolledtext, messagebox
-from file_handler import FileHandler
+from file_handler import FileHandler, HEX_PREVIEW_BYTES
 from dat_modifier import DatModifier
+from binary_diff import FileView, format_range, iter_diff, summarize_diff
 from dat_parser import DatParser
+from encoded_strings import (DEFAULT_MIN_LENGTHS, ENCODINGS, concat_runs, decode_run, encodings_cache_kind,
+                             parse_encodings, runs_from_arrays, runs_to_arrays)
+from entropy_map import REGION_KINDS, REGION_NAMES, minimap_columns
+from file_carver import FileCarver, save_carved
 from data_analyzer import DataAnalyzer
 from data_extractor import DataExtractor
 from data_inspector import DataInspector
+from hex_view import HexView
+from instrumentation import event_to_dict, format_profile, instrumentation
+from keyword_search import KeywordMatcher, encode_keyword, keyword_context
+from layout_detector import detect_layout, format_layout, iter_block_layouts
 from log_viewer import LogViewer
+from pattern_search import compile_pattern
+from parallel_scan import ParallelScanner, merge_lists
+from string_scanner import hits_from_arrays, hits_to_arrays, string_cache_kind
+from structure_scanner import candidates_from_arrays, candidates_to_arrays, concat_candidates, structure_cache_kind
+from task_runner import TaskRunner, format_progress
+from value_scanner import ENDIANS, ValueScanner, format_hit, parse_condition, parse_types, parse_value, snapshot_file
 
 class DatAnalyzerApp:
+    # 每个关键词在结果区最多列出的偏移数
+    MAX_KEYWORD_OFFSETS = 50
+    # 十六进制视图使用等宽字体
+    HEX_FONT = ('Consolas', 10)
+    # 流式结果每批的行数和最多显示的行数
+    STREAM_BATCH_LINES = 500
+    MAX_STREAMED_LINES = 100000
+    # 后台扫描的分块大小，决定进度汇报和取消的粒度
+    SCAN_CHUNK_SIZE = 4*1024*1024
+    # 字符串、关键词和结构扫描共用的多进程扫描引擎的进程数
+    SCAN_WORKERS = os.cpu_count() or 1
+    # 熵图高度和各类区域的颜色
+    MINIMAP_HEIGHT = 18
+    REGION_COLORS = {
+        'zero': '#e8e8e8',
+        'text': '#4caf50',
+        'binary': '#2196f3',
+        'compressed': '#ff9800',
+        'encrypted': '#e53935'
+    }
+    # 性能面板保留的事件数、轮询间隔（毫秒）和可采样分析的操作
+    MAX_METRIC_ROWS = 500
+    METRIC_POLL_INTERVAL = 200
+    # 关键词标签页的搜索模式
+    SEARCH_MODES = {'关键词': 'keyword', '十六进制特征': 'hex', '正则表达式': 'regex'}
+    PROFILE_OPERATIONS = ('分析文件', '关键词搜索', '结构分析', '记录布局', '字符串提取', '内嵌文件', '熵分析', '文件对比', '数值扫描')
+    # 数值扫描的字节序选项和最多列出的候选数
+    VALUE_ENDIANS = {'大小端': ENDIANS, '小端': ('<',), '大端': ('>',)}
+    MAX_VALUE_HITS = 1000
+
     def __init__(self, root):
         self.root = root
         self.root.title("DAT 文件分析器 v1.1")
@@ -35,9 +86,28 @@ class DatAnalyzerApp:
         # 初始化变量
         self.file_path = tk.StringVar()
         self.current_file = None
+        # 当前文件的多进程扫描引擎，进程池在打开下一个文件前一直复用
+        self.scanner = None
+        self.hex_view = None
+        self.hex_top_row = 0
+        self.entropy_map = None
+        self.region_starts = []
+        self.log_viewer = None
+        self.value_scanner = None
+        
+        # 后台任务
+        self.task_runner = TaskRunner(self.root)
+        self.tasks = {}
+        
+        # 度量事件可能来自后台线程，先放进队列再由主线程取出显示
+        self.metric_events = queue.Queue()
+        self.metric_records = []
+        self.metric_sink = self.metric_events.put
+        instrumentation.add_sink(self.metric_sink)
         
         # 创建界面布局
         self.create_widgets()
+        self.root.after(self.METRIC_POLL_INTERVAL, self.poll_metrics)
         
     def create_widgets(self):
         # 顶部工具栏
@@ -52,6 +122,10 @@ class DatAnalyzerApp:
         log_btn = tk.Button(toolbar, text="查看日志", command=self.show_log_viewer)
         log_btn.pack(side=tk.LEFT, padx=2, pady=2)
         
+        # 取消后台任务按钮
+        cancel_btn = tk.Button(toolbar, text="取消任务", command=self.cancel_tasks)
+        cancel_btn.pack(side=tk.LEFT, padx=2, pady=2)
+        
         # 文件路径显示
         file_path_label = tk.Label(toolbar, textvariable=self.file_path)
         file_path_label.pack(side=tk.LEFT, padx=10)
@@ -66,9 +140,13 @@ class DatAnalyzerApp:
         
         # 创建各个功能标签页
         self.create_file_info_tab()
+        self.create_hex_tab()
         self.create_keyword_tab()
         self.create_structure_tab()
         self.create_extract_tab()
+        self.create_value_tab()
+        self.create_diff_tab()
+        self.create_metrics_tab()
         
     def create_file_info_tab(self):
         """创建文件信息标签页"""
@@ -87,20 +165,307 @@ class DatAnalyzerApp:
         self.file_info_text.pack(fill=tk.BOTH, expand=True)
         
     def analyze_file(self):
-        """分析文件内容"""
+        """分析文件内容（后台执行，字符串边扫描边显示）"""
         if not self.current_file:
             return
             
-        analysis = self.current_file.analyze_file()
-        if analysis:
-            info = f"文件大小: {analysis['file_size']} 字节\n"
-            info += f"文件类型: {'文本文件' if analysis['is_text'] else '二进制文件'}\n"
-            info += f"\n可打印字符串:\n"
-            info += '\n'.join(analysis['strings']) if analysis['strings'] else "无"
-            info += f"\n\n十六进制转储:\n{analysis['hex_dump']}"
+        self.run_task("分析文件", self.analyze_file_worker, self.file_info_text,
+                      self.file_path.get(), self.current_file.document, self.scanner)
+        
+    @classmethod
+    def analyze_file_worker(cls, ctx, file_path, document, scanner):
+        """后台线程：分析文件基本信息并流式输出字符串"""
+        handler = FileHandler(file_path, document)
+        if not handler.read_file():
+            raise IOError("无法读取文件内容")
+        try:
+            info = f"文件大小: {len(handler.data)} 字节\n"
+            info += f"文件类型: {'文本文件' if handler.is_text_file() else '二进制文件'}\n"
+            info += "\n可打印字符串:\n"
+            ctx.emit(info)
+            
+            data = handler.data
+            # 缓存未命中时由扫描引擎逐块扫描，边扫描边显示
+            chunks = cls.iter_scan_chunks(ctx, scanner, len(data), 'strings', min_length=4)
+            parts = handler.iter_cached_parts(string_cache_kind(4), chunks, merge_lists, hits_to_arrays,
+                                              lambda arrays, meta: hits_from_arrays(data, arrays))
+            lines = cls.stream_lines(ctx, (
+                (hit.offset + hit.length, hit.text) for hits in parts for hit in hits
+            ))
+            if not lines:
+                ctx.emit("无\n")
+            preview = handler.hex_dump(length=HEX_PREVIEW_BYTES)
+            return f"\n十六进制预览（完整内容见“十六进制”标签页）:\n{preview}"
+        finally:
+            handler.cleanup()
+            
+    @classmethod
+    def iter_scan_chunks(cls, ctx, scanner, size, kernel, **params):
+        """用共享的扫描引擎逐块产出内核结果，每块之后汇报进度"""
+        try:
+            for index, part in enumerate(scanner.iter_chunks(kernel, **params)):
+                yield part
+                ctx.progress(min((index + 1) * scanner.chunk_size, size))
+        except CancelledError:
+            # 打开新文件时引擎被关闭，未开始的块被撤下
+            ctx.check()
+            raise
+            
+    @classmethod
+    def stream_lines(cls, ctx, items):
+        """把 (进度偏移, 文本行) 分批推送到界面，超过上限后只计数不再显示"""
+        batch = []
+        count = 0
+        for position, line in items:
+            ctx.progress(position)
+            count += 1
+            if count <= cls.MAX_STREAMED_LINES:
+                batch.append(line)
+                if len(batch) >= cls.STREAM_BATCH_LINES:
+                    ctx.emit('\n'.join(batch) + '\n')
+                    batch = []
+        if batch:
+            ctx.emit('\n'.join(batch) + '\n')
+        if count > cls.MAX_STREAMED_LINES:
+            ctx.emit(f"... 共 {count} 条，仅显示前 {cls.MAX_STREAMED_LINES} 条\n")
+        ctx.result_count = count
+        return count
+        
+    def run_task(self, name, worker, widget, *args, on_success=None):
+        """在后台执行任务，部分结果追加到 widget，同名的旧任务会先被取消
+
+        on_success 只在任务正常完成（未取消、未出错）后在界面线程调用
+        """
+        previous = self.tasks.get(name)
+        if previous and previous.running:
+            previous.cancel()
+            
+        widget.delete(1.0, tk.END)
+        
+        def on_partial(task, text):
+            widget.insert(tk.END, text)
+            
+        def on_done(task, text):
+            if text:
+                widget.insert(tk.END, text)
+            if on_success:
+                on_success()
+            self.status_var.set(f"{task.name}完成")
+            
+        self.tasks[name] = self.task_runner.submit(
+            name, worker, *args,
+            total=self.current_file.document.size,
+            on_progress=self.on_task_progress,
+            on_partial=on_partial,
+            on_done=on_done,
+            on_error=self.on_task_error,
+            on_cancel=self.on_task_cancelled
+        )
+        self.status_var.set(f"{name}中...")
+        
+    def on_task_progress(self, task, done, total, elapsed):
+        """在状态栏显示进度和预计剩余时间"""
+        self.status_var.set(format_progress(task.name, done, total, elapsed))
+        
+    def on_task_error(self, task, error):
+        self.status_var.set(f"{task.name}失败: {error}")
+        
+    def on_task_cancelled(self, task, _):
+        self.status_var.set(f"{task.name}已取消")
+        
+    def cancel_tasks(self):
+        """取消所有正在执行的任务"""
+        self.task_runner.cancel_all()
+        
+    def close_scanner(self):
+        """关闭当前文件的扫描引擎及其进程池"""
+        if self.scanner is not None:
+            self.scanner.close()
+            self.scanner = None
+            
+    def create_hex_tab(self):
+        """创建十六进制视图标签页，只渲染可见的行"""
+        tab = tk.Frame(self.notebook)
+        self.notebook.add(tab, text="十六进制")
+        
+        # 跳转到偏移
+        jump_frame = tk.Frame(tab)
+        jump_frame.pack(fill=tk.X, padx=5, pady=5)
+        
+        tk.Label(jump_frame, text="跳转到偏移:").pack(side=tk.LEFT)
+        self.hex_offset_entry = tk.Entry(jump_frame, width=16)
+        self.hex_offset_entry.pack(side=tk.LEFT, padx=5)
+        self.hex_offset_entry.bind('<Return>', lambda event: self.jump_to_offset())
+        
+        jump_btn = tk.Button(jump_frame, text="跳转", command=self.jump_to_offset)
+        jump_btn.pack(side=tk.LEFT)
+        
+        # 熵图：整个文件按区域类别着色，点击跳转到对应偏移
+        self.minimap = tk.Canvas(tab, height=self.MINIMAP_HEIGHT, bg='white', highlightthickness=0)
+        self.minimap.pack(fill=tk.X, padx=5)
+        self.minimap.bind('<Configure>', lambda event: self.render_minimap())
+        self.minimap.bind('<Button-1>', self.on_minimap_click)
+        self.minimap.bind('<Motion>', self.on_minimap_motion)
+        
+        # 视图区域，滚动条由视图自行换算为行号
+        view_frame = tk.Frame(tab)
+        view_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        
+        self.hex_scrollbar = ttk.Scrollbar(view_frame, orient=tk.VERTICAL, command=self.on_hex_scroll)
+        self.hex_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        self.hex_text = tk.Text(view_frame, wrap=tk.NONE, font=self.HEX_FONT, state='disabled')
+        self.hex_text.pack(fill=tk.BOTH, expand=True)
+        self.hex_text.bind('<Configure>', lambda event: self.render_hex_view())
+        self.hex_text.bind('<MouseWheel>', self.on_hex_wheel)
+        self.hex_text.bind('<Button-4>', self.on_hex_wheel)
+        self.hex_text.bind('<Button-5>', self.on_hex_wheel)
+        
+    def visible_hex_rows(self):
+        """当前窗口能显示的行数"""
+        line_height = tkfont.Font(font=self.hex_text['font']).metrics('linespace')
+        return max(1, self.hex_text.winfo_height() // max(line_height, 1))
+        
+    def render_hex_view(self):
+        """渲染从 hex_top_row 开始的可见行"""
+        if not self.hex_view:
+            return
+            
+        rows = self.visible_hex_rows()
+        total = self.hex_view.rows
+        self.hex_top_row = max(0, min(self.hex_top_row, total - rows))
+        lines = self.hex_view.render_rows(self.hex_top_row, rows)
+        
+        self.hex_text.configure(state='normal')
+        self.hex_text.delete(1.0, tk.END)
+        self.hex_text.insert(tk.END, '\n'.join(lines))
+        self.hex_text.configure(state='disabled')
+        
+        if total:
+            self.hex_scrollbar.set(self.hex_top_row / total, min(1.0, (self.hex_top_row + rows) / total))
+        else:
+            self.hex_scrollbar.set(0.0, 1.0)
+        self.render_minimap_marker()
+            
+    def on_hex_scroll(self, action, value, unit=None):
+        """处理滚动条拖动和点击"""
+        if not self.hex_view:
+            return
+            
+        if action == 'moveto':
+            self.hex_top_row = int(float(value) * self.hex_view.rows)
+        elif action == 'scroll':
+            step = self.visible_hex_rows() if unit == 'pages' else 1
+            self.hex_top_row += int(value) * step
+        self.render_hex_view()
+        
+    def on_hex_wheel(self, event):
+        """处理鼠标滚轮"""
+        if event.num == 4 or event.delta > 0:
+            self.hex_top_row -= 3
+        else:
+            self.hex_top_row += 3
+        self.render_hex_view()
+        return 'break'
+        
+    def jump_to_offset(self):
+        """跳转到输入的偏移"""
+        if not self.hex_view:
+            return
+            
+        try:
+            offset = int(self.hex_offset_entry.get(), 0)
+        except ValueError:
+            self.status_var.set("无效的偏移，请输入十进制或0x开头的十六进制数")
+            return
+        self.hex_top_row = self.hex_view.row_of(offset)
+        self.render_hex_view()
+        
+    def compute_entropy_map(self):
+        """后台计算熵图，完成后绘制"""
+        previous = self.tasks.get("熵分析")
+        if previous and previous.running:
+            previous.cancel()
+        self.entropy_map = None
+        self.render_minimap()
+        
+        def on_done(task, result):
+            self.entropy_map = result
+            self.region_starts = [region.start for region in result[2]] if result else []
+            self.render_minimap()
+            self.status_var.set(f"{task.name}完成")
+            
+        self.tasks["熵分析"] = self.task_runner.submit(
+            "熵分析", self.entropy_map_worker, self.file_path.get(), self.current_file.document,
+            total=self.current_file.document.size,
+            on_progress=self.on_task_progress,
+            on_done=on_done,
+            on_error=self.on_task_error,
+            on_cancel=self.on_task_cancelled
+        )
+        
+    @classmethod
+    def entropy_map_worker(cls, ctx, file_path, document):
+        """后台线程：计算滑动窗口统计和区域划分"""
+        analyzer = DataAnalyzer(file_path, document)
+        if not analyzer.read_file():
+            raise IOError("无法读取文件内容")
+        try:
+            return analyzer.find_regions(progress=ctx.progress)
+        finally:
+            analyzer.cleanup()
             
-            self.file_info_text.delete(1.0, tk.END)
-            self.file_info_text.insert(tk.END, info)
+    def render_minimap(self):
+        """按画布宽度缩略绘制熵图，同类的相邻列合并成一个矩形"""
+        self.minimap.delete('all')
+        if not self.entropy_map or not self.current_file:
+            return
+            
+        stats, kinds, _ = self.entropy_map
+        width = self.minimap.winfo_width()
+        columns = minimap_columns(stats, kinds, self.current_file.document.size, width).tolist()
+        start = 0
+        for x in range(1, len(columns) + 1):
+            if x == len(columns) or columns[x] != columns[start]:
+                color = self.REGION_COLORS[REGION_KINDS[columns[start]]]
+                self.minimap.create_rectangle(start, 0, x, self.MINIMAP_HEIGHT, fill=color, width=0)
+                start = x
+        self.render_minimap_marker()
+        
+    def render_minimap_marker(self):
+        """在熵图上标出十六进制视图当前所在位置"""
+        self.minimap.delete('marker')
+        if not self.entropy_map or not self.hex_view or not len(self.hex_view.data):
+            return
+        offset = self.hex_top_row * self.hex_view.bytes_per_line
+        x = int(offset * self.minimap.winfo_width() / len(self.hex_view.data))
+        self.minimap.create_line(x, 0, x, self.MINIMAP_HEIGHT, fill='black', width=2, tags='marker')
+        
+    def minimap_offset(self, x):
+        """画布横坐标对应的文件偏移"""
+        width = max(self.minimap.winfo_width(), 1)
+        size = self.current_file.document.size
+        return max(0, min(size - 1, int(x * size / width)))
+        
+    def minimap_region(self, offset):
+        index = bisect.bisect_right(self.region_starts, offset) - 1
+        return self.entropy_map[2][max(index, 0)]
+        
+    def on_minimap_click(self, event):
+        """点击熵图跳转到对应偏移"""
+        if not self.entropy_map or not self.hex_view:
+            return
+        self.hex_top_row = self.hex_view.row_of(self.minimap_offset(event.x))
+        self.render_hex_view()
+        
+    def on_minimap_motion(self, event):
+        """鼠标移动时在状态栏显示所在区域"""
+        if not self.entropy_map:
+            return
+        offset = self.minimap_offset(event.x)
+        region = self.minimap_region(offset)
+        self.status_var.set(f"0x{offset:08X}: {REGION_NAMES[region.kind]} "
+                            f"(0x{region.start:08X}-0x{region.end:08X}，熵 {region.entropy:.2f})")
         
     def create_keyword_tab(self):
         """创建关键词分析标签页"""
@@ -111,7 +476,11 @@ class DatAnalyzerApp:
         keyword_frame = tk.LabelFrame(tab, text="关键词搜索")
         keyword_frame.pack(fill=tk.X, padx=5, pady=5)
         
-        tk.Label(keyword_frame, text="输入关键词:").pack(side=tk.LEFT)
+        self.search_mode_var = tk.StringVar(value='关键词')
+        mode_menu = ttk.Combobox(keyword_frame, textvariable=self.search_mode_var,
+                                 values=list(self.SEARCH_MODES), state='readonly', width=12)
+        mode_menu.pack(side=tk.LEFT, padx=2)
+        tk.Label(keyword_frame, text="关键词逗号分隔，特征如 4B 69 ?? 6C ?0:").pack(side=tk.LEFT)
         self.keyword_entry = tk.Entry(keyword_frame)
         self.keyword_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
         
@@ -131,8 +500,12 @@ class DatAnalyzerApp:
         self.notebook.add(tab, text="结构分析")
         
         # 分析按钮
-        analyze_btn = tk.Button(tab, text="分析数据结构", command=self.analyze_structure)
-        analyze_btn.pack(pady=5)
+        button_frame = tk.Frame(tab)
+        button_frame.pack(pady=5)
+        analyze_btn = tk.Button(button_frame, text="分析数据结构", command=self.analyze_structure)
+        analyze_btn.pack(side=tk.LEFT, padx=5)
+        layout_btn = tk.Button(button_frame, text="检测记录布局", command=self.detect_layouts)
+        layout_btn.pack(side=tk.LEFT, padx=5)
         
         # 结果显示区域
         result_frame = tk.LabelFrame(tab, text="分析结果")
@@ -150,11 +523,19 @@ class DatAnalyzerApp:
         options_frame = tk.LabelFrame(tab, text="提取选项")
         options_frame.pack(fill=tk.X, padx=5, pady=5)
         
-        tk.Label(options_frame, text="最小字符串长度:").pack(side=tk.LEFT)
-        self.min_length_entry = tk.Entry(options_frame, width=5)
-        self.min_length_entry.pack(side=tk.LEFT, padx=5)
-        self.min_length_entry.insert(0, "4")
+        # 每种编码一个勾选框和最小字符数
+        tk.Label(options_frame, text="编码/最小字符数:").pack(side=tk.LEFT)
+        self.encoding_options = {}
+        for name in ENCODINGS:
+            enabled = tk.BooleanVar(value=True)
+            tk.Checkbutton(options_frame, text=name, variable=enabled).pack(side=tk.LEFT)
+            min_length_entry = tk.Entry(options_frame, width=3)
+            min_length_entry.pack(side=tk.LEFT, padx=(0, 5))
+            min_length_entry.insert(0, str(DEFAULT_MIN_LENGTHS[name]))
+            self.encoding_options[name] = (enabled, min_length_entry)
         
+        carve_btn = tk.Button(options_frame, text="提取内嵌文件", command=self.carve_files)
+        carve_btn.pack(side=tk.RIGHT, padx=5)
         extract_btn = tk.Button(options_frame, text="提取字符串", command=self.extract_strings)
         extract_btn.pack(side=tk.RIGHT)
         
@@ -165,6 +546,276 @@ class DatAnalyzerApp:
         self.extract_result_text = scrolledtext.ScrolledText(result_frame)
         self.extract_result_text.pack(fill=tk.BOTH, expand=True)
         
+    def create_value_tab(self):
+        """创建数值扫描标签页：查找数值并在多次保存之间缩小候选"""
+        tab = tk.Frame(self.notebook)
+        self.notebook.add(tab, text="数值扫描")
+        
+        options_frame = tk.LabelFrame(tab, text="扫描选项")
+        options_frame.pack(fill=tk.X, padx=5, pady=5)
+        
+        tk.Label(options_frame, text="数值/条件:").pack(side=tk.LEFT)
+        self.value_entry = tk.Entry(options_frame, width=16)
+        self.value_entry.pack(side=tk.LEFT, padx=5)
+        tk.Label(options_frame, text="类型:").pack(side=tk.LEFT)
+        self.value_types_entry = tk.Entry(options_frame, width=16)
+        self.value_types_entry.pack(side=tk.LEFT, padx=5)
+        self.value_endian_var = tk.StringVar(value='大小端')
+        endian_menu = ttk.Combobox(options_frame, textvariable=self.value_endian_var,
+                                   values=list(self.VALUE_ENDIANS), state='readonly', width=6)
+        endian_menu.pack(side=tk.LEFT, padx=2)
+        
+        reset_btn = tk.Button(options_frame, text="重置", command=self.reset_value_scan)
+        reset_btn.pack(side=tk.RIGHT)
+        next_btn = tk.Button(options_frame, text="筛选", command=self.next_value_scan)
+        next_btn.pack(side=tk.RIGHT, padx=2)
+        first_btn = tk.Button(options_frame, text="首次扫描", command=self.first_value_scan)
+        first_btn.pack(side=tk.RIGHT)
+        
+        tk.Label(tab, anchor=tk.W, justify=tk.LEFT,
+                 text="首次扫描填当前数值（留空表示未知），类型如 int32,float，留空按数值自动选择；\n"
+                      "游戏中数值改变并保存后填条件再筛选：= 值、c 改变、u 未变、+ 增加、- 减少、+N、-N").pack(fill=tk.X, padx=5)
+        
+        result_frame = tk.LabelFrame(tab, text="候选")
+        result_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        
+        self.value_result_text = scrolledtext.ScrolledText(result_frame, font=self.HEX_FONT)
+        self.value_result_text.pack(fill=tk.BOTH, expand=True)
+        
+    def first_value_scan(self):
+        """读取文件当前内容，按数值（或未知初值）建立候选"""
+        if not self.current_file:
+            return
+            
+        text = self.value_entry.get().strip()
+        try:
+            value = parse_value(text) if text else None
+            types = parse_types(self.value_types_entry.get())
+        except ValueError as e:
+            messagebox.showerror("错误", str(e))
+            return
+        self.start_value_scan(ValueScanner(types, self.VALUE_ENDIANS[self.value_endian_var.get()]), None, value)
+        
+    def next_value_scan(self):
+        """重新读取文件，用筛选条件缩小候选"""
+        if not self.current_file:
+            return
+        if not self.value_scanner or not self.value_scanner.started:
+            messagebox.showerror("错误", "请先进行首次扫描")
+            return
+            
+        try:
+            predicate, value = parse_condition(self.value_entry.get())
+        except ValueError as e:
+            messagebox.showerror("错误", str(e))
+            return
+        self.start_value_scan(self.value_scanner.copy(), predicate, value)
+        
+    def start_value_scan(self, scanner, predicate, value):
+        """在副本上扫描，任务正常完成后才替换当前扫描器
+
+        连续点击筛选时旧任务会被取消，它的结果不会覆盖新任务的基准
+        """
+        def commit():
+            self.value_scanner = scanner
+            
+        self.run_task("数值扫描", self.value_scan_worker, self.value_result_text,
+                      self.file_path.get(), scanner, predicate, value, on_success=commit)
+        
+    def reset_value_scan(self):
+        task = self.tasks.get("数值扫描")
+        if task and task.running:
+            task.cancel()
+        self.value_scanner = None
+        self.value_result_text.delete(1.0, tk.END)
+        
+    @classmethod
+    def value_scan_worker(cls, ctx, file_path, scanner, predicate, value):
+        """后台线程：从磁盘读取新快照，首次扫描或按条件筛选，列出候选"""
+        data = snapshot_file(file_path)
+        if predicate is None:
+            scanner.first_scan(data, value)
+        else:
+            scanner.next_scan(data, predicate, value)
+        ctx.check()
+        ctx.progress(len(data))
+        
+        ctx.emit(f"第 {scanner.scans} 次扫描，候选 {scanner.count} 个\n")
+        if scanner.previous is not None:
+            return "初值未知，保存后用 c/u/+/- 等条件筛选\n"
+        for key, count in scanner.summary().items():
+            ctx.emit(f"  {key}: {count}\n")
+        ctx.emit("\n")
+        cls.stream_lines(ctx, ((hit.offset, format_hit(hit)) for hit in scanner.iter_hits(cls.MAX_VALUE_HITS)))
+        if scanner.count > cls.MAX_VALUE_HITS:
+            return f"... 仅列出前 {cls.MAX_VALUE_HITS} 个\n"
+        return "没有候选\n" if not scanner.count else ""
+        
+    def create_diff_tab(self):
+        """创建文件对比标签页"""
+        tab = tk.Frame(self.notebook)
+        self.notebook.add(tab, text="文件对比")
+        
+        options_frame = tk.LabelFrame(tab, text="对比文件")
+        options_frame.pack(fill=tk.X, padx=5, pady=5)
+        
+        tk.Label(options_frame, text="与当前文件比较:").pack(side=tk.LEFT)
+        self.diff_path_entry = tk.Entry(options_frame)
+        self.diff_path_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        
+        diff_btn = tk.Button(options_frame, text="比较", command=self.compare_files)
+        diff_btn.pack(side=tk.RIGHT)
+        browse_btn = tk.Button(options_frame, text="浏览", command=self.choose_diff_file)
+        browse_btn.pack(side=tk.RIGHT, padx=2)
+        
+        result_frame = tk.LabelFrame(tab, text="差异")
+        result_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        
+        self.diff_result_text = scrolledtext.ScrolledText(result_frame, font=self.HEX_FONT)
+        self.diff_result_text.pack(fill=tk.BOTH, expand=True)
+        
+    def choose_diff_file(self):
+        file_path = filedialog.askopenfilename()
+        if file_path:
+            self.diff_path_entry.delete(0, tk.END)
+            self.diff_path_entry.insert(0, file_path)
+            
+    def compare_files(self):
+        """比较当前文件（已保存的内容）与另一个文件"""
+        if not self.current_file:
+            return
+            
+        other_path = self.diff_path_entry.get().strip()
+        if not other_path:
+            self.choose_diff_file()
+            other_path = self.diff_path_entry.get().strip()
+        if not other_path:
+            return
+        self.run_task("文件对比", self.compare_files_worker, self.diff_result_text,
+                      self.file_path.get(), other_path)
+        
+    @classmethod
+    def compare_files_worker(cls, ctx, file_path, other_path):
+        """后台线程：逐块比较并分批显示差异"""
+        view_a, view_b = FileView(file_path), FileView(other_path)
+        try:
+            ranges = []
+            
+            def lines():
+                for r in iter_diff(view_a.data, view_b.data, progress=ctx.progress):
+                    ranges.append(r)
+                    yield r.a_offset, format_range(r, view_a.data, view_b.data)
+                    
+            count = cls.stream_lines(ctx, lines())
+            if not count:
+                return "文件相同\n"
+            summary = summarize_diff(ranges)
+            return (f"\n共 {count} 处差异：替换 {summary['replace']}，插入 {summary['insert']}，"
+                    f"删除 {summary['delete']}；A 中 {summary['a_bytes']} 字节，B 中 {summary['b_bytes']} 字节\n")
+        finally:
+            view_a.close()
+            view_b.close()
+            
+    def create_metrics_tab(self):
+        """创建性能标签页：每次分析操作的耗时、吞吐量、内存和结果数"""
+        tab = tk.Frame(self.notebook)
+        self.notebook.add(tab, text="性能")
+        
+        options_frame = tk.Frame(tab)
+        options_frame.pack(fill=tk.X, padx=5, pady=5)
+        
+        tk.Label(options_frame, text="采样分析:").pack(side=tk.LEFT)
+        self.profile_var = tk.StringVar(value=self.PROFILE_OPERATIONS[0])
+        profile_menu = ttk.Combobox(options_frame, textvariable=self.profile_var,
+                                    values=self.PROFILE_OPERATIONS, width=12)
+        profile_menu.pack(side=tk.LEFT, padx=5)
+        profile_btn = tk.Button(options_frame, text="分析下一次运行", command=self.profile_next_operation)
+        profile_btn.pack(side=tk.LEFT)
+        
+        export_btn = tk.Button(options_frame, text="导出", command=self.export_metrics)
+        export_btn.pack(side=tk.RIGHT)
+        clear_btn = tk.Button(options_frame, text="清空", command=self.clear_metrics)
+        clear_btn.pack(side=tk.RIGHT, padx=2)
+        
+        columns = ('operation', 'time', 'bytes', 'throughput', 'rss', 'count', 'note')
+        headings = ('操作', '耗时', '字节数', '吞吐量', '峰值内存', '结果数', '备注')
+        self.metrics_tree = ttk.Treeview(tab, columns=columns, show='headings', height=12)
+        for column, heading in zip(columns, headings):
+            self.metrics_tree.heading(column, text=heading)
+            self.metrics_tree.column(column, width=150 if column == 'operation' else 90, anchor=tk.W)
+        self.metrics_tree.pack(fill=tk.BOTH, expand=True, padx=5)
+        
+        profile_frame = tk.LabelFrame(tab, text="采样分析结果")
+        profile_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.profile_text = scrolledtext.ScrolledText(profile_frame, height=10, font=self.HEX_FONT)
+        self.profile_text.pack(fill=tk.BOTH, expand=True)
+        
+    def poll_metrics(self):
+        """取出后台线程产生的度量事件并显示"""
+        while True:
+            try:
+                event = self.metric_events.get_nowait()
+            except queue.Empty:
+                break
+            self.add_metric_row(event)
+        self.root.after(self.METRIC_POLL_INTERVAL, self.poll_metrics)
+        
+    def add_metric_row(self, event):
+        self.metric_records.append(event)
+        notes = []
+        if event.parent:
+            notes.append(f"属于 {event.parent}")
+        if event.cache_hit:
+            notes.append("缓存")
+        if not event.ok:
+            notes.append(event.error or "失败")
+        mb = 1024*1024
+        self.metrics_tree.insert('', 0, values=(
+            event.operation,
+            f"{event.wall_time:.3f}s",
+            event.bytes or '',
+            f"{event.throughput / mb:.1f} MB/s" if event.throughput else '',
+            f"{event.peak_rss / mb:.1f} MB" if event.peak_rss else '',
+            '' if event.result_count is None else event.result_count,
+            '，'.join(notes)
+        ))
+        # 只保留最近的事件
+        if len(self.metric_records) > self.MAX_METRIC_ROWS:
+            del self.metric_records[0]
+            rows = self.metrics_tree.get_children()
+            self.metrics_tree.delete(rows[-1])
+        if event.profile:
+            self.profile_text.delete(1.0, tk.END)
+            self.profile_text.insert(tk.END, f"{event.operation}，耗时 {event.wall_time:.3f}s\n")
+            self.profile_text.insert(tk.END, format_profile(event.profile['functions'], event.profile['samples']))
+            
+    def profile_next_operation(self):
+        operation = self.profile_var.get().strip()
+        if operation:
+            instrumentation.profile_next(operation)
+            self.status_var.set(f"将对下一次{operation}进行采样分析")
+            
+    def clear_metrics(self):
+        self.metric_records = []
+        self.metrics_tree.delete(*self.metrics_tree.get_children())
+        self.profile_text.delete(1.0, tk.END)
+        
+    def export_metrics(self):
+        """把度量事件导出为 JSON Lines"""
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".jsonl",
+            filetypes=[("JSON Lines", "*.jsonl"), ("All files", "*.*")]
+        )
+        if not file_path:
+            return
+        try:
+            with open(file_path, 'w', encoding='utf-8') as f:
+                for event in self.metric_records:
+                    f.write(json.dumps(event_to_dict(event), ensure_ascii=False) + '\n')
+            self.status_var.set(f"度量已导出到 {file_path}")
+        except Exception as e:
+            messagebox.showerror("错误", f"导出失败: {e}")
+            
     def open_file(self):
         """打开文件并显示基本信息"""
         try:
@@ -180,6 +831,11 @@ class DatAnalyzerApp:
             ]
             file_path = filedialog.askopenfilename(filetypes=file_types)
             if file_path:
+                # 取消旧文件上的任务并释放映射
+                self.cancel_tasks()
+                self.close_scanner()
+                if self.current_file:
+                    self.current_file.cleanup()
                 self.file_path.set(file_path)
                 self.current_file = DatModifier(file_path)
                 
@@ -188,8 +844,13 @@ class DatAnalyzerApp:
                 self.root.update()
                 
                 if self.current_file.read_file():
+                    self.scanner = ParallelScanner(file_path, self.SCAN_WORKERS, self.SCAN_CHUNK_SIZE)
+                    self.hex_view = HexView(self.current_file.buffer)
+                    self.hex_top_row = 0
+                    self.render_hex_view()
                     self.show_file_info()
                     self.status_var.set(f"成功加载文件: {file_path}")
+                    self.compute_entropy_map()
                 else:
                     self.status_var.set("文件加载失败")
                     tk.messagebox.showerror("错误", "无法读取文件内容")
@@ -215,35 +876,145 @@ class DatAnalyzerApp:
                 self.file_info_text.insert(tk.END, "无法解析文件头")
                 
     def search_keywords(self):
-        """搜索关键词"""
+        """搜索关键词，多个关键词用逗号分隔"""
         if not self.current_file:
             return
             
-        keyword = self.keyword_entry.get()
-        if keyword:
-            inspector = DataInspector(self.file_path.get())
-            if inspector.read_file():
-                results = inspector.find_keywords([keyword])
-                if results:
-                    self.keyword_result_text.delete(1.0, tk.END)
-                    for keyword, info in results.items():
-                        self.keyword_result_text.insert(tk.END, f"关键词: {keyword}\n")
-                        self.keyword_result_text.insert(tk.END, f"偏移: 0x{info['offset']:08X}\n")
-                        self.keyword_result_text.insert(tk.END, f"上下文: {info['context']}\n\n")
+        mode = self.SEARCH_MODES.get(self.search_mode_var.get(), 'keyword')
+        if mode != 'keyword':
+            text = self.keyword_entry.get().strip()
+            if not text:
+                return
+            try:
+                pattern = compile_pattern(text, mode)
+            except ValueError as e:
+                messagebox.showerror("错误", str(e))
+                return
+            self.run_task("关键词搜索", self.search_pattern_worker, self.keyword_result_text,
+                          self.file_path.get(), self.current_file.document, pattern)
+            return
+            
+        keywords = self.parse_keywords(self.keyword_entry.get())
+        if keywords:
+            self.run_task("关键词搜索", self.search_keywords_worker, self.keyword_result_text,
+                          self.file_path.get(), self.current_file.document, keywords, self.scanner)
+
+    @staticmethod
+    def parse_keywords(text):
+        """将输入框内容按逗号拆分为关键词列表"""
+        return [k.strip() for k in text.replace('，', ',').split(',') if k.strip()]
+        
+    @classmethod
+    def search_keywords_worker(cls, ctx, file_path, document, keywords, scanner):
+        """后台线程：由扫描引擎分块单遍搜索全部关键词，命中边找边显示"""
+        inspector = DataInspector(file_path, document)
+        if not inspector.read_file():
+            raise IOError("无法读取文件内容")
+        try:
+            data = inspector.data
+            matcher = KeywordMatcher(keywords)
+            counts = {keyword: 0 for keyword in matcher.keywords}
+            
+            def hits():
+                # 跨块的关键词由内核归属于起始块
+                for found in cls.iter_scan_chunks(ctx, scanner, len(data), 'keywords', keywords=matcher.keywords):
+                    for keyword, offset in found:
+                        counts[keyword] += 1
+                        context = keyword_context(data, offset, len(encode_keyword(keyword)))
+                        yield offset, f"0x{offset:08X}  {keyword}  上下文: {context.hex(' ')}"
+                    
+            cls.stream_lines(ctx, hits())
+            summary = ["", "命中统计："]
+            summary += [f"  {keyword}: {count} 次" for keyword, count in counts.items()]
+            return '\n'.join(summary) + '\n'
+        finally:
+            inspector.cleanup()
                         
+    @classmethod
+    def search_pattern_worker(cls, ctx, file_path, document, pattern):
+        """后台线程：分块查找十六进制特征或正则的全部匹配，命中边找边显示"""
+        inspector = DataInspector(file_path, document)
+        if not inspector.read_file():
+            raise IOError("无法读取文件内容")
+        try:
+            data = inspector.data
+            
+            def hits():
+                for end, offsets, lengths in pattern.iter_chunk_matches(data, chunk_size=cls.SCAN_CHUNK_SIZE):
+                    for offset, length in zip(offsets.tolist(), lengths.tolist()):
+                        preview = bytes(data[offset:offset + min(length, 32)]).hex(' ').upper()
+                        yield offset, f"0x{offset:08X}  长度 {length}  {preview}"
+                    ctx.progress(end)
+                    
+            count = cls.stream_lines(ctx, hits())
+            return f"\n{pattern.describe()}: 共 {count} 处匹配\n"
+        finally:
+            inspector.cleanup()
+            
     def analyze_structure(self):
         """分析数据结构"""
         if not self.current_file:
             return
             
-        inspector = DataInspector(self.file_path.get())
-        if inspector.read_file():
-            result = inspector.analyze_data_structures()
-            self.structure_result_text.delete(1.0, tk.END)
-            if result:
-                self.structure_result_text.insert(tk.END, result)
-            else:
-                self.structure_result_text.insert(tk.END, "数据结构分析失败")
+        self.run_task("结构分析", self.analyze_structure_worker, self.structure_result_text,
+                      self.file_path.get(), self.current_file.document, self.scanner)
+        
+    @classmethod
+    def analyze_structure_worker(cls, ctx, file_path, document, scanner):
+        """后台线程：先查分析缓存，未命中时由扫描引擎分块扫描候选结构并汇报进度"""
+        inspector = DataInspector(file_path, document)
+        if not inspector.read_file():
+            raise IOError("无法读取文件内容")
+        try:
+            chunks = cls.iter_scan_chunks(ctx, scanner, len(inspector.data), 'structures')
+            parts = inspector.iter_cached_parts(structure_cache_kind(), chunks, concat_candidates,
+                                                candidates_to_arrays, candidates_from_arrays)
+            return inspector.format_structures(concat_candidates(parts))
+        finally:
+            inspector.cleanup()
+            
+    def detect_layouts(self):
+        """检测重复记录数组的步长和字段"""
+        if not self.current_file:
+            return
+            
+        self.run_task("记录布局", self.detect_layouts_worker, self.structure_result_text,
+                      self.file_path.get(), self.current_file.document)
+        
+    @classmethod
+    def detect_layouts_worker(cls, ctx, file_path, document):
+        """后台线程：逐段检测记录布局，没有完整段表时逐块检测"""
+        parser = DatParser(file_path, document)
+        if not parser.read_file():
+            raise IOError("无法读取文件内容")
+        try:
+            data = parser.data
+            index = parser.section_index
+            if index is not None and index.complete and len(index):
+                def section_layouts():
+                    for i, section in enumerate(index):
+                        layout = detect_layout(data, section.offset, section.offset + section.size)
+                        ctx.progress(section.offset + section.size)
+                        if layout is not None:
+                            yield (section.offset + section.size,
+                                   f"段 {i+1}（类型 0x{section.type:08X}）\n{format_layout(layout)}")
+                                   
+                count = cls.stream_lines(ctx, section_layouts())
+                return f"\n{len(index)} 个数据段中共 {count} 处重复记录数组\n"
+                
+            def block_layouts():
+                # 按扫描分块汇报进度，跨分块的数组分开列出
+                for start in range(0, len(data), cls.SCAN_CHUNK_SIZE):
+                    end = min(start + cls.SCAN_CHUNK_SIZE, len(data))
+                    for layout in iter_block_layouts(data, start, end):
+                        yield layout.start, format_layout(layout)
+                    ctx.progress(end)
+                    
+            ctx.emit("没有完整的段表，按块检测\n")
+            count = cls.stream_lines(ctx, block_layouts())
+            return f"\n共 {count} 处重复记录数组\n"
+        finally:
+            parser.cleanup()
             
     def extract_strings(self):
         """提取字符串"""
@@ -251,26 +1022,107 @@ class DatAnalyzerApp:
             return
             
         try:
-            min_length = int(self.min_length_entry.get())
-            extractor = DataExtractor(self.file_path.get())
-            if extractor.read_file():
-                strings = extractor.extract_strings(min_length)
-                if strings:
-                    self.extract_result_text.delete(1.0, tk.END)
-                    for s in strings:
-                        self.extract_result_text.insert(tk.END, f"{s}\n")
-        except ValueError:
-            pass
+            min_lengths = parse_encodings({name: entry.get() for name, (enabled, entry)
+                                           in self.encoding_options.items() if enabled.get()})
+        except ValueError as e:
+            self.status_var.set(str(e))
+            return
+        self.run_task("字符串提取", self.extract_strings_worker, self.extract_result_text,
+                      self.file_path.get(), self.current_file.document, min_lengths, self.scanner)
+        
+    @classmethod
+    def extract_strings_worker(cls, ctx, file_path, document, min_lengths, scanner):
+        """后台线程：逐块扫描多种编码的字符串并分批显示
+
+        扫描结果只有偏移/长度/编码数组，只有会显示出来的命中才解码成文本。
+        分析缓存命中时直接读取上次的结果，不再扫描。
+        """
+        extractor = DataExtractor(file_path, document)
+        if not extractor.read_file():
+            raise IOError("无法读取文件内容")
+        counts = [0] * len(ENCODINGS)
+        show_encoding = len(min_lengths) > 1
+        
+        def lines():
+            shown = 0
+            parts = extractor.iter_cached_parts(
+                encodings_cache_kind(min_lengths),
+                cls.iter_scan_chunks(ctx, scanner, len(extractor.data), 'encoded_strings', min_lengths=min_lengths),
+                concat_runs, runs_to_arrays, runs_from_arrays
+            )
+            for runs in parts:
+                for offset, length, code in zip(runs.offsets.tolist(), runs.lengths.tolist(),
+                                                runs.encodings.tolist()):
+                    shown += 1
+                    counts[code] += 1
+                    if shown > cls.MAX_STREAMED_LINES:
+                        # 超过显示上限后只计数
+                        yield offset + length, None
+                        continue
+                    text = decode_run(extractor.data, offset, length, code)
+                    if show_encoding:
+                        yield offset + length, f"0x{offset:08X}  {ENCODINGS[code]:<8}  {text}"
+                    else:
+                        yield offset + length, f"0x{offset:08X}  {text}"
+                        
+        try:
+            count = cls.stream_lines(ctx, lines())
+            summary = '，'.join(f"{ENCODINGS[code]} {n}" for code, n in enumerate(counts) if n)
+            return f"\n共提取 {count} 个字符串" + (f"（{summary}）" if show_encoding and summary else '') + "\n"
+        finally:
+            extractor.cleanup()
+            
+    def carve_files(self):
+        """查找内嵌的 PNG、zlib、ZIP、SQLite 等文件，选择了目录时同时导出"""
+        if not self.current_file:
+            return
+            
+        output_dir = filedialog.askdirectory(title="选择导出目录（取消则只列出）")
+        self.run_task("内嵌文件", self.carve_files_worker, self.extract_result_text,
+                      self.file_path.get(), self.current_file.document, output_dir or None)
+        
+    @classmethod
+    def carve_files_worker(cls, ctx, file_path, document, output_dir):
+        """后台线程：逐块查找内嵌文件并分批显示，导出时从映射直接写出"""
+        extractor = DataExtractor(file_path, document)
+        if not extractor.read_file():
+            raise IOError("无法读取文件内容")
+        carver = FileCarver()
+        
+        def lines():
+            for chunk_end, found in carver.iter_chunk_carved(extractor.data, chunk_size=cls.SCAN_CHUNK_SIZE):
+                ctx.progress(chunk_end)
+                for carved in found:
+                    line = f"0x{carved.offset:08X}  {carved.name:<6}  {carved.length} 字节"
+                    if output_dir:
+                        line += f"  -> {save_carved(extractor.data, carved, output_dir)}"
+                    yield carved.offset, line
+                    
+        try:
+            count = cls.stream_lines(ctx, lines())
+            return f"\n共找到 {count} 个内嵌文件" + (f"，已导出到 {output_dir}" if output_dir and count else '') + "\n"
+        finally:
+            extractor.cleanup()
             
     def show_log_viewer(self):
         """显示日志查看器"""
+        # 只保留一个查看器，重复打开时把已有窗口提到前面
+        if self.log_viewer is not None and not self.log_viewer._closed:
+            self.log_viewer.root.deiconify()
+            self.log_viewer.root.lift()
+            return
         log_window = tk.Toplevel(self.root)
         log_window.title("日志查看器")
         log_window.geometry("800x600")
-        LogViewer(log_window)
+        self.log_viewer = LogViewer(log_window)
         
     def cleanup(self):
         """清理资源"""
+        self.task_runner.shutdown()
+        self.close_scanner()
+        instrumentation.remove_sink(self.metric_sink)
+        if self.log_viewer is not None:
+            self.log_viewer.cleanup()
         if hasattr(self, 'current_file') and self.current_file:
             self.current_file.cleanup()
         self.root.destroy()
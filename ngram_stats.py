@@ -0,0 +1,144 @@
+from collections import namedtuple
+from typing import Iterator, List, Tuple
+
+import numpy as np
+
+# n-gram 统计结果
+#   width : n-gram 宽度（字节）
+#   total : 参与统计的 n-gram 总数
+#   top   : [(n-gram字节串, 次数), ...]，按次数降序
+#   exact : True 表示计数精确；False 表示经过重频项摘要，次数为下界估计
+NGramResult = namedtuple('NGramResult', ['width', 'total', 'top', 'exact'])
+
+MAX_WIDTH = 8
+# 宽度不超过该值时直接用 bincount 精确计数 (256^2 个计数槽)
+BINCOUNT_MAX_WIDTH = 2
+
+
+def byte_histogram(data, chunk_size: int = 4*1024*1024) -> np.ndarray:
+    """分块统计字节频率，返回长度为256的计数数组"""
+    hist = np.zeros(256, dtype=np.int64)
+    for chunk_start in range(0, len(data), chunk_size):
+        count = min(chunk_size, len(data) - chunk_start)
+        chunk = np.frombuffer(data, dtype=np.uint8, count=count, offset=chunk_start)
+        hist += np.bincount(chunk, minlength=256)
+    return hist
+
+
+def pack_ngrams(chunk: np.ndarray, width: int, positions: int) -> np.ndarray:
+    """把从每个位置开始的 width 字节按大端顺序打包成 uint64"""
+    packed = np.zeros(positions, dtype=np.uint64)
+    for j in range(width):
+        packed <<= np.uint64(8)
+        packed |= chunk[j:j + positions]
+    return packed
+
+
+def unpack_ngram(value: int, width: int) -> bytes:
+    return int(value).to_bytes(width, 'big')
+
+
+def iter_packed_ngrams(data, width: int, chunk_size: int = 4*1024*1024) -> Iterator[np.ndarray]:
+    """分块产出打包后的 n-gram
+
+    每块额外读取 width-1 字节，保证跨块边界的 n-gram 恰好统计一次。
+    """
+    if not 1 <= width <= MAX_WIDTH:
+        raise ValueError(f"n-gram 宽度必须在 1 到 {MAX_WIDTH} 之间")
+    total = len(data) - width + 1
+    for chunk_start in range(0, max(total, 0), chunk_size):
+        positions = min(chunk_size, total - chunk_start)
+        chunk = np.frombuffer(data, dtype=np.uint8, count=positions + width - 1, offset=chunk_start)
+        yield pack_ngrams(chunk, width, positions)
+
+
+class HeavyHitters:
+    """有界内存的重频项摘要 (Misra-Gries)
+
+    摘要最多保存 capacity 个键；超出时所有计数同时减去第 capacity+1 大的
+    计数并丢弃非正项。被保留的计数是真实次数的下界，误差不超过
+    总数 / (capacity + 1)。
+    """
+
+    def __init__(self, capacity: int = 1 << 20):
+        self.capacity = capacity
+        self.keys = np.empty(0, dtype=np.uint64)
+        self.counts = np.empty(0, dtype=np.int64)
+        self.exact = True
+
+    def update(self, keys: np.ndarray, counts: np.ndarray):
+        """合并一批 (键, 次数)"""
+        merged_keys, inverse = np.unique(np.concatenate((self.keys, keys)), return_inverse=True)
+        weights = np.concatenate((self.counts, counts))
+        merged_counts = np.bincount(inverse, weights=weights, minlength=len(merged_keys)).astype(np.int64)
+
+        if len(merged_keys) > self.capacity:
+            threshold = np.partition(merged_counts, -(self.capacity + 1))[-(self.capacity + 1)]
+            merged_counts -= threshold
+            keep = merged_counts > 0
+            merged_keys, merged_counts = merged_keys[keep], merged_counts[keep]
+            self.exact = False
+
+        self.keys, self.counts = merged_keys, merged_counts
+
+    def adjust(self, keys: np.ndarray, deltas: np.ndarray):
+        """按增量修改计数（可为负），计数降到0的键删除
+
+        用于编辑后的增量更新；摘要不精确时，已被丢弃的键的减量直接忽略。
+        """
+        keys, inverse = np.unique(keys, return_inverse=True)
+        deltas = np.bincount(inverse, weights=deltas, minlength=len(keys)).astype(np.int64)
+        changed = deltas != 0
+        keys, deltas = keys[changed], deltas[changed]
+        if not len(keys):
+            return
+
+        index = np.searchsorted(self.keys, keys)
+        found = index < len(self.keys)
+        found[found] = self.keys[index[found]] == keys[found]
+        self.counts[index[found]] += deltas[found]
+        added = ~found & (deltas > 0)
+        if added.any():
+            self.keys = np.insert(self.keys, index[added], keys[added])
+            self.counts = np.insert(self.counts, index[added], deltas[added])
+        if (self.counts <= 0).any():
+            keep = self.counts > 0
+            self.keys, self.counts = self.keys[keep], self.counts[keep]
+        if len(self.keys) > self.capacity:
+            self.update(np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.int64))
+
+    def top(self, k: int) -> List[Tuple[int, int]]:
+        if not len(self.keys):
+            return []
+        k = min(k, len(self.keys))
+        # 取出不小于第k大计数的全部项再排序，保证并列时结果稳定
+        kth = np.partition(self.counts, -k)[-k]
+        index = np.flatnonzero(self.counts >= kth)
+        index = index[np.lexsort((self.keys[index], -self.counts[index]))][:k]
+        return [(int(self.keys[i]), int(self.counts[i])) for i in index]
+
+
+def dense_top(counts: np.ndarray, width: int, top_k: int) -> List[Tuple[bytes, int]]:
+    """从按 n-gram 值索引的计数数组中取出现最多的 top_k 项"""
+    nonzero = np.flatnonzero(counts)
+    order = nonzero[np.lexsort((nonzero, -counts[nonzero]))][:top_k]
+    return [(unpack_ngram(value, width), int(counts[value])) for value in order]
+
+
+def count_ngrams(data, width: int = 4, top_k: int = 10, chunk_size: int = 4*1024*1024,
+                 capacity: int = 1 << 20) -> NGramResult:
+    """统计宽度为 width 的 n-gram，返回出现最多的 top_k 项"""
+    total = max(len(data) - width + 1, 0)
+
+    if width <= BINCOUNT_MAX_WIDTH:
+        counts = np.zeros(1 << (8 * width), dtype=np.int64)
+        for packed in iter_packed_ngrams(data, width, chunk_size):
+            counts += np.bincount(packed.astype(np.intp), minlength=len(counts))
+        return NGramResult(width, total, dense_top(counts, width, top_k), True)
+
+    summary = HeavyHitters(capacity)
+    for packed in iter_packed_ngrams(data, width, chunk_size):
+        keys, counts = np.unique(packed, return_counts=True)
+        summary.update(keys, counts.astype(np.int64))
+    top = [(unpack_ngram(value, width), count) for value, count in summary.top(top_k)]
+    return NGramResult(width, total, top, summary.exact)
@@ -0,0 +1,155 @@
+import mmap
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+from document import DatDocument
+from encoded_strings import concat_runs, scan_encoded_range
+from file_carver import merge_carved, scan_carve_range
+from keyword_search import scan_keywords_range
+from pattern_search import scan_pattern_range
+from string_scanner import scan_strings_range
+from structure_scanner import concat_candidates, scan_range
+
+
+def merge_lists(parts):
+    """按块顺序拼接列表结果"""
+    merged = []
+    for part in parts:
+        merged.extend(part)
+    return merged
+
+
+# 扫描内核：func(buf, start, end, **params) 只返回起始偏移位于 [start, end)
+# 内的结果，需要时可以读取 end 之后的数据；merge 把各块结果按顺序合并。
+# 这种"按起始偏移归属"的约定保证跨块边界的结果不重复。
+ScanKernel = namedtuple('ScanKernel', ['func', 'merge'])
+
+KERNELS: Dict[str, ScanKernel] = {
+    'strings': ScanKernel(scan_strings_range, merge_lists),
+    'encoded_strings': ScanKernel(scan_encoded_range, concat_runs),
+    'keywords': ScanKernel(scan_keywords_range, merge_lists),
+    'signatures': ScanKernel(scan_pattern_range, merge_lists),
+    'structures': ScanKernel(scan_range, concat_candidates),
+    'carve': ScanKernel(scan_carve_range, merge_carved),
+}
+
+
+def register_kernel(name: str, func: Callable, merge: Callable = merge_lists):
+    """注册扫描内核，func 必须是可导入模块中的模块级函数，以便传给子进程
+
+    子进程收到的是函数本身（按模块和函数名序列化），不查本表：spawn 方式
+    （Windows、macOS 的默认方式）启动的子进程里没有运行时注册的内核。
+    """
+    KERNELS[name] = ScanKernel(func, merge)
+
+
+# 子进程中缓存的文件映射 {路径: (映射, 文件标识)}，每个进程每个文件只映射一次
+_worker_maps: Dict[str, Tuple[mmap.mmap, tuple]] = {}
+
+
+def _worker_map(file_path: str) -> mmap.mmap:
+    """返回缓存的映射；进程池长期存在时文件可能已被替换，此时重新映射"""
+    identity = DatDocument.file_identity(os.stat(file_path))
+    cached = _worker_maps.get(file_path)
+    if cached is not None and cached[1] == identity:
+        return cached[0]
+    with open(file_path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if cached is not None:
+        try:
+            cached[0].close()
+        except BufferError:
+            pass
+    _worker_maps[file_path] = (mapped, identity)
+    return mapped
+
+
+def _scan_chunk(file_path: str, func: Callable, start: int, end: int, params: dict):
+    """子进程入口：自行映射文件后在 [start, end) 上运行内核函数，只传回结果"""
+    return func(_worker_map(file_path), start, end, **params)
+
+
+def split_chunks(size: int, chunk_size: int):
+    return [(start, min(start + chunk_size, size)) for start in range(0, size, chunk_size)]
+
+
+class ParallelScanner:
+    """多进程分块扫描引擎
+
+    文件按 chunk_size 切块，每个子进程自己映射文件（不传输数据），
+    在所属块上运行内核；内核可越过块尾读取，等价于相邻块互相重叠。
+    结果按块顺序返回。
+    """
+
+    DEFAULT_CHUNK_SIZE = 16*1024*1024
+
+    def __init__(self, file_path: str, workers: Optional[int] = None, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.file_path = os.path.abspath(file_path)
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self._executor = None
+        # 已提交、结果还没取走的块，关闭时撤下；取走后立即移除，
+        # 长期使用的扫描器（如界面中的）不会积累已完成的块和结果
+        self._pending = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._executor is not None:
+            # 先撤下还没开始的块（shutdown 的 cancel_futures 参数需要 Python 3.9）
+            for future in list(self._pending):
+                future.cancel()
+            self._pending.clear()
+            self._executor.shutdown()
+            self._executor = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def iter_chunks(self, kernel: str, **params) -> Iterator:
+        """按文件顺序逐块产出内核结果，可边扫描边消费"""
+        chunks = split_chunks(os.path.getsize(self.file_path), self.chunk_size)
+        if self.workers <= 1 or len(chunks) <= 1:
+            # 单进程时直接在本进程映射上运行，省去进程启动开销
+            with open(self.file_path, 'rb') as f:
+                if not chunks:
+                    return
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    for start, end in chunks:
+                        yield KERNELS[kernel].func(mapped, start, end, **params)
+            return
+
+        executor = self._get_executor()
+        futures = [
+            executor.submit(_scan_chunk, self.file_path, KERNELS[kernel].func, start, end, params)
+            for start, end in chunks
+        ]
+        self._pending.update(futures)
+        try:
+            for future in futures:
+                result = future.result()
+                self._pending.discard(future)
+                yield result
+        finally:
+            for future in futures:
+                future.cancel()
+            self._pending.difference_update(futures)
+
+    def scan(self, kernel: str, **params):
+        """扫描整个文件并合并结果"""
+        return KERNELS[kernel].merge(list(self.iter_chunks(kernel, **params)))
+
+
+def parallel_scan(file_path: str, kernel: str, workers: Optional[int] = None,
+                  chunk_size: int = ParallelScanner.DEFAULT_CHUNK_SIZE, **params):
+    """便捷函数：用多进程扫描整个文件"""
+    with ParallelScanner(file_path, workers, chunk_size) as scanner:
+        return scanner.scan(kernel, **params)
@@ -0,0 +1,255 @@
+import argparse
+import re
+import sys
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# 每块扫描的字节数，决定内存占用和进度汇报粒度
+CHUNK_SIZE = 16*1024*1024
+# 正则匹配跨块时允许的最大长度，超过的匹配会在块边界被截断
+MAX_REGEX_SPAN = 64*1024
+
+_EMPTY = np.empty(0, dtype=np.int64)
+
+
+class HexPattern:
+    """带通配符和半字节掩码的十六进制特征，如 '4B 69 ?? 6C ?0'
+
+    每个字节写成两个十六进制字符，'?' 表示该半字节任意；空白被忽略。
+    匹配时先在特征中最长的固定片段上用 numpy 整块比较得到候选位置，
+    再逐个字节位置（先固定字节，后半字节掩码）向量化筛选候选，
+    全程不逐字节进入 Python 循环。
+    """
+
+    kind = 'hex'
+
+    def __init__(self, text: str):
+        self.text = text
+        digits = ''.join(text.split())
+        if not digits or len(digits) % 2:
+            raise ValueError(f"无效的十六进制特征: {text}")
+        values, masks = [], []
+        for i in range(0, len(digits), 2):
+            value = mask = 0
+            for char, shift in ((digits[i], 4), (digits[i + 1], 0)):
+                if char == '?':
+                    continue
+                try:
+                    value |= int(char, 16) << shift
+                except ValueError:
+                    raise ValueError(f"无效的十六进制特征: {text}") from None
+                mask |= 0xF << shift
+            values.append(value)
+            masks.append(mask)
+        self.values = bytes(values)
+        self.masks = bytes(masks)
+        self.length = len(values)
+        self.max_length = self.length
+        self.fragment_offset, self.fragment = self._longest_fragment()
+        self._order = self._check_order()
+
+    def _longest_fragment(self) -> Tuple[int, bytes]:
+        """最长的连续固定字节片段 (在特征中的偏移, 内容)"""
+        best_start, best_length = 0, 0
+        start = None
+        for i, mask in enumerate(self.masks + b'\x00'):
+            if mask == 0xFF:
+                if start is None:
+                    start = i
+            elif start is not None:
+                if i - start > best_length:
+                    best_start, best_length = start, i - start
+                start = None
+        return best_start, self.values[best_start:best_start + best_length]
+
+    def _check_order(self) -> List[Tuple[int, int, int]]:
+        """比较顺序 [(位置, 掩码, 值)]：固定片段在前，其中避开常见的 0x00/0xFF
+        作为第一个比较的字节；然后是其余固定字节，最后是半字节掩码"""
+        fragment = list(range(self.fragment_offset, self.fragment_offset + len(self.fragment)))
+        fragment.sort(key=lambda i: self.values[i] in (0x00, 0xFF))
+        rest = [i for i in range(self.length) if i not in fragment and self.masks[i]]
+        rest.sort(key=lambda i: self.masks[i] != 0xFF)
+        return [(i, self.masks[i], self.values[i]) for i in fragment + rest]
+
+    def match_window(self, window: np.ndarray, count: int) -> np.ndarray:
+        """window 中起点小于 count、且整个特征落在 window 内的匹配起点"""
+        limit = min(count, len(window) - self.length + 1)
+        if limit <= 0:
+            return _EMPTY
+        if not self._order:
+            # 全部是通配符，每个位置都匹配
+            return np.arange(limit, dtype=np.int64)
+        position, mask, value = self._order[0]
+        column = window[position:position + limit]
+        if mask != 0xFF:
+            column = column & mask
+        candidates = np.flatnonzero(column == value)
+        for position, mask, value in self._order[1:]:
+            if not len(candidates):
+                break
+            column = window[candidates + position]
+            if mask != 0xFF:
+                column &= mask
+            candidates = candidates[column == value]
+        return candidates
+
+    def iter_chunk_matches(self, data, start: int = 0, end: Optional[int] = None,
+                           chunk_size: int = CHUNK_SIZE) -> Iterator[Tuple[int, np.ndarray, np.ndarray]]:
+        """逐块产出 (块结束偏移, 匹配偏移数组, 匹配长度数组)，只包含起点在 [start, end) 内的匹配"""
+        size = len(data)
+        end = size if end is None else min(end, size)
+        for chunk_start in range(start, end, chunk_size):
+            chunk_end = min(chunk_start + chunk_size, end)
+            # 多读 length-1 字节，跨块的匹配归属于起点所在的块
+            stop = min(chunk_end + self.length - 1, size)
+            window = np.frombuffer(data, dtype=np.uint8, count=stop - chunk_start, offset=chunk_start)
+            offsets = self.match_window(window, chunk_end - chunk_start) + chunk_start
+            yield chunk_end, offsets, np.full(len(offsets), self.length, dtype=np.int64)
+
+    def describe(self) -> str:
+        return ' '.join(
+            f"{value:02X}" if mask == 0xFF else ''.join(
+                '?' if not (mask >> shift) & 0xF else f"{(value >> shift) & 0xF:X}" for shift in (4, 0))
+            for value, mask in zip(self.values, self.masks))
+
+
+class RegexPattern:
+    """字节正则表达式，如 rb'Kill\\x00.{4}'
+
+    按块调用正则引擎（C 层扫描），每块多读 max_span 字节，匹配只归属于
+    起点所在的块；长于 max_span 的匹配会被截断。空匹配被忽略。
+    下一块从上一个匹配的结尾继续，与整体 finditer 一样不产生重叠匹配。
+    """
+
+    kind = 'regex'
+
+    def __init__(self, pattern, max_span: int = MAX_REGEX_SPAN):
+        self.text = pattern if isinstance(pattern, str) else pattern.decode('latin-1')
+        source = pattern.encode('utf-8') if isinstance(pattern, str) else bytes(pattern)
+        try:
+            self._regex = re.compile(source, re.DOTALL)
+        except re.error as e:
+            raise ValueError(f"无效的正则表达式: {e}") from None
+        self.max_length = max_span
+
+    def iter_chunk_matches(self, data, start: int = 0, end: Optional[int] = None,
+                           chunk_size: int = CHUNK_SIZE) -> Iterator[Tuple[int, np.ndarray, np.ndarray]]:
+        size = len(data)
+        end = size if end is None else min(end, size)
+        last_end = start
+        for chunk_start in range(start, end, chunk_size):
+            chunk_end = min(chunk_start + chunk_size, end)
+            stop = min(chunk_end + self.max_length, size)
+            offsets, lengths = [], []
+            for match in self._regex.finditer(data, max(chunk_start, last_end), stop):
+                offset = match.start()
+                if offset >= chunk_end:
+                    break
+                if match.end() > offset:
+                    offsets.append(offset)
+                    lengths.append(match.end() - offset)
+                    last_end = match.end()
+            yield chunk_end, np.array(offsets, dtype=np.int64), np.array(lengths, dtype=np.int64)
+
+    def describe(self) -> str:
+        return f"/{self.text}/"
+
+
+def compile_pattern(text, kind: str = 'hex'):
+    """按类型编译查询：'hex' 十六进制特征，'regex' 字节正则"""
+    if kind == 'hex':
+        return HexPattern(text)
+    if kind == 'regex':
+        return RegexPattern(text)
+    raise ValueError(f"未知的模式类型: {kind}")
+
+
+def iter_pattern_hits(data, pattern, start: int = 0, end: Optional[int] = None,
+                      chunk_size: int = CHUNK_SIZE) -> Iterator[Tuple[int, int]]:
+    """按偏移顺序逐个产出 (偏移, 长度)"""
+    for _, offsets, lengths in pattern.iter_chunk_matches(data, start, end, chunk_size):
+        yield from zip(offsets.tolist(), lengths.tolist())
+
+
+_pattern_cache = {}
+
+
+def scan_pattern_range(data, start: int, end: int, pattern: str = '', kind: str = 'hex') -> List[Tuple[int, int]]:
+    """返回起点位于 [start, end) 内的全部匹配 (偏移, 长度)（并行扫描内核）
+
+    只适合十六进制特征：正则匹配互不重叠，某块的第一个匹配取决于前一块
+    最后一个匹配的结尾，分块扫描的结果与整体扫描不同，正则应单进程扫描。
+    """
+    key = (kind, pattern)
+    compiled = _pattern_cache.get(key)
+    if compiled is None:
+        compiled = _pattern_cache[key] = compile_pattern(pattern, kind)
+    return list(iter_pattern_hits(data, compiled, start, end))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='在文件中查找十六进制特征（支持 ?? 和半字节通配）或字节正则的全部匹配')
+    parser.add_argument('file', help='要搜索的文件')
+    parser.add_argument('pattern', help="十六进制特征，如 '4B 69 ?? 6C ?0'；配合 --regex 为正则表达式")
+    parser.add_argument('--regex', action='store_true', help='把 pattern 当作字节正则表达式')
+    parser.add_argument('--count', action='store_true', help='只输出匹配数')
+    parser.add_argument('--limit', type=int, default=0, help='最多输出的匹配数（0 为不限）')
+    parser.add_argument('--preview', type=int, default=16, help='每个匹配显示的字节数')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='工作进程数（只用于十六进制特征，正则总是单进程扫描）')
+    args = parser.parse_args(argv)
+
+    from cli_output import silence_broken_pipe
+    from document import DatDocument, release_view
+    from parallel_scan import ParallelScanner
+
+    kind = 'regex' if args.regex else 'hex'
+    try:
+        pattern = compile_pattern(args.pattern, kind)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    try:
+        document = DatDocument.open(args.file)
+    except (OSError, ValueError) as e:
+        print(f"无法打开文件: {e}", file=sys.stderr)
+        return 2
+    data = document.view()
+    count = 0
+    try:
+        # 正则匹配互不重叠，分块结果依赖前一块，只能单进程扫描
+        if args.jobs > 1 and kind == 'hex':
+            scanner = ParallelScanner(args.file, args.jobs)
+            chunks = (hits for hits in scanner.iter_chunks('signatures', pattern=args.pattern, kind=kind))
+        else:
+            scanner = None
+            chunks = (list(zip(offsets.tolist(), lengths.tolist()))
+                      for _, offsets, lengths in pattern.iter_chunk_matches(data))
+        # 边扫描边输出，不等待整个文件扫描完
+        for hits in chunks:
+            for offset, length in hits:
+                count += 1
+                if not args.count:
+                    preview = bytes(data[offset:offset + min(length, args.preview)]).hex(' ').upper()
+                    print(f"0x{offset:08X}\t{length}\t{preview}")
+                if args.limit and count >= args.limit:
+                    break
+            else:
+                continue
+            break
+        if scanner is not None:
+            scanner.close()
+    except BrokenPipeError:
+        silence_broken_pipe()
+        return 0
+    finally:
+        release_view(data)
+        document.release()
+    if args.count:
+        print(count)
+    return 0 if count else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+import os
+import struct
+import zlib
+from typing import Iterable, List, Optional, Tuple
+
+# 日志文件格式（全部大端）：
+#   魔数 8s | 原文件大小 Q | 条目数 I
+#   每个条目：偏移 Q | 长度 I | 原始数据
+#   末尾：前面全部内容的 CRC32 I
+JOURNAL_MAGIC = b'DATJRNL1'
+JOURNAL_SUFFIX = '.journal'
+_HEADER = struct.Struct('>8sQI')
+_ENTRY = struct.Struct('>QI')
+_CRC = struct.Struct('>I')
+
+Range = Tuple[int, bytes]
+
+
+def journal_path(file_path: str) -> str:
+    return file_path + JOURNAL_SUFFIX
+
+
+def _fsync(f):
+    f.flush()
+    os.fsync(f.fileno())
+
+
+def _pwrite(f, offset: int, data: bytes):
+    """定位写入，平台支持时使用 os.pwrite"""
+    if hasattr(os, 'pwrite'):
+        view = memoryview(data)
+        while view:
+            written = os.pwrite(f.fileno(), view, offset)
+            view = view[written:]
+            offset += written
+    else:
+        f.seek(offset)
+        f.write(data)
+
+
+def write_journal(file_path: str, entries: List[Range], file_size: int):
+    """写入撤销日志：先写临时文件并落盘，再原子重命名为正式日志"""
+    body = [_HEADER.pack(JOURNAL_MAGIC, file_size, len(entries))]
+    for offset, old in entries:
+        body.append(_ENTRY.pack(offset, len(old)))
+        body.append(bytes(old))
+    body = b''.join(body)
+
+    temp_path = journal_path(file_path) + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(body)
+        f.write(_CRC.pack(zlib.crc32(body)))
+        _fsync(f)
+    os.replace(temp_path, journal_path(file_path))
+
+
+def read_journal(file_path: str) -> Optional[Tuple[int, List[Range]]]:
+    """读取并校验日志，返回 (原文件大小, 条目列表)，无效时返回 None"""
+    try:
+        with open(journal_path(file_path), 'rb') as f:
+            raw = f.read()
+    except OSError:
+        return None
+    if len(raw) < _HEADER.size + _CRC.size:
+        return None
+    body, crc = raw[:-_CRC.size], _CRC.unpack(raw[-_CRC.size:])[0]
+    if zlib.crc32(body) != crc:
+        return None
+    magic, file_size, count = _HEADER.unpack_from(body, 0)
+    if magic != JOURNAL_MAGIC:
+        return None
+
+    entries = []
+    pos = _HEADER.size
+    for _ in range(count):
+        offset, length = _ENTRY.unpack_from(body, pos)
+        pos += _ENTRY.size
+        entries.append((offset, body[pos:pos + length]))
+        pos += length
+    return file_size, entries
+
+
+def discard_journal(file_path: str):
+    for path in (journal_path(file_path), journal_path(file_path) + '.tmp'):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def recover_journal(file_path: str) -> bool:
+    """若存在上次中断保存留下的日志，用其中的原始数据回滚文件
+
+    返回是否执行了回滚。只有临时日志说明中断发生在日志落盘之前，
+    原文件尚未改动，直接删除即可。
+    """
+    if not os.path.exists(journal_path(file_path)):
+        discard_journal(file_path)
+        return False
+
+    journal = read_journal(file_path)
+    if journal is None:
+        print(f"保存日志已损坏，已忽略: {journal_path(file_path)}")
+        discard_journal(file_path)
+        return False
+
+    file_size, entries = journal
+    with open(file_path, 'r+b') as f:
+        for offset, old in entries:
+            _pwrite(f, offset, old)
+        f.truncate(file_size)
+        _fsync(f)
+    discard_journal(file_path)
+    print(f"检测到未完成的保存，已回滚 {len(entries)} 处修改: {file_path}")
+    return True
+
+
+def write_ranges(file_path: str, ranges: Iterable[Range], journal: bool = True):
+    """原地写入修改过的区间
+
+    journal 为 True 时先把这些区间的原始内容写入日志，写入完成并落盘
+    后再删除日志；中途崩溃时可用 recover_journal 回滚。
+    """
+    ranges = [(offset, bytes(data)) for offset, data in ranges]
+    if not ranges:
+        return
+    with open(file_path, 'r+b') as f:
+        if journal:
+            file_size = os.fstat(f.fileno()).st_size
+            entries = []
+            for offset, data in ranges:
+                f.seek(offset)
+                entries.append((offset, f.read(len(data))))
+            write_journal(file_path, entries, file_size)
+        for offset, data in ranges:
+            _pwrite(f, offset, data)
+        _fsync(f)
+    if journal:
+        discard_journal(file_path)
@@ -0,0 +1,493 @@
+import argparse
+import json
+import mmap
+import os
+import sys
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+
+from cli_output import silence_broken_pipe
+from dat_schema import DAT_HEADER, SECTION_COUNT, SECTION_ENTRY, SECTION_TABLE_OFFSET, Section
+from document import DocumentReader
+from encoded_strings import EncodingScanner, iter_decoded, parse_encodings
+from entropy_map import iter_regions, iter_window_stats
+from file_carver import FileCarver, save_carved
+from file_handler import NON_TEXT_PATTERN, FileHandler
+from keyword_search import scan_keywords_range
+from layout_detector import detect_layout, iter_block_layouts, layout_to_dict
+from ngram_stats import BINCOUNT_MAX_WIDTH, HeavyHitters, NGramResult, dense_top, iter_packed_ngrams, unpack_ngram
+from pattern_search import compile_pattern
+from string_scanner import scan_strings_range
+from structure_scanner import scan_range
+
+# 每个流式窗口的字节数，决定单次分析的内存上限
+WINDOW_SIZE = 16*1024*1024
+# 结构扫描在窗口内再细分的块大小（每块的临时数组约为块大小的 8 倍）
+STRUCTURE_CHUNK = 1024*1024
+# n-gram 的分块与 count_ngrams 的默认值一致，近似计数时结果才完全相同
+NGRAM_CHUNK = 4*1024*1024
+# 已处理的映射页面累计到这么多字节时归还一次
+RECLAIM_STEP = 64*1024*1024
+
+
+class PageReclaimer:
+    """把已经处理过的映射页面还给系统
+
+    顺序读 mmap 时，读过的页面会一直算在进程的常驻内存里，扫描 20GB 的
+    文件时常驻内存会涨到 20GB（虽然可被回收，但会挤掉其他程序的页缓存）。
+    扫描位置每前进 RECLAIM_STEP 字节就对之前的区域调用
+    madvise(MADV_DONTNEED)：只读共享映射的页面仍在页缓存中，再次访问时
+    重新映射即可，不影响正确性。不支持 madvise 的平台上什么也不做。
+    """
+
+    def __init__(self, mapped: Optional[mmap.mmap], step: int = RECLAIM_STEP):
+        self.mapped = mapped if hasattr(mmap, 'MADV_DONTNEED') and hasattr(mapped, 'madvise') else None
+        self.step = step
+        self.done = 0
+        if self.mapped is not None and hasattr(mmap, 'MADV_SEQUENTIAL'):
+            try:
+                self.mapped.madvise(mmap.MADV_SEQUENTIAL)
+            except OSError:
+                pass
+
+    def advance(self, offset: int, force: bool = False):
+        """offset 之前的数据已不再需要"""
+        if self.mapped is None:
+            return
+        end = offset - offset % mmap.PAGESIZE
+        if end - self.done < self.step and not (force and end > self.done):
+            return
+        try:
+            self.mapped.madvise(mmap.MADV_DONTNEED, self.done, end - self.done)
+        except (OSError, ValueError):
+            self.mapped = None
+            return
+        self.done = end
+
+    def rewind(self):
+        """开始新一遍扫描"""
+        self.advance(self.done, force=True)
+        self.done = 0
+
+
+class StreamingAnalyzer(DocumentReader):
+    """流式分析大文件（可大于内存、超过 4GB）
+
+    文件按 window_size 切成有界的窗口依次扫描，每种分析都以生成器产出结果，
+    偏移一律是 Python 整数（64 位安全）。扫描过的页面由 PageReclaimer
+    归还，峰值内存只与窗口大小有关，与文件大小无关。跨窗口的结果沿用
+    并行扫描的约定：归属于起点所在的窗口，扫描时可越过窗口末尾读取。
+    """
+
+    def __init__(self, file_path, document=None, window_size=WINDOW_SIZE):
+        super().__init__(file_path, document)
+        self.window_size = window_size
+        self.reclaimer = None
+
+    def read_file(self):
+        if not super().read_file():
+            return False
+        self.reclaimer = PageReclaimer(self._attached.mmap)
+        return True
+
+    def cleanup(self):
+        self.reclaimer = None
+        super().cleanup()
+
+    @property
+    def size(self) -> int:
+        return len(self.data) if self.data is not None else 0
+
+    def iter_windows(self, start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[int, int]]:
+        """依次产出 (窗口起点, 窗口终点)，每个窗口处理完后归还之前的页面"""
+        if not self.data:
+            print("请先读取文件")
+            return
+        end = self.size if end is None else min(end, self.size)
+        self.reclaimer.rewind()
+        for window_start in range(start, end, self.window_size):
+            window_end = min(window_start + self.window_size, end)
+            yield window_start, window_end
+            self.reclaimer.advance(window_start)
+        self.reclaimer.advance(end, force=True)
+
+    def iter_strings(self, min_length=4):
+        """逐个产出 StringHit(offset, length, text)"""
+        for start, end in self.iter_windows():
+            yield from scan_strings_range(self.data, start, end, min_length)
+
+    def iter_encoded_strings(self, encodings=None):
+        """逐个产出多编码字符串 EncodedString(offset, length, encoding, text)"""
+        scanner = EncodingScanner(parse_encodings(encodings))
+        for start, end in self.iter_windows():
+            for _, runs in scanner.iter_chunk_runs(self.data, start, end):
+                yield from iter_decoded(self.data, runs)
+
+    def iter_keywords(self, keywords):
+        """逐个产出 (关键词, 偏移)"""
+        keywords = list(keywords)
+        for start, end in self.iter_windows():
+            yield from scan_keywords_range(self.data, start, end, keywords)
+
+    def iter_pattern(self, pattern, kind='hex'):
+        """逐个产出十六进制特征或字节正则的匹配 (偏移, 长度)"""
+        compiled = compile_pattern(pattern, kind)
+        # 正则匹配互不重叠，下一个窗口从上一个匹配的结尾继续
+        last_end = 0
+        for start, end in self.iter_windows():
+            for _, offsets, lengths in compiled.iter_chunk_matches(self.data, max(start, last_end), end):
+                if kind == 'regex' and len(offsets):
+                    last_end = int(offsets[-1] + lengths[-1])
+                yield from zip(offsets.tolist(), lengths.tolist())
+
+    def iter_structures(self, max_count=1000, max_size=1000):
+        """按窗口产出 StructureCandidates 数组"""
+        for start, end in self.iter_windows():
+            for chunk_start in range(start, end, STRUCTURE_CHUNK):
+                candidates = scan_range(self.data, chunk_start, min(chunk_start + STRUCTURE_CHUNK, end),
+                                        max_count, max_size)
+                if len(candidates.offsets):
+                    yield candidates
+
+    def iter_regions(self, window=4096, stride=None):
+        """逐个产出 Region，只保留当前批次的窗口统计"""
+        if not self.data:
+            print("请先读取文件")
+            return
+
+        def parts():
+            self.reclaimer.rewind()
+            for stats in iter_window_stats(self.data, window, stride):
+                yield stats
+                self.reclaimer.advance(int(stats.offsets[0]))
+
+        yield from iter_regions(parts(), self.size)
+        self.reclaimer.advance(self.size, force=True)
+
+    def iter_sections(self, table_offset=SECTION_TABLE_OFFSET, count_layout=SECTION_COUNT,
+                      entry_layout=SECTION_ENTRY):
+        """沿段表逐个产出 Section(type, size, offset)，不建立整表索引
+
+        段大小按文件格式为 32 位，段偏移逐段累加，可超过 4GB。
+        段表在文件内不完整时在最后一个完整的段之后停止。
+        """
+        if not self.data:
+            print("请先读取文件")
+            return
+        total = self.size
+        if table_offset + count_layout.size > total:
+            return
+        declared = count_layout.unpack_tuple(self.data, table_offset)[0]
+        offset = table_offset + count_layout.size
+        unpack_from = entry_layout.struct.unpack_from
+        self.reclaimer.rewind()
+        for _ in range(declared):
+            if offset + entry_layout.size > total:
+                break
+            values = unpack_from(self.data, offset)
+            offset += entry_layout.size
+            yield Section(values[0], values[1], offset)
+            offset += values[1]
+            self.reclaimer.advance(min(offset, total))
+
+    def iter_layouts(self):
+        """逐段检测重复记录数组，产出 (段序号, RecordLayout)；没有段表时逐窗口按块检测，段序号为 None"""
+        # 段表完整时才按段检测：没有段表的文件开头被当成段数时，解析出的段是无意义的
+        sections = list(self.iter_sections())
+        if (sections and self.size >= SECTION_TABLE_OFFSET + SECTION_COUNT.size
+                and len(sections) == SECTION_COUNT.unpack_tuple(self.data, SECTION_TABLE_OFFSET)[0]
+                and sections[-1].offset + sections[-1].size <= self.size):
+            self.reclaimer.rewind()
+            for i, section in enumerate(sections):
+                layout = detect_layout(self.data, section.offset, section.offset + section.size)
+                if layout is not None:
+                    yield i, layout
+                self.reclaimer.advance(section.offset + section.size)
+            return
+        for start, end in self.iter_windows():
+            for layout in iter_block_layouts(self.data, start, end):
+                yield None, layout
+
+    def iter_carved(self, names=None):
+        """逐个产出内嵌文件 CarvedFile，跨窗口的文件只在起点所在的窗口中产出"""
+        carver = FileCarver(names)
+        covered = 0
+        for start, end in self.iter_windows():
+            for carved in carver.iter_carved(self.data, max(start, covered), end):
+                covered = carved.offset + carved.length
+                yield carved
+
+    def iter_hex_dump(self, bytes_per_line=16, offset=0, length=None):
+        """逐行产出十六进制转储"""
+        handler = FileHandler(self.file_path, self.document)
+        if not handler.read_file():
+            return
+        try:
+            for index, line in enumerate(handler.iter_hex_dump(bytes_per_line, offset, length)):
+                yield line
+                if not index % 65536:
+                    self.reclaimer.advance(offset + index * bytes_per_line)
+        finally:
+            handler.cleanup()
+
+    def parse_header(self):
+        """解析文件头；文件头中的大小字段为 32 位，另给出实际的 64 位文件大小"""
+        if not self.data or self.size < DAT_HEADER.size:
+            return None
+        header = DAT_HEADER.unpack(self.data)
+        header['magic'] = header['magic'].decode('ascii', errors='ignore').strip('\x00')
+        header['actual_size'] = self.size
+        return header
+
+    def byte_histogram(self):
+        """逐窗口统计字节频率"""
+        hist = np.zeros(256, dtype=np.int64)
+        for start, end in self.iter_windows():
+            hist += np.bincount(np.frombuffer(self.data, dtype=np.uint8, count=end - start, offset=start),
+                                minlength=256)
+        return hist
+
+    def count_ngrams(self, width=4, top_k=10):
+        """与 ngram_stats.count_ngrams 相同，扫描时归还页面"""
+        total = max(self.size - width + 1, 0)
+        exact = width <= BINCOUNT_MAX_WIDTH
+        if exact:
+            counts = np.zeros(1 << (8 * width), dtype=np.int64)
+        else:
+            summary = HeavyHitters()
+        self.reclaimer.rewind()
+        for index, packed in enumerate(iter_packed_ngrams(self.data, width, NGRAM_CHUNK)):
+            if exact:
+                counts += np.bincount(packed.astype(np.intp), minlength=len(counts))
+            else:
+                keys, key_counts = np.unique(packed, return_counts=True)
+                summary.update(keys, key_counts.astype(np.int64))
+            self.reclaimer.advance(index * NGRAM_CHUNK)
+        self.reclaimer.advance(self.size, force=True)
+        if exact:
+            return NGramResult(width, total, dense_top(counts, width, top_k), True)
+        top = [(unpack_ngram(value, width), count) for value, count in summary.top(top_k)]
+        return NGramResult(width, total, top, summary.exact)
+
+    def find_patterns(self, widths=(4,), top_k=5):
+        """字节频率和常见 n-gram，结果格式与 DataAnalyzer.find_patterns 相同"""
+        if not self.data:
+            print("请先读取文件")
+            return None
+        hist = self.byte_histogram()
+        byte_freq = [(int(b), int(hist[b])) for b in np.argsort(-hist, kind='stable')[:10] if hist[b]]
+        return {'byte_freq': byte_freq, 'patterns': {width: self.count_ngrams(width, top_k) for width in widths}}
+
+    def is_text_file(self):
+        """整个文件是否只含文本字节，遇到第一个非文本字节即停止"""
+        for start, end in self.iter_windows():
+            if NON_TEXT_PATTERN.search(self.data, start, end):
+                return False
+        return True
+
+
+def iter_file_records(file_path: str, options: dict, window_size: int = WINDOW_SIZE) -> Iterator[dict]:
+    """流式分析单个文件，边扫描边产出 batch_cli 格式的 JSON 记录
+
+    命中记录先产出，汇总的 'file' 记录在最后（其中的计数要扫描完才知道）。
+    与 batch_cli 的区别：段表不在汇总记录中展开，只给出段数，--hits 时每段一条记录。
+    """
+    record = {'file': file_path, 'type': 'file', 'size': os.path.getsize(file_path), 'streamed': True}
+    if not record['size']:
+        record['error'] = '空文件'
+        yield record
+        return
+
+    analyzer = StreamingAnalyzer(file_path, window_size=window_size)
+    if not analyzer.read_file():
+        record['error'] = '无法读取文件'
+        yield record
+        return
+    try:
+        analyses = options['analyses']
+        emit_hits = options['hits']
+
+        if 'header' in analyses:
+            record['header'] = analyzer.parse_header()
+
+        if 'sections' in analyses:
+            count = 0
+            end = None
+            for section in analyzer.iter_sections():
+                count += 1
+                end = section.offset + section.size
+                if emit_hits:
+                    yield {'file': file_path, 'type': 'section', 'index': count - 1, 'section_type': section.type,
+                           'size': section.size, 'offset': section.offset}
+            record['sections'] = {'count': count, 'end': end}
+
+        if 'strings' in analyses:
+            if options.get('encodings'):
+                counts = dict.fromkeys(options['encodings'], 0)
+                for hit in analyzer.iter_encoded_strings(options['encodings']):
+                    counts[hit.encoding] += 1
+                    if emit_hits:
+                        yield {'file': file_path, 'type': 'string', 'offset': hit.offset, 'length': hit.length,
+                               'encoding': hit.encoding, 'text': hit.text}
+                record['strings'] = {'count': sum(counts.values()), 'encodings': counts}
+            else:
+                count = 0
+                for hit in analyzer.iter_strings(options['min_length']):
+                    count += 1
+                    if emit_hits:
+                        yield {'file': file_path, 'type': 'string', 'offset': hit.offset,
+                               'length': hit.length, 'text': hit.text}
+                record['strings'] = {'count': count}
+
+        if 'keywords' in analyses and options['keywords']:
+            counts = {keyword: 0 for keyword in options['keywords']}
+            for keyword, offset in analyzer.iter_keywords(options['keywords']):
+                counts[keyword] += 1
+                if emit_hits:
+                    yield {'file': file_path, 'type': 'keyword', 'keyword': keyword, 'offset': offset}
+            record['keywords'] = counts
+
+        if 'signatures' in analyses and options['signatures']:
+            record['signatures'] = {}
+            for pattern, kind in options['signatures']:
+                count = 0
+                first = None
+                for offset, length in analyzer.iter_pattern(pattern, kind):
+                    if first is None:
+                        first = offset
+                    count += 1
+                    if emit_hits:
+                        yield {'file': file_path, 'type': 'signature', 'pattern': pattern,
+                               'offset': offset, 'length': length}
+                record['signatures'][pattern] = {'count': count, 'first': first}
+
+        if 'patterns' in analyses:
+            result = analyzer.find_patterns(options['widths'], options['top'])
+            if result:
+                record['patterns'] = {
+                    'byte_freq': result['byte_freq'],
+                    'ngrams': {
+                        str(width): {
+                            'total': ngrams.total,
+                            'exact': ngrams.exact,
+                            'top': [[pattern.hex(), count] for pattern, count in ngrams.top]
+                        } for width, ngrams in result['patterns'].items()
+                    }
+                }
+
+        if 'regions' in analyses:
+            count = 0
+            totals = {}
+            for region in analyzer.iter_regions(options['window']):
+                count += 1
+                totals[region.kind] = totals.get(region.kind, 0) + region.end - region.start
+                if emit_hits:
+                    yield {'file': file_path, 'type': 'region', 'start': region.start, 'end': region.end,
+                           'kind': region.kind, 'entropy': region.entropy}
+            record['regions'] = {'count': count, 'bytes': totals}
+
+        if 'structures' in analyses:
+            count = 0
+            for candidates in analyzer.iter_structures():
+                count += len(candidates.offsets)
+                if emit_hits:
+                    for i in range(len(candidates.offsets)):
+                        yield {
+                            'file': file_path,
+                            'type': 'structure',
+                            'offset': int(candidates.offsets[i]),
+                            'count': int(candidates.counts[i]),
+                            'size': int(candidates.sizes[i]),
+                            'big_endian': bool(candidates.big_endian[i])
+                        }
+            record['structures'] = {'count': count}
+
+        if 'layouts' in analyses:
+            count = 0
+            for section, layout in analyzer.iter_layouts():
+                count += 1
+                if emit_hits:
+                    yield dict({'file': file_path, 'type': 'layout', 'section': section}, **layout_to_dict(layout))
+            record['layouts'] = {'count': count}
+
+        if 'carve' in analyses:
+            types = {}
+            output_dir = None
+            if options.get('carve_dir'):
+                output_dir = os.path.join(options['carve_dir'], os.path.basename(file_path))
+                os.makedirs(output_dir, exist_ok=True)
+            for carved in analyzer.iter_carved():
+                types[carved.name] = types.get(carved.name, 0) + 1
+                path = save_carved(analyzer.data, carved, output_dir) if output_dir else None
+                if emit_hits:
+                    yield {'file': file_path, 'type': 'carved', 'offset': carved.offset,
+                           'length': carved.length, 'name': carved.name, 'path': path}
+            record['carve'] = {'count': sum(types.values()), 'types': types}
+    except Exception as e:
+        record['error'] = str(e)
+    finally:
+        analyzer.cleanup()
+    yield record
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='流式分析大文件（可大于内存），结果以 JSON Lines 边扫描边输出')
+    parser.add_argument('file', help='要分析的文件')
+    parser.add_argument('-a', '--analyses', default='header,strings',
+                        help='逗号分隔的分析项：header,sections,strings,keywords,signatures,patterns,structures,regions,layouts,carve')
+    parser.add_argument('-k', '--keywords', default='', help='逗号分隔的关键词')
+    parser.add_argument('-s', '--signature', action='append', default=[], help='十六进制特征，可重复')
+    parser.add_argument('--regex', action='append', default=[], help='字节正则表达式，可重复')
+    parser.add_argument('--min-length', type=int, default=4, help='字符串最小长度')
+    parser.add_argument('--encodings', default=None, help="多编码字符串提取，如 'ascii,gbk,utf-16le:6'")
+    parser.add_argument('--widths', default='4', help='n-gram 宽度，逗号分隔')
+    parser.add_argument('--top', type=int, default=5, help='每个宽度输出的常见模式数')
+    parser.add_argument('--window', type=int, default=4096, help='区域划分的窗口大小（字节）')
+    parser.add_argument('--hits', action='store_true', help='为每个命中单独输出一行')
+    parser.add_argument('--window-size', default='16M', help='流式窗口大小，如 16M（决定内存上限）')
+    args = parser.parse_args(argv)
+
+    from batch_cli import ANALYSES, parse_list
+    from synthetic_dat import parse_size
+
+    analyses = ANALYSES if args.analyses == 'all' else parse_list(args.analyses)
+    unknown = [name for name in analyses if name not in ANALYSES]
+    if unknown:
+        print(f"未知的分析项: {', '.join(unknown)}", file=sys.stderr)
+        return 2
+    try:
+        options = {
+            'analyses': set(analyses),
+            'keywords': parse_list(args.keywords),
+            'signatures': [(pattern, 'hex') for pattern in args.signature] +
+                          [(pattern, 'regex') for pattern in args.regex],
+            'min_length': args.min_length,
+            'encodings': parse_encodings(None if args.encodings == 'all' else args.encodings)
+            if args.encodings else None,
+            'widths': tuple(int(width) for width in parse_list(args.widths)),
+            'top': args.top,
+            'window': args.window,
+            'hits': args.hits
+        }
+        for pattern, kind in options['signatures']:
+            compile_pattern(pattern, kind)
+        window_size = parse_size(args.window_size)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    failed = False
+    try:
+        for record in iter_file_records(args.file, options, window_size):
+            failed |= 'error' in record
+            sys.stdout.write(json.dumps(record, ensure_ascii=False, default=str))
+            sys.stdout.write('\n')
+    except BrokenPipeError:
+        silence_broken_pipe()
+        return 0
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+import re
+from collections import namedtuple
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+
+# 单条字符串命中：起始偏移、字节长度、文本
+StringHit = namedtuple('StringHit', ['offset', 'length', 'text'])
+
+# 可打印ASCII范围 (32-126)
+PRINTABLE_CLASS = rb'[\x20-\x7e]'
+
+_pattern_cache = {}
+_RUN_PATTERN = re.compile(PRINTABLE_CLASS + rb'*')
+
+
+def compile_string_pattern(min_length: int = 4):
+    """编译匹配连续可打印字符的正则，按最小长度缓存"""
+    min_length = max(1, int(min_length))
+    pattern = _pattern_cache.get(min_length)
+    if pattern is None:
+        pattern = re.compile(PRINTABLE_CLASS + rb'{%d,}' % min_length)
+        _pattern_cache[min_length] = pattern
+    return pattern
+
+
+def iter_strings(data, min_length: int = 4, start: int = 0, end: int = None) -> Iterator[StringHit]:
+    """在缓冲区中逐个产出可打印字符串
+
+    data 可以是 bytes、mmap 或 memoryview，扫描由正则引擎在C层完成，
+    不会复制整个文件。
+    """
+    if end is None:
+        end = len(data)
+    pattern = compile_string_pattern(min_length)
+    for match in pattern.finditer(data, start, end):
+        offset = match.start()
+        raw = match.group()
+        yield StringHit(offset, len(raw), raw.decode('ascii'))
+
+
+def find_strings(data, min_length: int = 4) -> List[StringHit]:
+    """返回全部可打印字符串命中（含偏移和长度）"""
+    return list(iter_strings(data, min_length))
+
+
+def scan_strings_range(data, start: int, end: int, min_length: int = 4) -> List[StringHit]:
+    """返回起始偏移位于 [start, end) 内的字符串（并行扫描内核）
+
+    字符串可以延伸到 end 之后；若 start 处的字符串实际从前一块开始，
+    则归前一块所有，这里跳过，保证分块结果不重复也不截断。
+    """
+    hits = []
+    owned_before = start > 0 and 0x20 <= data[start - 1] <= 0x7e
+    # 只需多看 min_length-1 字节就能发现所有从本块开始的字符串
+    stop = min(end + min_length - 1, len(data))
+    for hit in iter_strings(data, min_length, start, stop):
+        if hit.offset >= end:
+            break
+        if owned_before and hit.offset == start:
+            continue
+        if hit.offset + hit.length == stop and stop < len(data):
+            # 被扫描边界截断的字符串，继续向后延伸到结尾
+            tail = _RUN_PATTERN.match(data, stop).end()
+            hit = StringHit(hit.offset, tail - hit.offset, bytes(data[hit.offset:tail]).decode('ascii'))
+        hits.append(hit)
+    return hits
+
+
+def hits_to_arrays(hits: List[StringHit]) -> Tuple[Dict[str, np.ndarray], dict]:
+    """把字符串命中压缩为偏移/长度数组（文本可从原文件还原）"""
+    offsets = np.fromiter((hit.offset for hit in hits), dtype=np.uint64, count=len(hits))
+    lengths = np.fromiter((hit.length for hit in hits), dtype=np.uint32, count=len(hits))
+    return {'offsets': offsets, 'lengths': lengths}, {}
+
+
+def hits_from_arrays(data, arrays: Dict[str, np.ndarray]) -> List[StringHit]:
+    """根据偏移/长度数组从缓冲区还原字符串命中"""
+    hits = []
+    for offset, length in zip(arrays['offsets'].tolist(), arrays['lengths'].tolist()):
+        hits.append(StringHit(offset, length, bytes(data[offset:offset + length]).decode('ascii')))
+    return hits
+
+
+def string_cache_kind(min_length: int) -> str:
+    return f"strings-ascii-min{min_length}"
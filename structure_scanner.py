@@ -0,0 +1,102 @@
+from collections import namedtuple
+from typing import Dict, Iterator, Tuple
+
+import numpy as np
+
+# 候选数组结构，各字段均为等长的 numpy 数组
+#   offsets    : 候选头部偏移 (uint64)
+#   counts     : 元素数量 (uint32)
+#   sizes      : 元素大小 (uint32)
+#   big_endian : True 表示按大端读取 (bool)
+StructureCandidates = namedtuple('StructureCandidates', ['offsets', 'counts', 'sizes', 'big_endian'])
+
+ENDIAN_DTYPES = {'>': np.dtype('>u4'), '<': np.dtype('<u4')}
+
+
+def empty_candidates() -> StructureCandidates:
+    return StructureCandidates(
+        np.empty(0, dtype=np.uint64),
+        np.empty(0, dtype=np.uint32),
+        np.empty(0, dtype=np.uint32),
+        np.empty(0, dtype=bool)
+    )
+
+
+def concat_candidates(parts) -> StructureCandidates:
+    """合并多段候选结果"""
+    parts = [p for p in parts if len(p.offsets)]
+    if not parts:
+        return empty_candidates()
+    return StructureCandidates(*(np.concatenate(field) for field in zip(*parts)))
+
+
+def candidates_to_arrays(candidates: StructureCandidates) -> Tuple[Dict[str, np.ndarray], dict]:
+    return candidates._asdict(), {}
+
+
+def candidates_from_arrays(arrays: Dict[str, np.ndarray], meta: dict = None) -> StructureCandidates:
+    return StructureCandidates(**arrays)
+
+
+def structure_cache_kind(max_count: int = 1000, max_size: int = 1000) -> str:
+    return f"structures-count{max_count}-size{max_size}"
+
+
+def scan_range(data, start: int, end: int, max_count: int = 1000, max_size: int = 1000,
+               endians=('>', '<'), file_size: int = None) -> StructureCandidates:
+    """扫描头部偏移位于 [start, end) 内的候选结构
+
+    每个偏移处把相邻两个 uint32 分别当作元素数量和元素大小；
+    4种对齐方式各取一个 uint32 视图，判断条件全部以数组掩码完成。
+    最多会读取到 end + 8 字节处。data 只是文件的一个片段时，
+    file_size 给出片段起点到文件结尾的长度，用于判断数组主体是否越界。
+    """
+    if file_size is None:
+        file_size = len(data)
+    stop = min(end + 8, len(data))
+    offsets, counts, sizes, flags = [], [], [], []
+
+    for endian in endians:
+        dtype = ENDIAN_DTYPES[endian]
+        for align in range(4):
+            base = start + align
+            words = (stop - base) // 4
+            if words < 2:
+                continue
+            view = np.frombuffer(data, dtype=dtype, count=words, offset=base)
+            count = view[:-1]
+            size = view[1:]
+            positions = base + 4 * np.arange(words - 1, dtype=np.uint64)
+
+            mask = (count > 0) & (count < max_count) & (size > 0) & (size < max_size)
+            mask &= positions < end
+            # 数组主体 count*size 必须落在文件内
+            mask &= positions + 8 + count.astype(np.uint64) * size.astype(np.uint64) <= file_size
+
+            hit = np.flatnonzero(mask)
+            if len(hit):
+                offsets.append(positions[hit])
+                counts.append(count[hit].astype(np.uint32))
+                sizes.append(size[hit].astype(np.uint32))
+                flags.append(np.full(len(hit), endian == '>', dtype=bool))
+
+    if not offsets:
+        return empty_candidates()
+    result = StructureCandidates(
+        np.concatenate(offsets), np.concatenate(counts),
+        np.concatenate(sizes), np.concatenate(flags)
+    )
+    order = np.lexsort((~result.big_endian, result.offsets))
+    return StructureCandidates(*(field[order] for field in result))
+
+
+def iter_structure_chunks(data, chunk_size: int = 1024*1024, **kwargs) -> Iterator[StructureCandidates]:
+    """按块产出候选结构，内存占用与块大小成正比"""
+    for chunk_start in range(0, len(data), chunk_size):
+        chunk_end = min(chunk_start + chunk_size, len(data))
+        yield scan_range(data, chunk_start, chunk_end, **kwargs)
+
+
+def scan_structures(data, chunk_size: int = 1024*1024, **kwargs) -> StructureCandidates:
+    """扫描整个缓冲区，返回按偏移排序的候选结构"""
+    return concat_candidates(iter_structure_chunks(data, chunk_size, **kwargs))
@@ -0,0 +1,181 @@
+import argparse
+import re
+import struct
+import sys
+import time
+from typing import Iterator, List, Sequence, Tuple
+
+import numpy as np
+
+from dat_schema import DAT_HEADER, SECTION_COUNT, SECTION_ENTRY
+
+SYNTHETIC_MAGIC = b'SYNTHETICDAT'
+DEFAULT_KEYWORDS = ('HashVer1.4', 'Kill', 'PlayerName', 'SaveSlot')
+
+# 段类型及其在文件中出现的权重
+SECTION_KINDS = ('text', 'array', 'zero', 'random', 'pattern')
+SECTION_WEIGHTS = (0.25, 0.25, 0.1, 0.2, 0.2)
+SECTION_TYPE_IDS = {kind: 0x1000 + i for i, kind in enumerate(SECTION_KINDS)}
+
+# 段负载大小范围
+MIN_SECTION = 256
+MAX_SECTION = 256*1024
+# 每次写入的最大字节数，生成 GB 级文件时内存占用不随文件增大
+WRITE_CHUNK = 4*1024*1024
+
+_WORDS = (b'alpha', b'beta', b'gamma', b'delta', b'item', b'level', b'score', b'map',
+          b'quest', b'name', b'config', b'value', b'enemy', b'weapon', b'armor')
+
+
+def parse_size(text: str) -> int:
+    """解析 '1M'、'512K'、'4G' 这样的大小"""
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([KMGkmg]?)[Bb]?\s*', text)
+    if not match:
+        raise ValueError(f"无效的大小: {text}")
+    scale = {'': 1, 'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}[match.group(2).upper()]
+    return int(float(match.group(1)) * scale)
+
+
+def format_size_label(size: int) -> str:
+    for unit, scale in (('G', 1 << 30), ('M', 1 << 20), ('K', 1 << 10)):
+        if size >= scale and size % scale == 0:
+            return f"{size // scale}{unit}"
+    return str(size)
+
+
+def plan_sections(size: int, rng: np.random.Generator) -> List[Tuple[str, int]]:
+    """决定各段的类型和负载大小，使文件总大小恰好为 size"""
+    overhead = DAT_HEADER.size + SECTION_COUNT.size
+    sections = []
+    remaining = size - overhead
+    while remaining > SECTION_ENTRY.size:
+        payload = int(rng.integers(MIN_SECTION, MAX_SECTION + 1))
+        payload = min(payload, remaining - SECTION_ENTRY.size)
+        kind = SECTION_KINDS[int(rng.choice(len(SECTION_KINDS), p=SECTION_WEIGHTS))]
+        sections.append((kind, payload))
+        remaining -= SECTION_ENTRY.size + payload
+    if remaining > 0 and sections:
+        # 不足一个段头的零头并入最后一段
+        kind, payload = sections[-1]
+        sections[-1] = (kind, payload + remaining)
+    return sections
+
+
+def _text_payload(size: int, rng: np.random.Generator, keywords: Sequence[bytes]) -> bytes:
+    """文本段：单词加编号，约 5% 为关键词，以空格或 0 分隔"""
+    vocabulary = list(_WORDS) + list(keywords)
+    weights = np.full(len(vocabulary), 0.95 / len(_WORDS))
+    if keywords:
+        weights[len(_WORDS):] = 0.05 / len(keywords)
+    weights /= weights.sum()
+    # 按平均词长一次性抽取足够多的单词，避免逐词调用随机数生成器
+    count = size // 8 + 16
+    words = rng.choice(len(vocabulary), count, p=weights).tolist()
+    numbers = rng.integers(0, 1000, count).tolist()
+    separators = np.where(rng.random(count) < 0.3, 0, 0x20).tolist()
+    pieces = [b'%s_%d%c' % (vocabulary[w], n, s) for w, n, s in zip(words, numbers, separators)]
+    data = b''.join(pieces)
+    while len(data) < size:
+        data += data
+    return data[:size]
+
+
+def _array_payload(size: int, rng: np.random.Generator) -> bytes:
+    """数组段：大端 (元素数量, 元素大小) 头部后跟元素，可被结构分析识别"""
+    parts = []
+    total = 0
+    while total + 8 <= size:
+        element = int(rng.choice((2, 4, 8, 12, 16, 32)))
+        count = int(rng.integers(1, 200))
+        body = min(count * element, size - total - 8)
+        count = max(body // element, 0)
+        if not count:
+            break
+        elements = rng.integers(0, 1 << 16, count * element // 2, dtype=np.uint16).astype('>u2').tobytes()
+        parts.append(struct.pack('>II', count, element) + elements[:count * element])
+        total += 8 + count * element
+    parts.append(b'\x00' * (size - total))
+    return b''.join(parts)
+
+
+def _pattern_payload(size: int, rng: np.random.Generator) -> bytes:
+    """重复的小记录，带递增计数，n-gram 统计会集中在这些模式上"""
+    record = rng.integers(0, 256, int(rng.integers(4, 17)), dtype=np.uint8)
+    repeats = size // len(record) + 1
+    data = np.tile(record, repeats)[:size]
+    counter = np.arange(len(data) // len(record), dtype=np.uint8)
+    data[:len(counter) * len(record):len(record)] = counter
+    return data.tobytes()
+
+
+def section_payload(kind: str, size: int, rng: np.random.Generator, keywords: Sequence[bytes]) -> bytes:
+    if kind == 'text':
+        return _text_payload(size, rng, keywords)
+    if kind == 'array':
+        return _array_payload(size, rng)
+    if kind == 'zero':
+        return bytes(size)
+    if kind == 'random':
+        return rng.integers(0, 256, size, dtype=np.uint8).tobytes()
+    return _pattern_payload(size, rng)
+
+
+def iter_synthetic_chunks(size: int, seed: int = 0, keywords: Sequence = DEFAULT_KEYWORDS,
+                          timestamp: int = 1700000000) -> Iterator[bytes]:
+    """按 DatParser 布局逐块产出合成文件内容（文件头、段数量、各段）
+
+    相同的 size 和 seed 总是生成相同的内容。
+    """
+    rng = np.random.default_rng(seed)
+    keywords = [k.encode('utf-8') if isinstance(k, str) else bytes(k) for k in keywords]
+    sections = plan_sections(size, rng)
+
+    header = DAT_HEADER.struct.pack(SYNTHETIC_MAGIC, 1, size & 0xFFFFFFFF, timestamp)
+    pending = [header, SECTION_COUNT.struct.pack(len(sections))]
+    pending_size = sum(map(len, pending))
+    written = 0
+    for kind, payload_size in sections:
+        pending.append(SECTION_ENTRY.struct.pack(SECTION_TYPE_IDS[kind], payload_size))
+        payload = section_payload(kind, payload_size, rng, keywords)
+        pending.append(payload)
+        pending_size += SECTION_ENTRY.size + len(payload)
+        if pending_size >= WRITE_CHUNK:
+            chunk = b''.join(pending)
+            written += len(chunk)
+            yield chunk
+            pending, pending_size = [], 0
+    # 文件太小放不下任何段时截断或用零补齐
+    chunk = b''.join(pending)[:size - written]
+    chunk += bytes(size - written - len(chunk))
+    if chunk:
+        yield chunk
+
+
+def generate_dat(file_path: str, size: int, seed: int = 0, keywords: Sequence = DEFAULT_KEYWORDS) -> int:
+    """生成合成 .dat 文件，返回写入的字节数"""
+    written = 0
+    with open(file_path, 'wb') as f:
+        for chunk in iter_synthetic_chunks(size, seed, keywords):
+            f.write(chunk)
+            written += len(chunk)
+    return written
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='按 DatParser 布局生成合成 .dat 测试文件')
+    parser.add_argument('output', help='输出文件路径')
+    parser.add_argument('--size', default='1M', help='文件大小，如 1M、256M、4G（默认 1M）')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子，相同种子生成相同文件')
+    parser.add_argument('--keywords', default=','.join(DEFAULT_KEYWORDS), help='嵌入文本段的关键词，逗号分隔')
+    args = parser.parse_args(argv)
+
+    size = parse_size(args.size)
+    keywords = [k for k in args.keywords.split(',') if k]
+    started = time.perf_counter()
+    written = generate_dat(args.output, size, args.seed, keywords)
+    print(f"已生成 {args.output}: {written} 字节，用时 {time.perf_counter() - started:.2f} 秒")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
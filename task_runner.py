@@ -0,0 +1,194 @@
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from instrumentation import instrumentation
+
+
+class TaskCancelled(Exception):
+    """任务被取消"""
+
+
+def format_size(size: float) -> str:
+    if size < 1024:
+        return f"{int(size)} B"
+    for unit in ('KB', 'MB', 'GB'):
+        size /= 1024
+        if size < 1024 or unit == 'GB':
+            return f"{size:.1f} {unit}"
+
+
+def format_progress(name: str, done: int, total: int, elapsed: float) -> str:
+    """生成状态栏文本：已扫描字节数、进度和预计剩余时间"""
+    text = f"{name}: 已扫描 {format_size(done)}"
+    if total:
+        text += f" / {format_size(total)} ({done * 100 // total}%)"
+        if done and elapsed > 0.5:
+            remaining = elapsed * (total - done) / done
+            text += f"，预计剩余 {remaining:.0f} 秒"
+    return text
+
+
+class TaskContext:
+    """传给后台任务的上下文，用于汇报进度、推送部分结果和检查取消"""
+
+    # 进度事件的最小间隔（秒），避免事件队列被刷屏
+    PROGRESS_INTERVAL = 0.1
+
+    def __init__(self, runner: 'TaskRunner', task: 'Task', total: int = 0):
+        self._runner = runner
+        self._task = task
+        self.total = total
+        self.done = 0
+        # 任务可以填写结果数量，随度量事件一起输出
+        self.result_count = None
+        self.started = time.monotonic()
+        self._cancel_event = threading.Event()
+        self._last_report = 0.0
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def check(self):
+        """已取消时抛出 TaskCancelled，任务应在循环中定期调用"""
+        if self._cancel_event.is_set():
+            raise TaskCancelled()
+
+    def progress(self, done: int, total: Optional[int] = None):
+        """汇报已处理的字节数"""
+        self.check()
+        self.done = done
+        if total is not None:
+            self.total = total
+        now = time.monotonic()
+        if now - self._last_report >= self.PROGRESS_INTERVAL:
+            self._last_report = now
+            self._runner._post(self._task, 'progress', (self.done, self.total, now - self.started))
+
+    def emit(self, partial):
+        """推送一批部分结果，在 Tk 主线程中交给 on_partial 处理"""
+        self.check()
+        self._runner._post(self._task, 'partial', partial)
+
+
+class Task:
+    """一个已提交的后台任务"""
+
+    def __init__(self, name: str, callbacks: Dict[str, Callable]):
+        self.name = name
+        self.callbacks = callbacks
+        self.context: Optional[TaskContext] = None
+        self.future = None
+
+    @property
+    def running(self) -> bool:
+        return self.future is not None and not self.future.done()
+
+    def cancel(self):
+        if self.context:
+            self.context.cancel()
+
+
+class TaskRunner:
+    """在线程池中执行分析任务，通过 Tk 事件循环回传进度和结果
+
+    后台线程从不直接操作控件：所有事件先放进队列，再由 root.after
+    定时在主线程中取出并调用回调。
+    """
+
+    # 每次轮询最多处理的事件数，保证界面及时响应
+    MAX_EVENTS_PER_POLL = 200
+
+    def __init__(self, root, max_workers: int = 2, poll_interval: int = 50):
+        self.root = root
+        self.poll_interval = poll_interval
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='dat-task')
+        self._events = queue.Queue()
+        self._tasks = set()
+        self._closed = False
+        self.root.after(self.poll_interval, self._poll)
+
+    def submit(self, name: str, func: Callable, *args, total: int = 0,
+               on_progress: Callable = None, on_partial: Callable = None,
+               on_done: Callable = None, on_error: Callable = None,
+               on_cancel: Callable = None) -> Task:
+        """提交任务，func 的第一个参数为 TaskContext"""
+        task = Task(name, {
+            'progress': on_progress,
+            'partial': on_partial,
+            'done': on_done,
+            'error': on_error,
+            'cancelled': on_cancel
+        })
+        task.context = TaskContext(self, task, total)
+        self._tasks.add(task)
+        task.future = self._executor.submit(self._run, task, func, args)
+        return task
+
+    def _run(self, task: Task, func: Callable, args):
+        ctx = task.context
+        try:
+            with instrumentation.operation(task.name, size=ctx.total) as frame:
+                try:
+                    result = func(ctx, *args)
+                finally:
+                    frame.bytes = ctx.done or ctx.total
+                    frame.result_count = ctx.result_count
+        except TaskCancelled:
+            self._post(task, 'cancelled', None)
+        except Exception as e:
+            self._post(task, 'error', e)
+        else:
+            self._post(task, 'done', result)
+
+    def _post(self, task: Task, kind: str, payload):
+        self._events.put((task, kind, payload))
+
+    def _poll(self):
+        for _ in range(self.MAX_EVENTS_PER_POLL):
+            try:
+                task, kind, payload = self._events.get_nowait()
+            except queue.Empty:
+                break
+            if kind in ('done', 'error', 'cancelled'):
+                self._tasks.discard(task)
+            # 已取消的任务不再投递进度和结果，只通知一次取消
+            if task.context.cancelled and kind != 'error':
+                if kind not in ('done', 'cancelled'):
+                    continue
+                kind, payload = 'cancelled', None
+            callback = task.callbacks.get(kind)
+            if callback:
+                try:
+                    if kind == 'progress':
+                        callback(task, *payload)
+                    else:
+                        callback(task, payload)
+                except Exception as e:
+                    print(f"任务回调失败: {e}")
+        if not self._closed:
+            self.root.after(self.poll_interval, self._poll)
+
+    @property
+    def running_tasks(self):
+        return [task for task in self._tasks if task.running]
+
+    def cancel_all(self):
+        for task in list(self._tasks):
+            task.cancel()
+
+    def shutdown(self):
+        """取消所有任务并关闭线程池"""
+        self._closed = True
+        self.cancel_all()
+        # 还没开始的任务直接撤下（shutdown 的 cancel_futures 参数需要 Python 3.9）
+        for task in list(self._tasks):
+            if task.future is not None:
+                task.future.cancel()
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,91 @@
+import random
+import sys
+
+from binary_diff import diff_buffers
+
+# 随机生成 A，经替换/插入/删除得到 B；按差异区间把 B 的内容套到 A 上应当还原出 B
+TRIALS = 200
+SEED = 20240602
+
+rng = random.Random(SEED)
+
+
+def random_data(size):
+    """随机字节和重复片段混合，重复片段让错位检测有机会误对齐"""
+    out = bytearray()
+    block = bytes(rng.randrange(256) for _ in range(rng.randint(1, 64)))
+    while len(out) < size:
+        if rng.random() < 0.6:
+            out += bytes(rng.randrange(256) for _ in range(rng.randint(1, 512)))
+        else:
+            out += block * rng.randint(1, 64)
+    return bytes(out[:size])
+
+
+def mutate(a):
+    b = bytearray(a)
+    for _ in range(rng.randint(0, 12)):
+        kind = rng.choice(('replace', 'insert', 'delete', 'long'))
+        pos = rng.randint(0, len(b))
+        if kind == 'replace':
+            length = rng.randint(1, 64)
+            b[pos:pos + length] = random_data(length)
+        elif kind == 'insert':
+            b[pos:pos] = random_data(rng.randint(1, 2048))
+        elif kind == 'delete':
+            del b[pos:pos + rng.randint(1, 2048)]
+        else:
+            # 超过 LONG_RUN 的原地差异，触发错位搜索
+            length = rng.randint(4096, 12000)
+            b[pos:pos + length] = random_data(length)
+    if rng.random() < 0.2:
+        # 末尾追加或截断
+        if rng.random() < 0.5:
+            b += random_data(rng.randint(1, 4096))
+        else:
+            del b[len(b) - rng.randint(0, len(b)):]
+    return bytes(b)
+
+
+def rebuild(a, b, ranges):
+    """按差异区间还原 B，同时检查区间之间的相同部分两侧确实相同；失败时返回原因"""
+    out = bytearray()
+    a_pos = b_pos = 0
+    for r in ranges:
+        if r.a_offset < a_pos or r.b_offset < b_pos or r.a_length < 0 or r.b_length < 0:
+            return f"区间顺序或长度错误: {r}"
+        if r.a_offset - a_pos != r.b_offset - b_pos:
+            return f"相同部分两侧长度不同: {r}"
+        if a[a_pos:r.a_offset] != b[b_pos:r.b_offset]:
+            return f"区间之前的内容并不相同: {r}"
+        expected = 'insert' if not r.a_length else 'delete' if not r.b_length else 'replace'
+        if r.kind != expected:
+            return f"差异类型错误: {r}"
+        out += a[a_pos:r.a_offset]
+        out += b[r.b_offset:r.b_offset + r.b_length]
+        a_pos = r.a_offset + r.a_length
+        b_pos = r.b_offset + r.b_length
+    out += a[a_pos:]
+    if bytes(out) != b:
+        return "还原结果与 B 不同"
+    return None
+
+
+failures = 0
+for trial in range(TRIALS):
+    a = random_data(rng.randint(0, 65536))
+    b = mutate(a)
+    chunk_size = rng.choice((256, 1000, 4096, 65536))
+    anchor = rng.choice((8, 16, 32))
+    ranges = diff_buffers(a, b, chunk_size=chunk_size, anchor=anchor)
+    error = rebuild(a, b, ranges)
+    if error is None and a == b and ranges:
+        error = "相同的内容报告了差异"
+    if error:
+        failures += 1
+        print(f"第 {trial} 次（A {len(a)} 字节，B {len(b)} 字节，块 {chunk_size}，锚点 {anchor}）: {error}")
+
+if failures:
+    print(f"{failures}/{TRIALS} 次比较无法还原")
+    sys.exit(1)
+print(f"{TRIALS} 次随机比较，按差异区间均能从 A 还原出 B")
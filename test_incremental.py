@@ -0,0 +1,118 @@
+import random
+import sys
+
+import numpy as np
+
+from edit_buffer import EditBuffer
+from incremental import KeywordIndex, NGramIndex, StringIndex, StructureIndex
+
+# 随机写入/撤销/重做之后，四种增量索引的结果应与对当前内容完整重新扫描的结果相同
+FILES = 30
+EDITS = 40
+KEYWORDS = ['Kill', 'Gold', 'll', '中文']
+WIDTHS = (1, 2, 4)
+SEED = 20240601
+
+rng = random.Random(SEED)
+
+
+def random_piece(length):
+    """可打印文本、零字节、关键词和小整数头部混合的随机内容"""
+    out = bytearray()
+    while len(out) < length:
+        kind = rng.random()
+        if kind < 0.3:
+            out += bytes(rng.randrange(0x20, 0x7F) for _ in range(rng.randint(1, 12)))
+        elif kind < 0.5:
+            out += bytes(rng.randint(1, 8))
+        elif kind < 0.7:
+            out += rng.choice(KEYWORDS).encode('utf-8')
+        elif kind < 0.85:
+            # 可能成为候选数组头部的 (数量, 元素大小)
+            endian = rng.choice('<>')
+            out += rng.randint(1, 20).to_bytes(4, 'little' if endian == '<' else 'big')
+            out += rng.choice((1, 2, 4, 8, 16)).to_bytes(4, 'little' if endian == '<' else 'big')
+        else:
+            out += bytes(rng.randrange(256) for _ in range(rng.randint(1, 8)))
+    return bytes(out[:length])
+
+
+def build_indexes(buffer):
+    return {
+        'strings': StringIndex(buffer, min_length=rng.choice((2, 4, 6))),
+        'keywords': KeywordIndex(buffer, KEYWORDS),
+        'structures': StructureIndex(buffer, max_count=100, max_size=64),
+        'ngrams': NGramIndex(buffer, widths=WIDTHS)
+    }
+
+
+def compare(indexes, data):
+    """返回与完整重新扫描不一致的索引名"""
+    fresh = EditBuffer(data)
+    strings = indexes['strings']
+    keywords = indexes['keywords']
+    structures = indexes['structures']
+    ngrams = indexes['ngrams']
+    errors = []
+
+    if strings.hits != StringIndex(fresh, strings.min_length).hits:
+        errors.append('strings')
+    expected = KeywordIndex(fresh, KEYWORDS)
+    if keywords.hits != expected.hits or +keywords.counts != +expected.counts:
+        errors.append('keywords')
+    expected = StructureIndex(fresh, structures.max_count, structures.max_size)
+    if not all(np.array_equal(a, b) for a, b in zip(structures.candidates, expected.candidates)):
+        errors.append('structures')
+    expected = NGramIndex(fresh, widths=WIDTHS)
+    if not np.array_equal(ngrams.hist, expected.hist):
+        errors.append('ngrams 字节频率')
+    for width in WIDTHS:
+        a, b = ngrams.counts[width], expected.counts[width]
+        if isinstance(b, np.ndarray):
+            same = np.array_equal(a, b)
+        else:
+            same = np.array_equal(a.keys, b.keys) and np.array_equal(a.counts, b.counts)
+        if not same:
+            errors.append(f'ngrams 宽度 {width}')
+    if ngrams.result() != expected.result():
+        errors.append('ngrams 结果')
+    return errors
+
+
+failures = 0
+for file_index in range(FILES):
+    size = rng.randint(64, 16384)
+    buffer = EditBuffer(random_piece(size), page_size=rng.choice((64, 256, 4096)))
+    indexes = build_indexes(buffer)
+    for step in range(EDITS):
+        action = rng.random()
+        if action < 0.55:
+            length = rng.randint(1, min(96, size))
+            offset = rng.randrange(size - length + 1)
+            buffer.write(offset, random_piece(length))
+            action = f"写入 0x{offset:X}+{length}"
+        elif action < 0.7:
+            # 批量编辑作为一个撤销单位
+            with buffer.batch():
+                for _ in range(rng.randint(2, 4)):
+                    length = rng.randint(1, min(16, size))
+                    buffer.write(rng.randrange(size - length + 1), random_piece(length))
+            action = "批量写入"
+        elif action < 0.85:
+            buffer.undo()
+            action = "撤销"
+        else:
+            buffer.redo()
+            action = "重做"
+        errors = compare(indexes, buffer.tobytes())
+        if errors:
+            failures += 1
+            print(f"文件 {file_index} 第 {step} 步（{action}）后不一致: {', '.join(errors)}")
+            break
+    for index in indexes.values():
+        index.close()
+
+if failures:
+    print(f"{failures}/{FILES} 个文件的增量索引与完整扫描不一致")
+    sys.exit(1)
+print(f"{FILES} 个文件 × {EDITS} 次随机编辑，增量索引与完整扫描结果一致")
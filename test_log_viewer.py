@@ -0,0 +1,42 @@
+import sys
+
+from instrumentation import OperationEvent, format_event
+from log_viewer import LEVEL_NAMES, LOG_LEVELS, LogSink, infer_level
+
+# 日志级别推断：度量输出（写到标准错误）应为 DEBUG，即使其中带有失败说明
+
+
+def event(ok=True, error=None):
+    return OperationEvent('extract_string_hits', '/tmp/a.dat', 0.0, 0.5, 1 << 20, 2 << 20, None, 10,
+                          False, ok, error, None, None)
+
+
+CASES = [
+    (format_event(event()), 'stderr', 'DEBUG'),
+    (format_event(event(False, 'ValueError: bad')), 'stderr', 'DEBUG'),
+    (format_event(event()), 'stdout', 'DEBUG'),
+    ('文件读取成功', 'stdout', 'INFO'),
+    ('文件读取失败: 不存在', 'stdout', 'ERROR'),
+    ('无法打开度量输出文件', 'stdout', 'WARNING'),
+    ('some progress', 'stderr', 'WARNING'),
+    ('Traceback (most recent call last):', 'stderr', 'ERROR'),
+]
+
+failures = 0
+for message, stream, expected in CASES:
+    level = LEVEL_NAMES[infer_level(message, stream)]
+    if level != expected:
+        failures += 1
+        print(f"{stream} {message!r}: {level}，应为 {expected}")
+
+# 经过 LogSink 分行后级别相同
+sink = LogSink(100)
+sink.write(format_event(event(False, 'OSError: 失败')) + '\n', 'stderr')
+record = sink.pending.pop()
+if record.level != LOG_LEVELS['DEBUG']:
+    failures += 1
+    print(f"LogSink 中的度量行级别为 {LEVEL_NAMES[record.level]}，应为 DEBUG")
+
+if failures:
+    sys.exit(1)
+print(f"{len(CASES) + 1} 个日志级别推断用例通过")
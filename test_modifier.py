@@ -1,4 +1,10 @@
+import os
 from dat_modifier import DatModifier
+from synthetic_dat import generate_dat
+
+# test.dat 不在仓库中，不存在时生成一个 1MB 的合成文件
+if not os.path.exists('test.dat'):
+    generate_dat('test.dat', 1024*1024)
 
 # 创建修改器实例
 modifier = DatModifier('test.dat')
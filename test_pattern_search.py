@@ -0,0 +1,68 @@
+import os
+import random
+import subprocess
+import sys
+import tempfile
+
+from data_inspector import DataInspector
+from parallel_scan import parallel_scan
+from pattern_search import compile_pattern, iter_pattern_hits
+from streaming import StreamingAnalyzer
+
+# 多进程 / 流式窗口的特征查找结果应与单进程整体扫描相同，正则不能出现重叠匹配
+SEED = 20240603
+HEX_PATTERNS = ['41 41', '4B 69 ?? 6C', '?1 41', '00 00 00']
+REGEX_PATTERNS = ['A{4}', 'A+', 'Ki.{2}', '(?:AB)+A', '\\x00{2,6}']
+
+rng = random.Random(SEED)
+
+
+def random_data(size):
+    out = bytearray()
+    while len(out) < size:
+        out += rng.choice((b'A' * rng.randint(1, 20), b'AB' * rng.randint(1, 6), b'Kill', bytes(rng.randint(1, 8)),
+                           bytes(rng.randrange(256) for _ in range(rng.randint(1, 8)))))
+    return bytes(out[:size])
+
+
+def run_cli(path, pattern, kind, jobs):
+    args = [sys.executable, 'pattern_search.py', path, pattern, '-j', str(jobs)]
+    if kind == 'regex':
+        args.append('--regex')
+    return subprocess.run(args, capture_output=True, text=True).stdout
+
+
+failures = []
+with tempfile.TemporaryDirectory() as tmp:
+    path = os.path.join(tmp, 'sample.dat')
+    for trial in range(20):
+        data = b'A' * 10 + b'x' * 10 if trial == 0 else random_data(rng.randint(1, 4096))
+        with open(path, 'wb') as f:
+            f.write(data)
+        inspector = DataInspector(path)
+        inspector.read_file()
+        chunk_size = 6 if trial == 0 else rng.randint(1, 512)
+        for kind, patterns in (('hex', HEX_PATTERNS), ('regex', REGEX_PATTERNS)):
+            for pattern in patterns:
+                expected = list(iter_pattern_hits(data, compile_pattern(pattern, kind)))
+                results = {'-j 4': inspector.find_pattern(pattern, kind, workers=4)}
+                analyzer = StreamingAnalyzer(path, window_size=chunk_size)
+                analyzer.read_file()
+                results['流式窗口'] = list(analyzer.iter_pattern(pattern, kind))
+                analyzer.cleanup()
+                if kind == 'hex':
+                    results['小块并行'] = parallel_scan(path, 'signatures', 4, chunk_size, pattern=pattern, kind=kind)
+                for name, hits in results.items():
+                    if hits != expected:
+                        failures.append(f"第 {trial} 组 {kind} {pattern!r} {name}: {hits[:6]} != {expected[:6]}")
+        inspector.cleanup()
+        if trial < 3:
+            for kind, pattern in (('hex', '41 41'), ('regex', 'A{4}')):
+                if run_cli(path, pattern, kind, 4) != run_cli(path, pattern, kind, 1):
+                    failures.append(f"第 {trial} 组命令行 -j 4 与 -j 1 输出不同: {kind} {pattern!r}")
+
+for failure in failures:
+    print(failure)
+if failures:
+    sys.exit(1)
+print("多进程、流式窗口与单进程的特征查找结果一致")
@@ -0,0 +1,422 @@
+import argparse
+import sys
+from collections import namedtuple
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+# 支持的数值类型 -> numpy 类型码（不含字节序）
+VALUE_TYPES = {
+    'int8': 'i1', 'uint8': 'u1',
+    'int16': 'i2', 'uint16': 'u2',
+    'int32': 'i4', 'uint32': 'u4',
+    'int64': 'i8', 'uint64': 'u8',
+    'float32': 'f4', 'float64': 'f8'
+}
+TYPE_ALIASES = {'byte': 'int8', 'short': 'int16', 'int': 'int32', 'long': 'int64',
+                'float': 'float32', 'double': 'float64'}
+INT_TYPES = ('int8', 'int16', 'int32', 'int64')
+UINT_TYPES = ('uint8', 'uint16', 'uint32', 'uint64')
+FLOAT_TYPES = ('float32', 'float64')
+
+ENDIANS = ('<', '>')
+ENDIAN_NAMES = {'<': '小端', '>': '大端'}
+
+# 筛选条件；equals、increased_by、decreased_by 需要给出数值
+PREDICATES = ('equals', 'changed', 'unchanged', 'increased', 'decreased', 'increased_by', 'decreased_by')
+VALUE_PREDICATES = ('equals', 'increased_by', 'decreased_by')
+
+# 整文件扫描时每块的字节数（8 的倍数，各宽度的对齐方式在块间保持一致）
+SCAN_CHUNK = 16*1024*1024
+
+# 同一类型和字节序下的候选：升序偏移 (int64) 及其在最近一次快照中的值
+ValueCandidates = namedtuple('ValueCandidates', ['offsets', 'values'])
+# 单个候选，endian 为 '<' 或 '>'
+ValueHit = namedtuple('ValueHit', ['offset', 'type', 'endian', 'value'])
+
+Number = Union[int, float]
+
+
+def value_dtype(type_name: str, endian: str = '<') -> np.dtype:
+    return np.dtype(endian + VALUE_TYPES[type_name])
+
+
+def parse_types(spec: Union[str, Sequence[str], None]) -> Optional[Tuple[str, ...]]:
+    """解析类型列表，如 'int32,float'；all 表示全部类型，None 或空表示按数值自动选择"""
+    if not spec:
+        return None
+    names = spec.replace('，', ',').split(',') if isinstance(spec, str) else spec
+    types = []
+    for name in (name.strip().lower() for name in names):
+        if not name:
+            continue
+        if name == 'all':
+            return INT_TYPES + UINT_TYPES + FLOAT_TYPES
+        name = TYPE_ALIASES.get(name, name)
+        if name not in VALUE_TYPES:
+            raise ValueError(f"未知的数值类型: {name}（可用: {', '.join(VALUE_TYPES)}）")
+        if name not in types:
+            types.append(name)
+    return tuple(types) or None
+
+
+def parse_value(text: str) -> Number:
+    """解析数值：整数支持 0x 前缀，其余按浮点数解析"""
+    text = text.strip()
+    try:
+        return int(text, 0)
+    except ValueError:
+        pass
+    try:
+        return float(text)
+    except ValueError:
+        raise ValueError(f"无效的数值: {text}")
+
+
+def parse_condition(text: str) -> Tuple[str, Optional[Number]]:
+    """解析筛选条件的简写：'= 100' 或 '100' 等于，'+'/'-' 增加/减少，
+    '+5'/'-5' 增加/减少了 5，'c' 改变，'u' 未变；也接受 PREDICATES 中的名称"""
+    text = text.strip()
+    words = text.split(None, 1)
+    if words and words[0].lower() in PREDICATES:
+        predicate = words[0].lower()
+        if predicate in VALUE_PREDICATES:
+            if len(words) < 2:
+                raise ValueError(f"{predicate} 需要给出数值")
+            return predicate, parse_value(words[1])
+        return predicate, None
+    shortcuts = {'c': 'changed', 'u': 'unchanged', '+': 'increased', '-': 'decreased'}
+    if text.lower() in shortcuts:
+        return shortcuts[text.lower()], None
+    if text.startswith('='):
+        return 'equals', parse_value(text[1:])
+    if text[:1] in '+-' and len(text) > 1:
+        return ('increased_by' if text[0] == '+' else 'decreased_by'), parse_value(text[1:])
+    return 'equals', parse_value(text)
+
+
+def is_representable(value: Number, type_name: str) -> bool:
+    """value 能否用该类型精确（浮点为就近）表示"""
+    if VALUE_TYPES[type_name][0] == 'f':
+        return bool(np.isfinite(value)) and abs(value) <= np.finfo(VALUE_TYPES[type_name]).max
+    if isinstance(value, float) and not value.is_integer():
+        return False
+    info = np.iinfo(VALUE_TYPES[type_name])
+    return info.min <= value <= info.max
+
+
+def default_types(value: Optional[Number]) -> Tuple[str, ...]:
+    """未指定类型时的扫描类型：整数查能表示它的有符号整数（超出时用无符号）和浮点，小数只查浮点"""
+    if value is None:
+        return INT_TYPES + FLOAT_TYPES
+    if isinstance(value, float) and not value.is_integer():
+        return FLOAT_TYPES
+    ints = tuple(name for name in INT_TYPES if is_representable(value, name))
+    if not ints:
+        ints = tuple(name for name in UINT_TYPES if is_representable(value, name))
+    return ints + FLOAT_TYPES
+
+
+def _aligned_views(data, dtype: np.dtype, chunk_start: int, chunk_end: int,
+                   size: int) -> List[Tuple[int, np.ndarray]]:
+    """块 [chunk_start, chunk_end) 内每种对齐方式的 (起始偏移, 类型视图)
+
+    视图第 k 项位于 起始偏移 + k*宽度，块内每个偏移恰好出现一次，
+    块末尾的值可以延伸到下一块。
+    """
+    width = dtype.itemsize
+    views = []
+    for align in range(width):
+        base = chunk_start + align
+        count = min((chunk_end - base + width - 1) // width, (size - base) // width)
+        if count > 0:
+            views.append((base, np.frombuffer(data, dtype=dtype, count=count, offset=base)))
+    return views
+
+
+def _empty_candidates(dtype: np.dtype) -> ValueCandidates:
+    return ValueCandidates(np.empty(0, dtype=np.int64), np.empty(0, dtype=dtype.newbyteorder('=')))
+
+
+def _bits(values: np.ndarray) -> np.ndarray:
+    """按位比较用的无符号视图，浮点的 NaN 也能判断是否变化"""
+    return values.view(f'u{values.dtype.itemsize}')
+
+
+def _equals(values: np.ndarray, value: Number, tolerance: Optional[float]) -> np.ndarray:
+    if tolerance:
+        return np.abs(values.astype(np.float64) - value) <= tolerance
+    if not is_representable(value, values.dtype.name):
+        return np.zeros(len(values), dtype=bool)
+    return values == values.dtype.type(value)
+
+
+def apply_predicate(old: np.ndarray, new: np.ndarray, predicate: str,
+                    value: Number = None, tolerance: float = None) -> np.ndarray:
+    """对前后两次快照中的值求筛选条件，返回布尔掩码"""
+    if predicate == 'equals':
+        return _equals(new, value, tolerance)
+    if predicate == 'changed':
+        return _bits(new) != _bits(old)
+    if predicate == 'unchanged':
+        return _bits(new) == _bits(old)
+    if predicate == 'increased':
+        return new > old
+    if predicate == 'decreased':
+        return new < old
+    if predicate in ('increased_by', 'decreased_by'):
+        # 整数按 int64 求差（溢出时回绕，差值仍正确），浮点按 float64
+        wide = np.float64 if new.dtype.kind == 'f' else np.int64
+        with np.errstate(invalid='ignore', over='ignore'):
+            diff = new.astype(wide) - old.astype(wide)
+        if predicate == 'decreased_by':
+            diff = -diff
+        if tolerance or wide is np.float64:
+            return np.abs(diff - value) <= (tolerance or 0)
+        return diff == value
+    raise ValueError(f"未知的筛选条件: {predicate}（可用: {', '.join(PREDICATES)}）")
+
+
+def scan_value(data, value: Number, type_name: str, endian: str = '<', tolerance: float = None,
+               chunk_size: int = SCAN_CHUNK) -> ValueCandidates:
+    """在每个字节偏移处按给定类型和字节序查找 value
+
+    不设容差时把 value 编码成目标字节再按位比较，不必逐项转换字节序。
+    """
+    dtype = value_dtype(type_name, endian)
+    width = dtype.itemsize
+    if not tolerance and not is_representable(value, type_name):
+        return _empty_candidates(dtype)
+    bits_dtype = np.dtype(f'=u{width}')
+    target = None if tolerance else np.array([value], dtype=dtype).view(bits_dtype)[0]
+
+    parts = []
+    for chunk_start in range(0, len(data), chunk_size):
+        chunk_end = min(chunk_start + chunk_size, len(data))
+        hits = []
+        for base, view in _aligned_views(data, dtype if tolerance else bits_dtype, chunk_start, chunk_end, len(data)):
+            index = np.flatnonzero(_equals(view, value, tolerance) if tolerance else view == target)
+            hits.append(base + width * index.astype(np.int64))
+        if hits:
+            parts.append(np.sort(np.concatenate(hits)))
+    if not parts:
+        return _empty_candidates(dtype)
+    offsets = np.concatenate(parts)
+    return ValueCandidates(offsets, read_values(data, offsets, dtype))
+
+
+def read_values(data, offsets: np.ndarray, dtype: np.dtype) -> np.ndarray:
+    """读取各偏移处的值（按本机字节序返回），offsets 必须都在文件内"""
+    width = dtype.itemsize
+    values = np.empty(len(offsets), dtype=dtype.newbyteorder('='))
+    for align in range(width):
+        selected = offsets % width == align
+        index = (offsets[selected] - align) // width
+        if not len(index):
+            continue
+        view = np.frombuffer(data, dtype=dtype, count=(len(data) - align) // width, offset=align)
+        values[selected] = view[index]
+    return values
+
+
+def snapshot_file(file_path: str) -> bytes:
+    """从磁盘重新读取整个文件作为一次快照
+
+    存档通常被游戏整体重写，旧的映射可能仍指向替换前的文件，
+    因此每次筛选都重新读取。
+    """
+    with open(file_path, 'rb') as f:
+        return f.read()
+
+
+class ValueScanner:
+    """在多次快照之间逐步缩小候选偏移的数值扫描器
+
+    首次扫描在每个字节偏移处按各类型、各字节序比较给定数值，候选以
+    (类型, 字节序) 分组保存为偏移数组和值数组。初值未知时只保存整份
+    快照，第一次筛选时再对两份快照整体比较。之后每次筛选只读取候选
+    偏移处的值。
+    """
+
+    def __init__(self, types: Sequence[str] = None, endians: Sequence[str] = ENDIANS, tolerance: float = None):
+        self.types = tuple(types) if types else None
+        self.endians = tuple(endians)
+        self.tolerance = tolerance
+        self.candidates: Dict[Tuple[str, str], ValueCandidates] = {}
+        self.previous = None
+        self.keys: List[Tuple[str, str]] = []
+        self.scans = 0
+
+    @property
+    def started(self) -> bool:
+        return self.scans > 0
+
+    @property
+    def count(self) -> int:
+        """当前候选数；初值未知时为所有可能的 (偏移, 类型, 字节序) 组合数"""
+        if self.previous is not None:
+            return sum(max(len(self.previous) - value_dtype(name).itemsize + 1, 0) for name, _ in self.keys)
+        return sum(len(candidates.offsets) for candidates in self.candidates.values())
+
+    def copy(self) -> 'ValueScanner':
+        """复制扫描状态；筛选只替换候选字典中的条目，共享数组是安全的"""
+        scanner = ValueScanner(self.types, self.endians, self.tolerance)
+        scanner.candidates = dict(self.candidates)
+        scanner.previous = self.previous
+        scanner.keys = list(self.keys)
+        scanner.scans = self.scans
+        return scanner
+
+    def reset(self):
+        self.candidates = {}
+        self.previous = None
+        self.keys = []
+        self.scans = 0
+
+    def first_scan(self, data, value: Number = None) -> int:
+        """首次扫描；value 为 None 表示初值未知，返回候选数"""
+        self.reset()
+        types = self.types or default_types(value)
+        # 单字节类型没有字节序之分
+        self.keys = [(name, endian) for name in types
+                     for endian in (self.endians if value_dtype(name).itemsize > 1 else self.endians[:1])]
+        if value is None:
+            self.previous = bytes(data)
+        else:
+            for name, endian in self.keys:
+                candidates = scan_value(data, value, name, endian, self.tolerance)
+                if len(candidates.offsets):
+                    self.candidates[(name, endian)] = candidates
+        self.scans = 1
+        return self.count
+
+    def next_scan(self, data, predicate: str, value: Number = None) -> int:
+        """用新快照和筛选条件缩小候选集合，返回剩余候选数"""
+        if not self.started:
+            raise ValueError("请先进行首次扫描")
+        if predicate not in PREDICATES:
+            raise ValueError(f"未知的筛选条件: {predicate}（可用: {', '.join(PREDICATES)}）")
+        if predicate in VALUE_PREDICATES and value is None:
+            raise ValueError(f"{predicate} 需要给出数值")
+
+        if self.previous is not None:
+            if predicate == 'unchanged' and self.previous == bytes(data):
+                # 内容完全相同时所有组合都满足，继续保持未展开的状态
+                self.scans += 1
+                return self.count
+            previous, self.previous = self.previous, None
+            for key in self.keys:
+                candidates = self._compare_snapshots(previous, data, key, predicate, value)
+                if len(candidates.offsets):
+                    self.candidates[key] = candidates
+        else:
+            for key, candidates in list(self.candidates.items()):
+                dtype = value_dtype(*key)
+                # 文件变短时丢弃越界的候选
+                inside = candidates.offsets + dtype.itemsize <= len(data)
+                offsets = candidates.offsets[inside]
+                new = read_values(data, offsets, dtype)
+                mask = apply_predicate(candidates.values[inside], new, predicate, value, self.tolerance)
+                if mask.any():
+                    self.candidates[key] = ValueCandidates(offsets[mask], new[mask])
+                else:
+                    del self.candidates[key]
+        self.scans += 1
+        return self.count
+
+    def _compare_snapshots(self, old_data, new_data, key, predicate, value) -> ValueCandidates:
+        """初值未知时对两份快照整体比较"""
+        dtype = value_dtype(*key)
+        size = min(len(old_data), len(new_data))
+        offsets, values = [], []
+        for chunk_start in range(0, size, SCAN_CHUNK):
+            chunk_end = min(chunk_start + SCAN_CHUNK, size)
+            chunk_offsets, chunk_values = [], []
+            for base, new in _aligned_views(new_data, dtype, chunk_start, chunk_end, size):
+                old = np.frombuffer(old_data, dtype=dtype, count=len(new), offset=base)
+                hits = np.flatnonzero(apply_predicate(old, new, predicate, value, self.tolerance))
+                chunk_offsets.append(base + dtype.itemsize * hits.astype(np.int64))
+                chunk_values.append(new[hits].astype(dtype.newbyteorder('=')))
+            if chunk_offsets:
+                chunk_offsets = np.concatenate(chunk_offsets)
+                order = np.argsort(chunk_offsets, kind='stable')
+                offsets.append(chunk_offsets[order])
+                values.append(np.concatenate(chunk_values)[order])
+        if not offsets:
+            return _empty_candidates(dtype)
+        return ValueCandidates(np.concatenate(offsets), np.concatenate(values))
+
+    def iter_hits(self, limit: int = None) -> Iterator[ValueHit]:
+        """按偏移顺序产出候选，最多 limit 个"""
+        if not self.candidates:
+            return
+        keys = list(self.candidates)
+        offsets = np.concatenate([self.candidates[key].offsets for key in keys])
+        groups = np.concatenate([np.full(len(self.candidates[key].offsets), i) for i, key in enumerate(keys)])
+        positions = np.concatenate([np.arange(len(self.candidates[key].offsets)) for key in keys])
+        order = np.lexsort((groups, offsets))[:limit]
+        for i in order.tolist():
+            name, endian = keys[groups[i]]
+            yield ValueHit(int(offsets[i]), name, endian, self.candidates[(name, endian)].values[positions[i]].item())
+
+    def summary(self) -> Dict[str, int]:
+        """各 '类型 字节序' 的候选数"""
+        return {f"{name} {ENDIAN_NAMES[endian]}": len(candidates.offsets)
+                for (name, endian), candidates in self.candidates.items()}
+
+
+def format_hit(hit: ValueHit) -> str:
+    return f"0x{hit.offset:08X}  {hit.type:<8} {ENDIAN_NAMES[hit.endian]}  {hit.value}"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='在存档中查找数值，并在多次保存之间逐步缩小候选偏移')
+    parser.add_argument('file', help='要扫描的文件，每次筛选前从磁盘重新读取')
+    parser.add_argument('-t', '--types', default=None,
+                        help=f"逗号分隔的类型：{','.join(VALUE_TYPES)} 或 all（默认按数值自动选择）")
+    parser.add_argument('-e', '--endian', choices=('little', 'big', 'both'), default='both', help='字节序')
+    parser.add_argument('--tolerance', type=float, default=None, help='比较数值时的容差（用于浮点）')
+    parser.add_argument('--limit', type=int, default=20, help='候选数不超过该值时列出全部候选')
+    args = parser.parse_args(argv)
+
+    try:
+        types = parse_types(args.types)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    endians = {'little': ('<',), 'big': ('>',), 'both': ENDIANS}[args.endian]
+    scanner = ValueScanner(types, endians, args.tolerance)
+
+    try:
+        text = input("请输入当前数值（留空表示初值未知）：").strip()
+        scanner.first_scan(snapshot_file(args.file), parse_value(text) if text else None)
+        while True:
+            print(f"\n候选: {scanner.count} 个")
+            if scanner.candidates and scanner.count <= args.limit:
+                for hit in scanner.iter_hits():
+                    print(f"  {format_hit(hit)}")
+            if scanner.scans > 1 and not scanner.count:
+                print("没有剩余候选")
+                return 1
+            text = input("改变游戏中的数值并保存后输入筛选条件"
+                         "（= 值 / c 改变 / u 未变 / + 增加 / - 减少 / +N / -N，l 列出，q 退出）：").strip()
+            if text.lower() == 'q':
+                return 0
+            if text.lower() == 'l':
+                for hit in scanner.iter_hits(args.limit):
+                    print(f"  {format_hit(hit)}")
+                continue
+            try:
+                predicate, value = parse_condition(text)
+                scanner.next_scan(snapshot_file(args.file), predicate, value)
+            except ValueError as e:
+                print(e)
+    except (EOFError, KeyboardInterrupt):
+        return 0
+    except OSError as e:
+        print(f"读取文件失败: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())